@@ -1,10 +1,38 @@
 """
 Agents package for the NVIDIA Agentic AI solution.
-Contains the base agent class and specialized agents for content creation and image generation.
+Contains the base agent class, specialized agents for content creation and image generation,
+and the process-wide agent pool.
+
+The names below are imported on first access, so importing a light submodule
+(e.g. agents.metrics) does not pull in LangChain.
 """
 
-from .base_agent import BaseAgent
-from .content_creator import ContentCreatorAgent, ContentOutput
-from .digital_artist import DigitalArtistAgent
+import importlib
+
+_EXPORTS = {
+    "AgentPool": ".pool",
+    "BaseAgent": ".base_agent",
+    "ContentCreatorAgent": ".content_creator",
+    "ContentOutput": ".content_creator",
+    "DigitalArtistAgent": ".digital_artist",
+    "FusedContentCreatorAgent": ".content_creator",
+    "FusedContentOutput": ".content_creator",
+    "GeneratedImage": ".image",
+    "TokenUsage": ".usage",
+    "agent_pool": ".pool",
+    "token_usage": ".usage",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ["BaseAgent", "ContentCreatorAgent", "ContentOutput", "DigitalArtistAgent"]
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,13 +1,57 @@
-from typing import Any, Dict, Optional
-from pydantic import BaseModel
-from langchain_nvidia_ai_endpoints import ChatNVIDIA
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+from .cache import ResponseCache, get_default_cache, make_cache_key
+from .deadline import (
+    await_with_deadline,
+    bounded_timeout,
+    check_deadline,
+    check_sleep,
+)
+from .metrics import count, record_retry, span
+from .limits import (
+    COMPLETION_TOKENS_ESTIMATE,
+    estimate_tokens,
+    get_limiter,
+    is_retryable,
+)
+from .router import get_model_stats
+from .transport import backoff_delay
+from .usage import token_usage
+import asyncio
 import logging
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
 
+# ChatNVIDIA fields that change the completion and therefore belong in the cache key
+GENERATION_PARAMS = ("temperature", "top_p", "max_tokens", "seed", "stop")
+
+
+def bound_client_timeouts(llm: Any) -> None:
+    """Cap the timeout of each request the sync ChatNVIDIA client sends to the
+    current deadline; the client only takes one timeout, at construction.
+    """
+    client = getattr(llm, "_client", None)
+    make_session = getattr(client, "get_session_fn", None)
+    if make_session is None:
+        return
+
+    def make_bounded_session():
+        session = make_session()
+        request = session.request
+
+        def bounded_request(method, url, **kwargs):
+            if isinstance(kwargs.get("timeout"), (int, float)):
+                kwargs["timeout"] = bounded_timeout(kwargs["timeout"])
+            return request(method, url, **kwargs)
+
+        session.request = bounded_request
+        return session
+
+    client.get_session_fn = make_bounded_session
+
+
 class BaseAgent:
     def __init__(self, model_name: str, api_key: str):
         """Initialize the base agent with model configuration."""
@@ -17,9 +61,29 @@ class BaseAgent:
             if not model_name:
                 raise ValueError("Model name is required")
 
-            self.llm = ChatNVIDIA(model=model_name, nvidia_api_key=api_key)
+            # Imported here: LangChain takes about a second to import
+            from langchain_nvidia_ai_endpoints import ChatNVIDIA
+
+            self.model_name = model_name
+            # LLM_API_BASE_URL points the chat calls at another host, e.g. a local stub
+            base_url = os.getenv("LLM_API_BASE_URL")
+            if base_url:
+                self.llm = ChatNVIDIA(
+                    model=model_name, nvidia_api_key=api_key, base_url=base_url
+                )
+            else:
+                self.llm = ChatNVIDIA(model=model_name, nvidia_api_key=api_key)
+            # The sync client cannot be cancelled, so its requests time out instead
+            bound_client_timeouts(self.llm)
             self.prompt_template = None
+            self.system_prompt = None
             self.chain = None
+            self.cache: Optional[ResponseCache] = get_default_cache()
+            # Shared by every agent on this model, across threads and event loops
+            self.limiter = get_limiter(model_name)
+            # Rolling latency and error rate the model router picks tiers by
+            self.model_stats = get_model_stats(model_name)
+            self.max_retries = int(os.getenv("MAX_RETRIES", "3"))
             logger.info(f"Initialized agent with model: {model_name}")
         except Exception as e:
             logger.error(f"Error initializing agent: {str(e)}")
@@ -31,16 +95,142 @@ class BaseAgent:
             if not system_prompt:
                 raise ValueError("System prompt is required")
 
+            from langchain_core.output_parsers import StrOutputParser
+            from langchain_core.prompts import ChatPromptTemplate
+
             self.prompt_template = ChatPromptTemplate.from_messages(
                 [("system", system_prompt), ("user", "{input}")]
             )
-            self.chain = self.prompt_template | self.llm | StrOutputParser()
+            self.system_prompt = system_prompt
+            self.chain = (
+                self.prompt_template | self.llm | StrOutputParser()
+            ).with_config(callbacks=[token_usage.handler(self.model_name)])
             logger.info("Chain setup completed successfully")
         except Exception as e:
             logger.error(f"Error setting up chain: {str(e)}")
             raise
 
-    def invoke(self, input_data: Dict[str, Any]) -> str:
+    def cache_key(self, input_data: Dict[str, Any]) -> str:
+        """Return the cache key for a call with the given input data."""
+        params = {name: getattr(self.llm, name, None) for name in GENERATION_PARAMS}
+        return make_cache_key(
+            "llm", self.model_name, self.system_prompt, input_data, params
+        )
+
+    def invalidate_cache(self, input_data: Dict[str, Any]) -> None:
+        """Drop the cached response for this input so the next call regenerates it."""
+        if self.cache:
+            self.cache.delete(self.cache_key(input_data))
+
+    def store_cache(self, input_data: Dict[str, Any], result: str) -> None:
+        """Cache a completion produced outside invoke, e.g. a stream stopped early."""
+        if self.cache:
+            self.cache.set(self.cache_key(input_data), result.encode("utf-8"))
+
+    async def astore_cache(self, input_data: Dict[str, Any], result: str) -> None:
+        """Async variant of store_cache."""
+        if self.cache:
+            await self.cache.aset(self.cache_key(input_data), result.encode("utf-8"))
+
+    def _call_tokens(self, input_data: Dict[str, Any]) -> int:
+        """Estimate the tokens a call will use, for the tokens/min limit."""
+        prompt = (self.system_prompt or "") + str(input_data.get("input", ""))
+        return estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if not is_retryable(error) or attempt >= self.max_retries - 1:
+            return False
+        logger.warning(
+            f"LLM attempt {attempt + 1} failed: {str(error).strip().splitlines()[0]}"
+        )
+        record_retry(self.model_name)
+        return True
+
+    def _backoff(self, attempt: int) -> float:
+        delay = backoff_delay(attempt)
+        check_sleep(delay, self.model_name)
+        return delay
+
+    def _invoke_chain(self, input_data: Dict[str, Any]) -> str:
+        """Invoke the chain under the model's limits, retrying throttling and 5xx."""
+        for attempt in range(self.max_retries):
+            try:
+                # Checked per attempt, the requests themselves time out at the deadline
+                check_deadline(self.model_name)
+                # Tracked inside the limits: the router rates the model, not our queue
+                with (
+                    self.limiter.limit(self._call_tokens(input_data)),
+                    self.model_stats.track(),
+                ):
+                    return self.chain.invoke(input_data)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    async def _ainvoke_chain(self, input_data: Dict[str, Any]) -> str:
+        """Async variant of _invoke_chain, cancelling the call at the deadline."""
+        for attempt in range(self.max_retries):
+            try:
+                async with self.limiter.alimit(self._call_tokens(input_data)):
+                    with self.model_stats.track():
+                        return await await_with_deadline(
+                            self.chain.ainvoke(input_data), self.model_name
+                        )
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+
+    def _stream_chain(self, input_data: Dict[str, Any]) -> Iterator[str]:
+        """Stream the chain under the model's limits, retrying until the first chunk."""
+        for attempt in range(self.max_retries):
+            started = False
+            try:
+                check_deadline(self.model_name)
+                with (
+                    self.limiter.limit(self._call_tokens(input_data)),
+                    self.model_stats.track(),
+                ):
+                    for chunk in self.chain.stream(input_data):
+                        started = True
+                        yield chunk
+                        check_deadline(self.model_name)
+                return
+            except Exception as e:
+                # Chunks already handed out cannot be taken back
+                if started or not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(attempt))
+
+    async def _astream_chain(self, input_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """Async variant of _stream_chain, cancelling a chunk wait at the deadline."""
+        for attempt in range(self.max_retries):
+            started = False
+            try:
+                async with self.limiter.alimit(self._call_tokens(input_data)):
+                    with self.model_stats.track():
+                        stream = self.chain.astream(input_data)
+                        try:
+                            while True:
+                                try:
+                                    chunk = await await_with_deadline(
+                                        stream.__anext__(), self.model_name
+                                    )
+                                except StopAsyncIteration:
+                                    break
+                                started = True
+                                yield chunk
+                        finally:
+                            await stream.aclose()
+                return
+            except Exception as e:
+                # Chunks already handed out cannot be taken back
+                if started or not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+
+    def invoke(self, input_data: Dict[str, Any], use_cache: bool = True) -> str:
         """Invoke the agent with the given input data."""
         try:
             if not self.chain:
@@ -48,13 +238,124 @@ class BaseAgent:
             if not input_data:
                 raise ValueError("Input data is required")
 
-            result = self.chain.invoke(input_data)
+            key = self.cache_key(input_data) if self.cache else None
+            if key and use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info("Served agent response from cache")
+                    count("llm.cache_hits")
+                    return cached.decode("utf-8")
+
+            with span("llm.invoke", model=self.model_name):
+                result = self._invoke_chain(input_data)
             logger.info("Successfully invoked agent")
+            if key:
+                self.cache.set(key, result.encode("utf-8"))
             return result
         except Exception as e:
             logger.error(f"Error invoking agent: {str(e)}")
             raise
 
+    async def ainvoke(self, input_data: Dict[str, Any], use_cache: bool = True) -> str:
+        """Asynchronously invoke the agent with the given input data."""
+        try:
+            if not self.chain:
+                raise ValueError("Chain not initialized. Call _setup_chain first.")
+            if not input_data:
+                raise ValueError("Input data is required")
+
+            key = self.cache_key(input_data) if self.cache else None
+            if key and use_cache:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    logger.info("Served agent response from cache")
+                    count("llm.cache_hits")
+                    return cached.decode("utf-8")
+
+            with span("llm.invoke", model=self.model_name):
+                result = await self._ainvoke_chain(input_data)
+            logger.info("Successfully invoked agent")
+            if key:
+                await self.cache.aset(key, result.encode("utf-8"))
+            return result
+        except Exception as e:
+            logger.error(f"Error invoking agent: {str(e)}")
+            raise
+
+    def stream(
+        self, input_data: Dict[str, Any], use_cache: bool = True
+    ) -> Iterator[str]:
+        """Stream the agent's completion for the given input data chunk by chunk."""
+        try:
+            if not self.chain:
+                raise ValueError("Chain not initialized. Call _setup_chain first.")
+            if not input_data:
+                raise ValueError("Input data is required")
+
+            key = self.cache_key(input_data) if self.cache else None
+            if key and use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info("Served agent response from cache")
+                    count("llm.cache_hits")
+                    yield cached.decode("utf-8")
+                    return
+
+            chunks = []
+            stream = self._stream_chain(input_data)
+            with span("llm.stream", model=self.model_name):
+                try:
+                    for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+                finally:
+                    # Frees the model's slot as soon as the caller stops reading
+                    stream.close()
+            logger.info("Successfully streamed agent response")
+            # Only complete completions are cached; an abandoned stream never gets here
+            if key:
+                self.cache.set(key, "".join(chunks).encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Error streaming agent response: {str(e)}")
+            raise
+
+    async def astream(
+        self, input_data: Dict[str, Any], use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """Asynchronously stream the agent's completion chunk by chunk."""
+        try:
+            if not self.chain:
+                raise ValueError("Chain not initialized. Call _setup_chain first.")
+            if not input_data:
+                raise ValueError("Input data is required")
+
+            key = self.cache_key(input_data) if self.cache else None
+            if key and use_cache:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    logger.info("Served agent response from cache")
+                    count("llm.cache_hits")
+                    yield cached.decode("utf-8")
+                    return
+
+            chunks = []
+            stream = self._astream_chain(input_data)
+            with span("llm.stream", model=self.model_name):
+                try:
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        yield chunk
+                finally:
+                    # Frees the model's slot as soon as the caller stops reading
+                    await stream.aclose()
+            logger.info("Successfully streamed agent response")
+            # Only complete completions are cached; an abandoned stream never gets here
+            if key:
+                await self.cache.aset(key, "".join(chunks).encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Error streaming agent response: {str(e)}")
+            raise
+
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """Validate the input data. To be implemented by child classes."""
         try:
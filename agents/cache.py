@@ -0,0 +1,274 @@
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """Hash the given parts (model, system prompt, input, params...) into a cache key."""
+    serialized = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUCache:
+    """Thread-safe in-memory LRU bounded by entry count, total bytes and TTL."""
+
+    def __init__(
+        self, max_entries: int = 256, max_bytes: int = 256 * 2**20, ttl: float = 0
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached value, or None if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if self.ttl and time.time() - created_at > self.ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, created_at: Optional[float] = None) -> None:
+        """Store a value, evicting least recently used entries beyond the limits."""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, created_at or time.time())
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: str) -> None:
+        """Drop the key if present."""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class SQLiteCache:
+    """On-disk cache tier in a single SQLite file, bounded by total bytes and TTL."""
+
+    def __init__(self, path: str, max_bytes: int = 2**30, ttl: float = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[tuple[bytes, float]]:
+        """Return (value, created_at), or None if the key is missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return row[0], row[1]
+
+    def set(self, key: str, value: bytes) -> None:
+        """Store a value and evict expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        """Drop the key if present."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl:
+            self._conn.execute(
+                "DELETE FROM entries WHERE created_at < ?", (now - self.ttl,)
+            )
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        rows = self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY accessed_at"
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            stale.append((key,))
+            excess -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"entries": entries, "bytes": size}
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + SQLite) content-addressed cache for LLM and image responses."""
+
+    def __init__(self, memory: MemoryLRUCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Look the key up in memory, then on disk, promoting disk hits to memory."""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                entry = self.disk.get(key)
+            except sqlite3.Error as e:
+                # A locked or damaged disk cache only costs a regeneration
+                logger.warning(f"Error reading from disk cache: {str(e)}")
+                entry = None
+            if entry is not None:
+                value, created_at = entry
+                self.memory.set(key, value, created_at)
+                self._count("disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: bytes) -> None:
+        """Write the value through both tiers."""
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except sqlite3.Error as e:
+                logger.warning(f"Error writing to disk cache: {str(e)}")
+        self._count("writes")
+
+    def delete(self, key: str) -> None:
+        """Drop the key from both tiers, e.g. after its value failed validation."""
+        self.memory.delete(key)
+        if self.disk is not None:
+            try:
+                self.disk.delete(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Error deleting from disk cache: {str(e)}")
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        """Async lookup that keeps disk reads off the event loop; like get, a disk
+        error counts as a miss.
+        """
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: bytes) -> None:
+        """Async write that keeps disk writes off the event loop."""
+        await asyncio.to_thread(self.set, key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters, the hit rate and the size of each tier."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["memory"] = self.memory.stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[ResponseCache]:
+    """Return the process-wide response cache, or None when CACHE_ENABLED is false."""
+    global _default_cache
+    if os.getenv("CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                ttl = float(os.getenv("CACHE_TTL", str(7 * 24 * 3600)))
+                memory = MemoryLRUCache(
+                    max_entries=int(os.getenv("CACHE_MEMORY_ENTRIES", "256")),
+                    max_bytes=int(float(os.getenv("CACHE_MEMORY_MB", "256")) * 2**20),
+                    ttl=ttl,
+                )
+                disk = None
+                cache_dir = os.getenv("CACHE_DIR", ".cache")
+                if cache_dir:
+                    disk = SQLiteCache(
+                        os.path.join(cache_dir, "responses.sqlite3"),
+                        max_bytes=int(
+                            float(os.getenv("CACHE_DISK_MB", "1024")) * 2**20
+                        ),
+                        ttl=ttl,
+                    )
+                _default_cache = ResponseCache(memory, disk)
+    return _default_cache
@@ -1,7 +1,9 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 from pydantic import BaseModel, Field
 from .base_agent import BaseAgent
 import logging
+import re
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +16,158 @@ class ContentOutput(BaseModel):
     )
 
 
+class FusedContentOutput(ContentOutput):
+    image_prompt: str = Field(
+        description="Visual prompt for the image model, written with the content"
+    )
+
+
+FIELD_PREFIXES = {"Title:": "title", "Message:": "message", "Tags:": "tags"}
+FUSED_FIELD_PREFIXES = {
+    "Title:": "title",
+    "Image Prompt:": "image_prompt",
+    "Message:": "message",
+    "Tags:": "tags",
+}
+
+REPAIR_PROMPT = """Product description: {product_desc}
+
+Your previous answer for this product was missing the "{prefix}" line.
+{known}Reply with exactly one line in the format:
+{prefix} <{placeholder}>"""
+
+VARIANT_INSTRUCTION = """
+
+This is option {number} of several for the same product: take a distinct angle,
+tone and wording."""
+
+
+def split_tags(text: str) -> List[str]:
+    """Split the text of a Tags: line into tags, separated by commas and/or spaces."""
+    tokens = [token for token in re.split(r"[,\s]+", text) if token]
+    # Space separated hashtags, as in the prompt's own example
+    if tokens and all(token.startswith("#") for token in tokens):
+        return tokens
+    return [tag.strip() for tag in text.split(",") if tag.strip()]
+
+
+def format_field(field: str, value: Any) -> str:
+    """Format a parsed field value the way it appears in a completion."""
+    return " ".join(value) if field == "tags" else value
+
+
+def render_content(
+    fields: Dict[str, Any], prefixes: Optional[Dict[str, str]] = None
+) -> str:
+    """Render parsed fields back into the completion format."""
+    return "\n".join(
+        f"{prefix} {format_field(field, fields[field])}"
+        for prefix, field in (prefixes or FIELD_PREFIXES).items()
+    )
+
+
+class ParseStats:
+    """Thread-safe counters for content parsing outcomes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {
+            "completions": 0,
+            "early_aborts": 0,
+            "parse_failures": 0,
+            "repairs": 0,
+            "repair_failures": 0,
+        }
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+parse_stats = ParseStats()
+
+
+class ContentStreamParser:
+    """Line-oriented state machine that validates Title/Message/Tags as tokens arrive."""
+
+    def __init__(self, prefixes: Optional[Dict[str, str]] = None):
+        self.prefixes = prefixes or FIELD_PREFIXES
+        self._buffer = ""
+        self._parts: List[str] = []
+        # Field whose prefix arrived on a line of its own, awaiting its value
+        self._pending: Optional[str] = None
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def text(self) -> str:
+        """Return everything fed so far."""
+        return "".join(self._parts)
+
+    @property
+    def complete(self) -> bool:
+        """Return whether all the fields have been parsed and validated."""
+        return len(self.fields) == len(self.prefixes)
+
+    def missing(self) -> List[str]:
+        """Return the fields not parsed yet, in output order."""
+        return [f for f in self.prefixes.values() if f not in self.fields]
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return the (field, value) pairs it completed."""
+        self._parts.append(chunk)
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return self._parse_lines(lines)
+
+    def close(self) -> List[Tuple[str, Any]]:
+        """Flush the last, unterminated line."""
+        lines, self._buffer = [self._buffer], ""
+        return self._parse_lines(lines)
+
+    def record(self, field: str, value: str) -> Optional[Tuple[str, Any]]:
+        """Validate and store a field value, returning its event if it is usable."""
+        parsed: Any = split_tags(value) if field == "tags" else value.strip()
+        if not parsed or field in self.fields:
+            return None
+        self.fields[field] = parsed
+        return field, parsed
+
+    def _parse_lines(self, lines: List[str]) -> List[Tuple[str, Any]]:
+        events = []
+        for line in lines:
+            # Tolerate markdown emphasis such as "**Title:** ..."
+            line = line.strip().replace("**", "")
+            if not line:
+                continue
+            prefix = next((p for p in self.prefixes if line.startswith(p)), None)
+            if prefix is None:
+                if self._pending is not None:
+                    event = self.record(self._pending, line)
+                    self._pending = None
+                    if event:
+                        events.append(event)
+                continue
+
+            field = self.prefixes[prefix]
+            value = line[len(prefix) :].strip()
+            self._pending = None
+            if field in self.fields:
+                continue
+            if value:
+                event = self.record(field, value)
+                if event:
+                    events.append(event)
+            else:
+                self._pending = field
+        return events
+
+
 class ContentCreatorAgent(BaseAgent):
-    def __init__(self, model_name: str, api_key: str):
-        super().__init__(model_name, api_key)
-        system_prompt = """You are an expert social media content creator.
+    SYSTEM_PROMPT = """You are an expert social media content creator.
         Your task is to create a different promotion message with the given product description.
         The output promotion message MUST use the following format:
         Title: a powerful, short message that depicts what this product is about
@@ -28,7 +178,12 @@ class ContentCreatorAgent(BaseAgent):
         Title: Stay Hydrated in Style
         Message: Keep your hydration game strong with our sleek 1L water bottle. Perfect for gym, office, or outdoor adventures!
         Tags: #StayHydrated #WaterBottle #Fitness #Lifestyle"""
-        self._setup_chain(system_prompt)
+    FIELD_PREFIXES = FIELD_PREFIXES
+    OUTPUT_MODEL = ContentOutput
+
+    def __init__(self, model_name: str, api_key: str):
+        super().__init__(model_name, api_key)
+        self._setup_chain(self.SYSTEM_PROMPT)
 
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """Validate that input contains a product description."""
@@ -36,47 +191,221 @@ class ContentCreatorAgent(BaseAgent):
             input_data["product_desc"], str
         )
 
-    def create_content(self, product_desc: str) -> ContentOutput:
-        """Create promotional content for the given product description."""
+    def new_parser(self) -> ContentStreamParser:
+        """Return a parser for the fields this agent's completions contain."""
+        return ContentStreamParser(self.FIELD_PREFIXES)
+
+    def content_input(self, product_desc: str, variant: int = 0) -> Dict[str, Any]:
+        """Return the chain input for a product, asking later variants for a distinct take."""
+        if variant:
+            # Also gives every variant its own cache entry
+            product_desc += VARIANT_INSTRUCTION.format(number=variant + 1)
+        return {"input": product_desc}
+
+    def parse_content(self, response: str) -> ContentOutput:
+        """Parse a complete raw completion into structured content."""
+        parser = self.new_parser()
+        parser.feed(response)
+        parser.close()
+        if not parser.complete:
+            raise ValueError("Response format is incorrect. Missing required fields.")
+        return self.OUTPUT_MODEL(**parser.fields)
+
+    def _repair_input(
+        self, product_desc: str, field: str, fields: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        prefixes = {name: prefix for prefix, name in self.FIELD_PREFIXES.items()}
+        known = "".join(
+            f"{prefixes[name]} {format_field(name, value)}\n"
+            for name, value in fields.items()
+        )
+        if known:
+            known = f"You already wrote:\n{known}"
+        prompt = REPAIR_PROMPT.format(
+            product_desc=product_desc,
+            prefix=prefixes[field],
+            placeholder=field.replace("_", " "),
+            known=known,
+        )
+        return {"input": prompt}
+
+    def _parse_repair(self, field: str, response: str) -> Any:
+        parser = self.new_parser()
+        parser.feed(response)
+        parser.close()
+        if field not in parser.fields:
+            parse_stats.count("repair_failures")
+            raise ValueError(f"Response format is incorrect. Could not repair {field}.")
+        return parser.fields[field]
+
+    def repair_field(
+        self, product_desc: str, field: str, fields: Dict[str, Any]
+    ) -> Any:
+        """Ask for just the missing field instead of regenerating all the content."""
+        parse_stats.count("repairs")
+        logger.warning(f"Completion missing {field}, requesting a repair")
+        response = self.invoke(
+            self._repair_input(product_desc, field, fields), use_cache=False
+        )
+        return self._parse_repair(field, response)
+
+    async def arepair_field(
+        self, product_desc: str, field: str, fields: Dict[str, Any]
+    ) -> Any:
+        """Async variant of repair_field."""
+        parse_stats.count("repairs")
+        logger.warning(f"Completion missing {field}, requesting a repair")
+        response = await self.ainvoke(
+            self._repair_input(product_desc, field, fields), use_cache=False
+        )
+        return self._parse_repair(field, response)
+
+    def _finish(self, parser: ContentStreamParser, aborted: bool) -> None:
+        """Record the outcome of a content stream."""
+        parse_stats.count("completions")
+        logger.debug(f"Raw response: {parser.text}")
+        if aborted:
+            parse_stats.count("early_aborts")
+            logger.info("All fields parsed, stopped the generation early")
+        if not parser.complete:
+            parse_stats.count("parse_failures")
+
+    def stream_content(
+        self, product_desc: str, use_cache: bool = True, variant: int = 0
+    ) -> Iterator[Tuple[str, Any]]:
+        """Yield each (field, value) as its line completes, then ("content", output)."""
         if not self.validate_input({"product_desc": product_desc}):
             raise ValueError(
                 "Invalid input: product_desc is required and must be a string"
             )
 
+        input_data = self.content_input(product_desc, variant)
+        parser = self.new_parser()
         try:
-            response = self.invoke({"input": product_desc})
-            logger.debug(f"Raw response: {response}")
+            stream = self.stream(input_data, use_cache=use_cache)
+            aborted = False
+            for chunk in stream:
+                yield from parser.feed(chunk)
+                if parser.complete:
+                    # Closing the stream cancels the generation of trailing tokens
+                    aborted = True
+                    stream.close()
+                    break
+            if not aborted:
+                yield from parser.close()
+            self._finish(parser, aborted)
 
-            # Parse the response into structured output
-            lines = [line.strip() for line in response.split("\n") if line.strip()]
+            if not parser.fields:
+                # Nothing usable came back, a repair would regenerate everything
+                raise ValueError(
+                    "Response format is incorrect. Missing required fields."
+                )
+            repaired = False
+            for field in parser.missing():
+                value = self.repair_field(product_desc, field, parser.fields)
+                parser.fields[field] = value
+                yield field, value
+                repaired = True
+            if aborted or repaired:
+                self.store_cache(
+                    input_data, render_content(parser.fields, self.FIELD_PREFIXES)
+                )
+            yield "content", self.OUTPUT_MODEL(**parser.fields)
+        except Exception as e:
+            # Never keep serving a completion that failed to parse
+            self.invalidate_cache(input_data)
+            logger.error(f"Error creating content: {str(e)}")
+            logger.error(f"Response that caused error: {parser.text}")
+            raise
 
-            # Find the relevant lines
-            title_line = next(
-                (line for line in lines if line.startswith("Title:")), None
-            )
-            message_line = next(
-                (line for line in lines if line.startswith("Message:")), None
+    async def astream_content(
+        self, product_desc: str, use_cache: bool = True, variant: int = 0
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Async variant of stream_content."""
+        if not self.validate_input({"product_desc": product_desc}):
+            raise ValueError(
+                "Invalid input: product_desc is required and must be a string"
             )
-            tags_line = next((line for line in lines if line.startswith("Tags:")), None)
 
-            if not all([title_line, message_line, tags_line]):
+        input_data = self.content_input(product_desc, variant)
+        parser = self.new_parser()
+        try:
+            stream = self.astream(input_data, use_cache=use_cache)
+            aborted = False
+            async for chunk in stream:
+                for event in parser.feed(chunk):
+                    yield event
+                if parser.complete:
+                    # Closing the stream cancels the generation of trailing tokens
+                    aborted = True
+                    await stream.aclose()
+                    break
+            if not aborted:
+                for event in parser.close():
+                    yield event
+            self._finish(parser, aborted)
+
+            if not parser.fields:
+                # Nothing usable came back, a repair would regenerate everything
                 raise ValueError(
                     "Response format is incorrect. Missing required fields."
                 )
+            repaired = False
+            for field in parser.missing():
+                value = await self.arepair_field(product_desc, field, parser.fields)
+                parser.fields[field] = value
+                yield field, value
+                repaired = True
+            if aborted or repaired:
+                await self.astore_cache(
+                    input_data, render_content(parser.fields, self.FIELD_PREFIXES)
+                )
+            yield "content", self.OUTPUT_MODEL(**parser.fields)
+        except Exception as e:
+            # Never keep serving a completion that failed to parse
+            self.invalidate_cache(input_data)
+            logger.error(f"Error creating content: {str(e)}")
+            logger.error(f"Response that caused error: {parser.text}")
+            raise
 
-            title = title_line.split("Title:")[1].strip()
-            message = message_line.split("Message:")[1].strip()
-            tags = [
-                tag.strip() for tag in tags_line.split("Tags:")[1].strip().split(",")
-            ]
+    def create_content(
+        self, product_desc: str, use_cache: bool = True, variant: int = 0
+    ) -> ContentOutput:
+        """Create promotional content for the given product description."""
+        for field, value in self.stream_content(
+            product_desc, use_cache=use_cache, variant=variant
+        ):
+            if field == "content":
+                return value
 
-            # Validate the output
-            if not all([title, message, tags]):
-                raise ValueError("Empty fields in the response")
+    async def acreate_content(
+        self, product_desc: str, use_cache: bool = True, variant: int = 0
+    ) -> ContentOutput:
+        """Asynchronously create promotional content for the given product description."""
+        async for field, value in self.astream_content(
+            product_desc, use_cache=use_cache, variant=variant
+        ):
+            if field == "content":
+                return value
 
-            return ContentOutput(title=title, message=message, tags=tags)
 
-        except Exception as e:
-            logger.error(f"Error creating content: {str(e)}")
-            logger.error(f"Response that caused error: {response}")
-            raise
+class FusedContentCreatorAgent(ContentCreatorAgent):
+    """Write the content and the image prompt in one completion, saving a round trip."""
+
+    SYSTEM_PROMPT = """You are an expert social media content creator and digital artist.
+        Your task is to create a different promotion message with the given product description,
+        together with a visual prompt for a text-to-image model that will illustrate it.
+        The output MUST use the following format, one field per line:
+        Title: a powerful, short message that depicts what this product is about
+        Image Prompt: a vivid, detailed but concise description of the image, focusing on key visual elements such as shape, material, color and unique features
+        Message: be creative for the promotion message, but make it short and ready for social media feeds
+        Tags: the hashtags humans would normally use in social media
+
+        Example format:
+        Title: Stay Hydrated in Style
+        Image Prompt: A sleek matte-black 1L stainless steel water bottle with condensation droplets, on a sunlit gym bench, soft studio lighting, photorealistic
+        Message: Keep your hydration game strong with our sleek 1L water bottle. Perfect for gym, office, or outdoor adventures!
+        Tags: #StayHydrated #WaterBottle #Fitness #Lifestyle"""
+    # The image prompt comes right after the title so the image can start early
+    FIELD_PREFIXES = FUSED_FIELD_PREFIXES
+    OUTPUT_MODEL = FusedContentOutput
@@ -0,0 +1,83 @@
+from typing import Awaitable, Iterator, Optional, TypeVar
+from contextlib import contextmanager
+from contextvars import ContextVar
+import asyncio
+import os
+import time
+
+T = TypeVar("T")
+
+# End-to-end budget of one pipeline run in seconds, 0 to disable
+PIPELINE_DEADLINE = float(os.getenv("PIPELINE_DEADLINE", "300"))
+
+# Absolute (epoch) deadline of the run the current task/thread is working on
+current_deadline: ContextVar[Optional[float]] = ContextVar(
+    "current_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot finish within the run's end-to-end deadline."""
+
+
+def new_deadline(seconds: Optional[float] = None) -> Optional[float]:
+    """Return the epoch deadline of a run starting now, or None when disabled."""
+    budget = PIPELINE_DEADLINE if seconds is None else seconds
+    return time.time() + budget if budget > 0 else None
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[Optional[float]]:
+    """Make `deadline` the one every call in this context sizes its timeouts by."""
+    token = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        try:
+            current_deadline.reset(token)
+        except ValueError:
+            # An async generator finalized from another task's context
+            pass
+
+
+def remaining() -> Optional[float]:
+    """Return the seconds left before the current deadline, None if there is none."""
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.time()
+
+
+def check_deadline(stage: str) -> Optional[float]:
+    """Raise if the deadline has passed, otherwise return the seconds left."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+    return left
+
+
+def bounded_timeout(timeout: float) -> float:
+    """Return `timeout` capped to the time left before the deadline."""
+    left = remaining()
+    return timeout if left is None else max(0.0, min(timeout, left))
+
+
+def check_sleep(delay: float, stage: str) -> None:
+    """Raise instead of sleeping past the deadline."""
+    left = remaining()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded(f"Deadline exceeded while waiting for {stage}")
+
+
+async def await_with_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """Await `awaitable`, cancelling it when the deadline passes."""
+    try:
+        left = check_deadline(stage)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline exceeded during {stage}") from None
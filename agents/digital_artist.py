@@ -1,101 +1,258 @@
-import requests
-import base64
+import binascii
 from io import BytesIO
-from PIL import Image
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any, Optional, Tuple
 from .base_agent import BaseAgent
+from .cache import make_cache_key
+from .image import GeneratedImage
+from .log_utils import summarize_payload
+from .metrics import count, record_bytes, span
+from .transport import (
+    AsyncHTTPTransport,
+    HTTPTransport,
+    get_default_async_transport,
+    get_default_transport,
+)
 import logging
-import time
 import json
+import os
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_IMAGE_API_BASE_URL = "https://ai.api.nvidia.com/v1/genai"
+IMAGE_ENDPOINT_PATH = "stabilityai/stable-diffusion-3-medium"
+
 
 class DigitalArtistAgent(BaseAgent):
-    def __init__(self, model_name: str, api_key: str, image_model: str):
-        super().__init__(model_name, api_key)
-        self.image_model = image_model
-        self.api_key = api_key
-        system_prompt = """You are an expert digital artist.
+    SYSTEM_PROMPT = """You are an expert digital artist.
         Your task is to transform text descriptions into creative visual prompts.
         Focus on creating vivid, detailed descriptions that would make great images.
         The prompt should be detailed but concise, focusing on key visual elements.
         Example: For a water bottle, describe its shape, material, color, and any unique features."""
-        self._setup_chain(system_prompt)
+
+    def __init__(
+        self,
+        model_name: str,
+        api_key: str,
+        image_model: str,
+        base_url: Optional[str] = None,
+        transport: Optional[HTTPTransport] = None,
+        async_transport: Optional[AsyncHTTPTransport] = None,
+    ):
+        super().__init__(model_name, api_key)
+        self.image_model = image_model
+        self.api_key = api_key
+        self.base_url = (
+            base_url or os.getenv("IMAGE_API_BASE_URL", DEFAULT_IMAGE_API_BASE_URL)
+        ).rstrip("/")
+        self.invoke_url = f"{self.base_url}/{IMAGE_ENDPOINT_PATH}"
+        self.transport = transport or get_default_transport()
+        self.async_transport = async_transport or get_default_async_transport()
+        self._setup_chain(self.SYSTEM_PROMPT)
 
     def validate_input(self, input_data: Dict[str, Any]) -> bool:
         """Validate that input contains a text description."""
         return "text" in input_data and isinstance(input_data["text"], str)
 
-    def generate_image(self, text: str, max_retries: int = 3) -> Image.Image:
-        """Generate an image from the given text description."""
+    def build_request(
+        self, prompt: str, seed: int = 0
+    ) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Build the headers and payload for the image generation request."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Accept": "application/json",
+        }
+
+        payload = {
+            "prompt": prompt,
+            "cfg_scale": 7.5,
+            "aspect_ratio": "1:1",
+            "seed": seed,
+            "steps": 50,
+            "negative_prompt": "blurry, low quality, distorted, deformed",
+        }
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Request payload: {json.dumps(summarize_payload(payload))}")
+        return headers, payload
+
+    def extract_image_bytes(self, response_data: Any) -> bytes:
+        """Extract the encoded image bytes returned by the image generation API."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"Response data: {json.dumps(summarize_payload(response_data))}"
+            )
+
+        # Handle the response format
+        if isinstance(response_data, dict):
+            # Check if the API wraps the B64 in an "image" field
+            image_b64 = response_data.get("image")
+            if isinstance(image_b64, str):
+                with span("image.decode_b64") as attrs:
+                    image_data = binascii.a2b_base64(image_b64)
+                    attrs["bytes"] = len(image_data)
+                record_bytes("image.decode_b64", len(image_data))
+            else:
+                logger.error(
+                    "Missing or invalid image data in response: "
+                    f"{summarize_payload(response_data)}"
+                )
+                raise ValueError("Response missing image data")
+        else:
+            logger.error(f"Unexpected response type: {type(response_data)}")
+            raise ValueError("Unexpected response type")
+
+        return image_data
+
+    def decode_image(self, response_data: Any) -> "Image.Image":
+        """Decode the image returned by the image generation API."""
+        from PIL import Image
+
+        return Image.open(BytesIO(self.extract_image_bytes(response_data)))
+
+    def enhance_prompt(self, text: str, use_cache: bool = True) -> str:
+        """Turn a text description into an enhanced visual prompt."""
         if not self.validate_input({"text": text}):
             raise ValueError("Invalid input: text is required and must be a string")
 
+        enhanced_prompt = self.invoke({"input": text}, use_cache=use_cache)
+        logger.debug(f"Enhanced prompt: {enhanced_prompt}")
+        return enhanced_prompt
+
+    async def aenhance_prompt(self, text: str, use_cache: bool = True) -> str:
+        """Asynchronously turn a text description into an enhanced visual prompt."""
+        if not self.validate_input({"text": text}):
+            raise ValueError("Invalid input: text is required and must be a string")
+
+        enhanced_prompt = await self.ainvoke({"input": text}, use_cache=use_cache)
+        logger.debug(f"Enhanced prompt: {enhanced_prompt}")
+        return enhanced_prompt
+
+    def request_image_data(
+        self,
+        prompt: str,
+        max_retries: Optional[int] = None,
+        use_cache: bool = True,
+        seed: int = 0,
+    ) -> GeneratedImage:
+        """Render an already enhanced prompt and return the encoded image bytes."""
+        try:
+            headers, payload = self.build_request(prompt, seed=seed)
+            # The payload is deterministic (explicit seed and sampler settings)
+            key = (
+                make_cache_key("image", self.invoke_url, payload)
+                if self.cache
+                else None
+            )
+            if key and use_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    logger.info("Served image from cache")
+                    count("image.cache_hits")
+                    return GeneratedImage(cached)
+
+            with span("image.request", model=self.image_model):
+                response_data = self.transport.post_json(
+                    self.invoke_url, payload, headers=headers, max_retries=max_retries
+                )
+            image_data = self.extract_image_bytes(response_data)
+            if key:
+                self.cache.set(key, image_data)
+            return GeneratedImage(image_data)
+        except Exception as e:
+            logger.error(f"Error generating image: {str(e)}")
+            raise
+
+    async def arequest_image_data(
+        self,
+        prompt: str,
+        max_retries: Optional[int] = None,
+        use_cache: bool = True,
+        seed: int = 0,
+    ) -> GeneratedImage:
+        """Asynchronously render an already enhanced prompt and return the encoded image bytes."""
+        try:
+            headers, payload = self.build_request(prompt, seed=seed)
+            # The payload is deterministic (explicit seed and sampler settings)
+            key = (
+                make_cache_key("image", self.invoke_url, payload)
+                if self.cache
+                else None
+            )
+            if key and use_cache:
+                cached = await self.cache.aget(key)
+                if cached is not None:
+                    logger.info("Served image from cache")
+                    count("image.cache_hits")
+                    return GeneratedImage(cached)
+
+            with span("image.request", model=self.image_model):
+                response_data = await self.async_transport.post_json(
+                    self.invoke_url, payload, headers=headers, max_retries=max_retries
+                )
+            image_data = self.extract_image_bytes(response_data)
+            if key:
+                await self.cache.aset(key, image_data)
+            return GeneratedImage(image_data)
+        except Exception as e:
+            logger.error(f"Error generating image: {str(e)}")
+            raise
+
+    def request_image(
+        self,
+        prompt: str,
+        max_retries: Optional[int] = None,
+        use_cache: bool = True,
+        seed: int = 0,
+    ) -> "Image.Image":
+        """Render an already enhanced prompt with the image generation API."""
+        return self.request_image_data(
+            prompt, max_retries=max_retries, use_cache=use_cache, seed=seed
+        ).to_pil()
+
+    async def arequest_image(
+        self,
+        prompt: str,
+        max_retries: Optional[int] = None,
+        use_cache: bool = True,
+        seed: int = 0,
+    ) -> "Image.Image":
+        """Asynchronously render an already enhanced prompt with the image generation API."""
+        image = await self.arequest_image_data(
+            prompt, max_retries=max_retries, use_cache=use_cache, seed=seed
+        )
+        return image.to_pil()
+
+    def generate_image(
+        self, text: str, max_retries: Optional[int] = None, use_cache: bool = True
+    ) -> "Image.Image":
+        """Generate an image from the given text description."""
         try:
             # First, enhance the text description
-            enhanced_prompt = self.invoke({"input": text})
-            logger.debug(f"Enhanced prompt: {enhanced_prompt}")
-
-            # Generate image using NVIDIA's API
-            invoke_url = "https://ai.api.nvidia.com/v1/genai/stabilityai/stable-diffusion-3-medium"
-
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Accept": "application/json",
-            }
-
-            payload = {
-                "prompt": enhanced_prompt,
-                "cfg_scale": 7.5,
-                "aspect_ratio": "1:1",
-                "seed": 0,
-                "steps": 50,
-                "negative_prompt": "blurry, low quality, distorted, deformed",
-            }
-
-            logger.debug(f"Request payload: {json.dumps(payload, indent=2)}")
-
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        invoke_url,
-                        headers=headers,
-                        json=payload,
-                        timeout=120,  # Increased timeout to 120 seconds
-                    )
-                    response.raise_for_status()
-
-                    # Parse the response
-                    response_data = response.json()
-                    logger.debug(
-                        f"Response data: {json.dumps(response_data, indent=2)}"
-                    )
-
-                    # Handle the response format
-                    if isinstance(response_data, dict):
-                        # Check if the API wraps the B64 in an "image" field
-                        image_b64 = response_data.get("image")
-                        if isinstance(image_b64, str):
-                            image_data = base64.b64decode(image_b64)
-                        else:
-                            logger.error(
-                                f"Missing or invalid image data in response: {response_data}"
-                            )
-                            raise ValueError("Response missing image data")
-                    else:
-                        logger.error(f"Unexpected response type: {type(response_data)}")
-                        raise ValueError("Unexpected response type")
-
-                    return Image.open(BytesIO(image_data))
-
-                except requests.exceptions.RequestException as e:
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2**attempt)  # Exponential backoff
-                    else:
-                        raise
+            enhanced_prompt = self.enhance_prompt(text, use_cache=use_cache)
+        except Exception as e:
+            logger.error(f"Error generating image: {str(e)}")
+            raise
+
+        # Generate image using NVIDIA's API
+        return self.request_image(
+            enhanced_prompt, max_retries=max_retries, use_cache=use_cache
+        )
 
+    async def agenerate_image(
+        self, text: str, max_retries: Optional[int] = None, use_cache: bool = True
+    ) -> "Image.Image":
+        """Asynchronously generate an image from the given text description."""
+        try:
+            # First, enhance the text description
+            enhanced_prompt = await self.aenhance_prompt(text, use_cache=use_cache)
         except Exception as e:
             logger.error(f"Error generating image: {str(e)}")
             raise
+
+        # Generate image using NVIDIA's API
+        return await self.arequest_image(
+            enhanced_prompt, max_retries=max_retries, use_cache=use_cache
+        )
@@ -0,0 +1,77 @@
+from typing import Any, Optional
+from io import BytesIO
+import binascii
+import os
+
+from .metrics import span
+
+# Magic numbers of the formats the image endpoint can return
+SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+EXTENSIONS = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "gif": ".gif"}
+FORMATS_BY_EXTENSION = {
+    ".jpg": "jpeg",
+    ".jpeg": "jpeg",
+    ".png": "png",
+    ".webp": "webp",
+    ".gif": "gif",
+}
+
+
+def sniff_format(data: memoryview) -> Optional[str]:
+    """Return the image format from the leading magic bytes, if recognized."""
+    head = bytes(data[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+class GeneratedImage:
+    """Encoded image bytes as returned by the API; pixels are decoded only on demand."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.format = sniff_format(memoryview(data))
+        self._pixels: Optional[Any] = None
+
+    @classmethod
+    def from_base64(cls, image_b64: str) -> "GeneratedImage":
+        """Decode the base64 payload once, straight from the response string."""
+        return cls(binascii.a2b_base64(image_b64))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        """Return the file extension matching the encoded format."""
+        return EXTENSIONS.get(self.format, ".jpg")
+
+    def to_pil(self):
+        """Decode the pixels with PIL, once, for steps that actually need them."""
+        if self._pixels is None:
+            from PIL import Image
+
+            # BytesIO over a bytes object shares its buffer instead of copying it
+            with span("image.pil_open"):
+                self._pixels = Image.open(BytesIO(self.data))
+                self._pixels.load()
+        return self._pixels
+
+    def save(self, path: str) -> str:
+        """Write the image to `path`, re-encoding only if the extension needs another format."""
+        target_format = FORMATS_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+        if target_format is not None and target_format == self.format:
+            with open(path, "wb") as f:
+                f.write(memoryview(self.data))
+        else:
+            self.to_pil().save(path)
+        return path
@@ -0,0 +1,554 @@
+from typing import (
+    Any,
+    AsyncIterator,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from .deadline import DeadlineExceeded, check_sleep, remaining
+from .metrics import Sample, percentile, registry
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Completion tokens reserved for an LLM call before its real size is known
+COMPLETION_TOKENS_ESTIMATE = int(os.getenv("COMPLETION_TOKENS_ESTIMATE", "256"))
+
+# Queue-wait samples kept per endpoint for the percentiles
+QUEUE_WAIT_SAMPLES = 1024
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """Return the HTTP status behind an error, if it carries one."""
+    for attr in ("status", "status_code"):
+        status = getattr(error, attr, None)
+        if isinstance(status, int):
+            return status
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status
+    # ChatNVIDIA raises plain exceptions whose message starts with "[429] ..."
+    match = re.match(r"\s*\[(\d{3})\]", str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Return whether an error is transient: throttling, a 5xx or a connection failure."""
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, connection_errors())
+
+
+def connection_errors() -> Tuple[type, ...]:
+    """Return the connection and timeout errors of the HTTP clients in use.
+
+    Looked up in sys.modules: a client that was never imported cannot have
+    raised, and importing it here would defeat its lazy import.
+    """
+    errors: List[type] = [asyncio.TimeoutError, TimeoutError]
+    requests = sys.modules.get("requests")
+    if requests is not None:
+        errors += [requests.exceptions.ConnectionError, requests.exceptions.Timeout]
+    aiohttp = sys.modules.get("aiohttp")
+    if aiohttp is not None:
+        errors.append(aiohttp.ClientConnectionError)
+    return tuple(errors)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Fail fast while an endpoint keeps failing, then let a single probe call through.
+
+    Closed, calls go through and `failure_threshold` consecutive failures open the
+    breaker. Open, calls raise CircuitOpenError until `reset_timeout` has passed.
+    Half-open, one probe goes through: its success closes the breaker, its failure
+    opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def before_call(self) -> bool:
+        """Raise while the breaker is open, otherwise return whether this call is the probe."""
+        with self._lock:
+            if self._state == self.OPEN:
+                left = self.reset_timeout - (time.monotonic() - self._opened_at)
+                if left > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"{self.name} is unavailable, retrying it in {left:.1f}s"
+                    )
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"{self.name} is unavailable, probe in flight"
+                    )
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed: Optional[bool], probe: bool = False) -> None:
+        """Record a call outcome, None when the call says nothing about the endpoint."""
+        with self._lock:
+            if probe:
+                self._probing = False
+            if failed is None:
+                return
+            if not failed:
+                self._failures = 0
+                if probe:
+                    self._state = self.CLOSED
+                    logger.info(f"{self.name} recovered, circuit breaker closed")
+                return
+            self._failures += 1
+            if probe or (
+                self._state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logger.warning(
+                    f"{self.name} failed {self._failures} times in a row, "
+                    f"circuit breaker open for {self.reset_timeout:.0f}s"
+                )
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out reservations instead of polling.
+
+    A reservation may drive the bucket negative; the caller then sleeps for the
+    returned delay, so concurrent callers queue up in reservation order.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1.0, per_minute / 6.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens and return how long to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # A request larger than the burst still goes through, once it is paid for
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+
+class _AsyncWaiter:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def wake(self) -> None:
+        def resolve():
+            if not self.future.done():
+                self.future.set_result(None)
+
+        try:
+            self.loop.call_soon_threadsafe(resolve)
+        except RuntimeError:
+            # The waiter's loop is gone, nobody is waiting there any more
+            pass
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit shared by threads and event loops.
+
+    The limit grows by about one slot per window of successful calls and is cut
+    multiplicatively (at most once per cooldown) when the endpoint throttles or fails.
+    """
+
+    def __init__(
+        self,
+        initial: int = 8,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque[Union[threading.Event, _AsyncWaiter]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _try_acquire(self) -> bool:
+        if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return True
+        return False
+
+    def _wake_waiters(self) -> None:
+        # Called with the lock held
+        free = int(self._limit) - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                waiter.wake()
+            free -= 1
+
+    def _abandon(self, waiter: Union[threading.Event, _AsyncWaiter]) -> None:
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            else:
+                # Already woken: hand the wake-up on to the next waiter
+                self._wake_waiters()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block the calling thread until a slot is free, False if `timeout` runs out."""
+        end = None if timeout is None else time.monotonic() + timeout
+        event = threading.Event()
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return True
+                event.clear()
+                self._waiters.append(event)
+            if not event.wait(
+                None if end is None else max(0.0, end - time.monotonic())
+            ):
+                self._abandon(event)
+                return False
+
+    async def aacquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait without blocking the event loop until a slot is free, False on timeout."""
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if self._try_acquire():
+                    return True
+                waiter = _AsyncWaiter(loop)
+                self._waiters.append(waiter)
+            try:
+                if end is None:
+                    await waiter.future
+                else:
+                    await asyncio.wait_for(waiter.future, max(0.0, end - loop.time()))
+            except asyncio.TimeoutError:
+                self._abandon(waiter)
+                return False
+            except asyncio.CancelledError:
+                self._abandon(waiter)
+                raise
+
+    def release(self, overloaded: bool = False, succeeded: bool = True) -> None:
+        """Free a slot and adapt the limit to how the call went."""
+        with self._lock:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease >= self.cooldown:
+                    self._limit = max(self.minimum, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.warning(
+                        f"Endpoint overloaded, concurrency limit cut to {self.limit}"
+                    )
+            elif succeeded:
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            self._wake_waiters()
+
+
+class EndpointLimiter:
+    """Rate buckets, adaptive concurrency and a circuit breaker for one endpoint."""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm, burst=tpm / 4) if tpm else None
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.breaker = breaker or CircuitBreaker(name)
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=QUEUE_WAIT_SAMPLES)
+        self._counters = {
+            "calls": 0,
+            "succeeded": 0,
+            "overloaded": 0,
+            "failed": 0,
+            "queue_wait_total_s": 0.0,
+            "queue_wait_max_s": 0.0,
+        }
+
+    def _rate_delay(self, tokens: int) -> float:
+        delay = self.requests.reserve() if self.requests else 0.0
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self._counters["calls"] += 1
+            self._counters["queue_wait_total_s"] += waited
+            self._counters["queue_wait_max_s"] = max(
+                self._counters["queue_wait_max_s"], waited
+            )
+            self._waits.append(waited)
+        if waited > 0.05:
+            logger.debug(f"Waited {waited:.2f}s for a {self.name} slot")
+
+    def _release(self, error: Optional[BaseException], probe: bool) -> None:
+        # Cancellations, abandoned streams and our own deadline say nothing about
+        # the endpoint's health
+        if error is not None and (
+            not isinstance(error, Exception) or isinstance(error, DeadlineExceeded)
+        ):
+            self.breaker.record(None, probe)
+            self.concurrency.release(succeeded=False)
+            return
+        overloaded = error is not None and is_retryable(error)
+        # Throttling means the endpoint is up, only errors and timeouts trip the breaker
+        self.breaker.record(overloaded and error_status(error) != 429, probe)
+        with self._lock:
+            if error is None:
+                self._counters["succeeded"] += 1
+            elif overloaded:
+                self._counters["overloaded"] += 1
+            else:
+                self._counters["failed"] += 1
+        self.concurrency.release(overloaded=overloaded, succeeded=error is None)
+
+    def _wait_timeout(self) -> Optional[float]:
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded while waiting for {self.name}")
+        return left
+
+    def _slot_timed_out(self) -> DeadlineExceeded:
+        return DeadlineExceeded(
+            f"Deadline exceeded while waiting for a {self.name} slot"
+        )
+
+    @contextmanager
+    def limit(self, tokens: int = 0) -> Iterator[float]:
+        """Hold a rate-limited slot for one call, yielding the time spent queueing.
+
+        Raises CircuitOpenError while the endpoint is failing and DeadlineExceeded
+        when the slot would only come after the current deadline.
+        """
+        probe = self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            delay = self._rate_delay(tokens)
+            if delay:
+                check_sleep(delay, self.name)
+                time.sleep(delay)
+            if not self.concurrency.acquire(self._wait_timeout()):
+                raise self._slot_timed_out()
+        except BaseException:
+            self.breaker.record(None, probe)
+            raise
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        try:
+            yield waited
+        except BaseException as e:
+            self._release(e, probe)
+            raise
+        self._release(None, probe)
+
+    @asynccontextmanager
+    async def alimit(self, tokens: int = 0) -> AsyncIterator[float]:
+        """Async variant of limit."""
+        probe = self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            delay = self._rate_delay(tokens)
+            if delay:
+                check_sleep(delay, self.name)
+                await asyncio.sleep(delay)
+            if not await self.concurrency.aacquire(self._wait_timeout()):
+                raise self._slot_timed_out()
+        except BaseException:
+            self.breaker.record(None, probe)
+            raise
+        waited = time.monotonic() - start
+        self._record_wait(waited)
+        try:
+            yield waited
+        except BaseException as e:
+            self._release(e, probe)
+            raise
+        self._release(None, probe)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return call outcomes, queue-wait times and the current concurrency limit."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            waits = list(self._waits)
+        stats["queue_wait_mean_s"] = (
+            stats["queue_wait_total_s"] / stats["calls"] if stats["calls"] else 0.0
+        )
+        for pct in (50, 95):
+            stats[f"queue_wait_p{pct}_s"] = percentile(waits, pct)
+        stats["concurrency_limit"] = self.concurrency.limit
+        stats["in_flight"] = self.concurrency.in_flight
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.opened
+        stats["breaker_rejected"] = self.breaker.rejected
+        return stats
+
+
+def parse_rate_limits(value: str) -> Dict[str, List[Optional[float]]]:
+    """Parse RATE_LIMITS entries of the form `endpoint=rpm[:tpm]`, comma separated."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, spec = entry.rpartition("=")
+        rpm, _, tpm = spec.partition(":")
+        limits[name] = [float(rpm) if rpm else None, float(tpm) if tpm else None]
+    return limits
+
+
+_limiters: Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(endpoint: str) -> EndpointLimiter:
+    """Return the process-wide limiter of an endpoint (a model name or an URL)."""
+    limiter = _limiters.get(endpoint)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(endpoint)
+            if limiter is None:
+                rpm = float(os.getenv("RATE_LIMIT_RPM", "0")) or None
+                tpm = float(os.getenv("RATE_LIMIT_TPM", "0")) or None
+                overrides = parse_rate_limits(os.getenv("RATE_LIMITS", ""))
+                if endpoint in overrides:
+                    rpm, tpm = overrides[endpoint]
+                concurrency = AdaptiveConcurrency(
+                    initial=int(os.getenv("ENDPOINT_CONCURRENCY", "8")),
+                    minimum=int(os.getenv("ENDPOINT_CONCURRENCY_MIN", "1")),
+                    maximum=int(os.getenv("ENDPOINT_CONCURRENCY_MAX", "64")),
+                )
+                breaker = CircuitBreaker(
+                    endpoint,
+                    failure_threshold=int(os.getenv("BREAKER_FAILURES", "5")),
+                    reset_timeout=float(os.getenv("BREAKER_RESET_S", "30")),
+                )
+                limiter = EndpointLimiter(endpoint, rpm, tpm, concurrency, breaker)
+                _limiters[endpoint] = limiter
+    return limiter
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the stats of every endpoint limiter created so far."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+
+def limiter_metrics() -> Iterator[Sample]:
+    """Sample the endpoint limiters for the metrics endpoint."""
+    for endpoint, stats in limiter_stats().items():
+        labels = {"endpoint": endpoint}
+        for outcome in ("succeeded", "overloaded", "failed"):
+            yield (
+                "endpoint_calls_total",
+                "counter",
+                "Calls per endpoint by outcome.",
+                {**labels, "outcome": outcome},
+                stats[outcome],
+            )
+        yield (
+            "endpoint_queue_wait_seconds_total",
+            "counter",
+            "Time spent waiting for rate limits and concurrency slots.",
+            labels,
+            stats["queue_wait_total_s"],
+        )
+        yield (
+            "endpoint_concurrency_limit",
+            "gauge",
+            "Current adaptive concurrency limit.",
+            labels,
+            stats["concurrency_limit"],
+        )
+        yield (
+            "endpoint_in_flight",
+            "gauge",
+            "Calls currently in flight.",
+            labels,
+            stats["in_flight"],
+        )
+        yield (
+            "endpoint_breaker_open",
+            "gauge",
+            "1 while the endpoint's circuit breaker is not closed.",
+            labels,
+            int(stats["breaker_state"] != CircuitBreaker.CLOSED),
+        )
+
+
+registry.register_collector(limiter_metrics)
@@ -0,0 +1,17 @@
+from typing import Any
+
+# Strings longer than this (e.g. base64 images) are elided from logged payloads
+MAX_LOGGED_STRING = 256
+
+
+def summarize_payload(value: Any, max_string: int = MAX_LOGGED_STRING) -> Any:
+    """Return a copy of a JSON-like payload that is safe and cheap to log."""
+    if isinstance(value, dict):
+        return {k: summarize_payload(v, max_string) for k, v in value.items()}
+    if isinstance(value, list):
+        return [summarize_payload(v, max_string) for v in value]
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes omitted>"
+    if isinstance(value, str) and len(value) > max_string:
+        return f"{value[:64]}...<{len(value)} chars omitted>"
+    return value
@@ -0,0 +1,351 @@
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = "genai"
+
+# Seconds; covers cache hits through slow image generations
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+# (name, type, help, labels, value) of a metric sampled at scrape time
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Return the nearest-rank percentile of the given values, 0 without any."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape(value)}"' for name, value in sorted(labels.items()))
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with labels."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            labels = _format_labels(dict(zip(self.labels, key)))
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts, then sum and count
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def lines(self) -> Iterator[str]:
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in sorted(values.items()):
+            labels = dict(zip(self.labels, key))
+            # Bucket counts are cumulative, the +Inf bucket is the total count
+            bounds = self.buckets + (float("inf"),)
+            for bound, count in zip(bounds, counts[: len(self.buckets)] + counts[-1:]):
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                yield f"{self.name}_bucket{bucket_labels} {_format_value(count)}"
+            yield f"{self.name}_sum{_format_labels(labels)} {_format_value(counts[-2])}"
+            yield f"{self.name}_count{_format_labels(labels)} {_format_value(counts[-1])}"
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = METRICS_PREFIX):
+        self.prefix = prefix
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args: Any, **kwargs: Any):
+        name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labels)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labels, buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        """Add a function that samples gauges/counters kept elsewhere at scrape time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.lines())
+        # Samples of one metric must be listed together, whichever order they come in
+        families: Dict[str, List[str]] = {}
+        for collector in collectors:
+            try:
+                samples = list(collector())
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, metric_type, help, labels, value in samples:
+                name = f"{self.prefix}_{name}"
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [
+                        f"# HELP {name} {help}",
+                        f"# TYPE {name} {metric_type}",
+                    ]
+                family.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)
+)
+STAGE_ERRORS = registry.counter(
+    "stage_errors_total", "Stage failures by exception type.", ("stage", "error")
+)
+RETRIES = registry.counter(
+    "retries_total", "Retried attempts per endpoint.", ("endpoint",)
+)
+BYTES = registry.counter("bytes_total", "Bytes handled per stage.", ("stage",))
+
+
+class RunTimings:
+    """Spans and counters of one run, written to its timings.json."""
+
+    def __init__(self, run: str):
+        self.run = run
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add_span(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        error: Optional[str],
+        attrs: Dict[str, Any],
+    ) -> None:
+        span = {
+            "name": name,
+            "start_s": round(start - self._start, 6),
+            "duration_s": round(duration, 6),
+            **attrs,
+        }
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+
+    def add(self, name: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the per-stage totals, the counters and the raw spans."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_s"])
+            counters = dict(self.counters)
+        stages: Dict[str, Dict[str, float]] = {}
+        for span in spans:
+            stage = stages.setdefault(
+                span["name"], {"count": 0, "total_s": 0.0, "max_s": 0.0}
+            )
+            stage["count"] += 1
+            stage["total_s"] = round(stage["total_s"] + span["duration_s"], 6)
+            stage["max_s"] = max(stage["max_s"], span["duration_s"])
+        return {
+            "run": self.run,
+            "started_at": self.started_at,
+            "total_s": round(time.perf_counter() - self._start, 6),
+            "stages": stages,
+            "counters": counters,
+            "spans": spans,
+        }
+
+    def write(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+# Timings of the run the current task/thread is working on
+current_timings: ContextVar[Optional[RunTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextmanager
+def run_timings(
+    output_dir: str, filename: str = "timings.json"
+) -> Iterator[RunTimings]:
+    """Collect the spans emitted in this context and write them to the run's directory."""
+    timings = RunTimings(output_dir)
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+        try:
+            timings.write(os.path.join(output_dir, filename))
+        except OSError as e:
+            logger.error(f"Error writing run timings: {str(e)}")
+
+
+def count(name: str, amount: float = 1.0) -> None:
+    """Add to a counter of the current run, if there is one."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(name, amount)
+
+
+def record_bytes(stage: str, amount: int) -> None:
+    """Count bytes handled by a stage, globally and for the current run."""
+    BYTES.inc(amount, stage=stage)
+    count(f"{stage}.bytes", amount)
+
+
+def record_retry(endpoint: str) -> None:
+    """Count a retried attempt, globally and for the current run."""
+    RETRIES.inc(endpoint=endpoint)
+    count("retries")
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """Time a stage into the stage latency histogram and the current run's timings.
+
+    Yields the span's attributes, so the stage can add to them (e.g. a byte count).
+    """
+    timings = current_timings.get()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except GeneratorExit:
+        # A stream closed early by its consumer did not fail
+        raise
+    except BaseException as e:
+        error = type(e).__name__
+        if isinstance(e, Exception):
+            STAGE_ERRORS.inc(stage=name, error=error)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        if timings is not None:
+            timings.add_span(name, start, duration, error, attrs)
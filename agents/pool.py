@@ -0,0 +1,88 @@
+from typing import Any, Dict, Hashable, Tuple, Type
+from .base_agent import BaseAgent
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPool:
+    """Process-wide, thread-safe registry that builds each agent configuration once."""
+
+    def __init__(self):
+        self._agents: Dict[Tuple[Hashable, ...], BaseAgent] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _make_key(
+        agent_cls: Type[BaseAgent], model_name: str, api_key: str, **kwargs: Any
+    ) -> Tuple[Hashable, ...]:
+        """Build the pool key from the agent class, model, API key and system prompt."""
+        system_prompt = getattr(agent_cls, "SYSTEM_PROMPT", None)
+        return (
+            agent_cls.__qualname__,
+            model_name,
+            api_key,
+            system_prompt,
+            tuple(sorted(kwargs.items())),
+        )
+
+    def get(
+        self, agent_cls: Type[BaseAgent], model_name: str, api_key: str, **kwargs: Any
+    ) -> BaseAgent:
+        """Return the pooled agent for this configuration, building it on first use."""
+        key = self._make_key(agent_cls, model_name, api_key, **kwargs)
+        agent = self._agents.get(key)
+        if agent is not None:
+            with self._lock:
+                self._hits += 1
+            return agent
+
+        with self._lock:
+            # Another worker may have built the agent while we waited for the lock
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._hits += 1
+                return agent
+
+            try:
+                agent = agent_cls(model_name, api_key, **kwargs)
+            except Exception as e:
+                logger.error(f"Error building pooled agent: {str(e)}")
+                raise
+            self._agents[key] = agent
+            self._misses += 1
+            logger.info(
+                f"Pooled new {agent_cls.__name__} for model: {model_name} "
+                f"(pool size: {len(self._agents)})"
+            )
+            return agent
+
+    def warm_up(
+        self, agent_cls: Type[BaseAgent], model_name: str, api_key: str, **kwargs: Any
+    ) -> BaseAgent:
+        """Build an agent ahead of the first request so requests only see pool hits."""
+        agent = self.get(agent_cls, model_name, api_key, **kwargs)
+        logger.info(f"Warmed up {agent_cls.__name__} for model: {model_name}")
+        return agent
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the number of pooled agents."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "size": len(self._agents),
+            }
+
+    def clear(self) -> None:
+        """Drop every pooled agent and reset the counters."""
+        with self._lock:
+            self._agents.clear()
+            self._hits = 0
+            self._misses = 0
+
+
+agent_pool = AgentPool()
@@ -0,0 +1,253 @@
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import (
+    BrokenExecutor,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+)
+from io import BytesIO
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# The usual social channels, a ready-made RENDITIONS value
+CHANNEL_RENDITIONS = (
+    "square=1080x1080:jpeg:85,"
+    "portrait=1080x1350:jpeg:85,"
+    "story=1080x1920:jpeg:85,"
+    "landscape=1200x628:jpeg:85,"
+    "thumbnail=320x320:webp:75"
+)
+# Channel renditions as `name=WIDTHxHEIGHT[:format[:quality]]`, comma separated;
+# empty (the default) skips post-processing
+RENDITIONS = os.getenv("RENDITIONS", "")
+# Processes rendering in parallel, shared by every run of the process
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", str(os.cpu_count() or 1)))
+
+FORMATS = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+
+
+class RenditionSpec:
+    """Target box, format and quality of one channel's rendition."""
+
+    def __init__(
+        self,
+        name: str,
+        width: int,
+        height: int,
+        format: str = "jpeg",
+        quality: int = 85,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown rendition format: {format}")
+        self.name = name
+        self.width = width
+        self.height = height
+        self.format = format
+        self.quality = quality
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format]
+
+    def __repr__(self) -> str:
+        return (
+            f"RenditionSpec({self.name}={self.width}x{self.height}"
+            f":{self.format}:{self.quality})"
+        )
+
+
+def parse_renditions(value: str) -> List[RenditionSpec]:
+    """Parse RENDITIONS entries of the form `name=WIDTHxHEIGHT[:format[:quality]]`."""
+    specs = []
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rest = entry.partition("=")
+        size, *options = rest.split(":")
+        width, _, height = size.lower().partition("x")
+        specs.append(
+            RenditionSpec(
+                name.strip(),
+                int(width),
+                int(height),
+                options[0] if options else "jpeg",
+                int(options[1]) if len(options) > 1 else 85,
+            )
+        )
+    return specs
+
+
+RENDITION_SPECS = parse_renditions(RENDITIONS)
+
+
+def fit_size(source: Tuple[int, int], target: Tuple[int, int]) -> Tuple[int, int]:
+    """Return the target size, scaled down so the crop is never upscaled."""
+    scale = min(1.0, source[0] / target[0], source[1] / target[1])
+    return max(1, round(target[0] * scale)), max(1, round(target[1] * scale))
+
+
+def render(source_path: str, spec: RenditionSpec, output_path: str) -> Dict[str, Any]:
+    """Center-crop the source to the spec's aspect ratio, resize and encode it.
+
+    Runs in a pool process, so it reads and writes the files itself instead of
+    passing pixels between processes.
+    """
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    with Image.open(source_path) as image:
+        size = fit_size(image.size, (spec.width, spec.height))
+        # JPEG sources can be decoded straight at a fraction of their size
+        image.draft("RGB", size)
+        image = ImageOps.fit(image.convert("RGB"), size, Image.Resampling.LANCZOS)
+    options: Dict[str, Any] = {"quality": spec.quality}
+    if spec.format == "jpeg":
+        options.update(optimize=True, progressive=True)
+    elif spec.format == "webp":
+        options.update(method=4)
+    buffer = BytesIO()
+    image.save(buffer, spec.format.upper(), **options)
+    data = buffer.getbuffer()
+    # Written aside and renamed, so a reader never sees half a file
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+    return {
+        "name": spec.name,
+        "path": output_path,
+        "width": size[0],
+        "height": size[1],
+        "bytes": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def rendition_path(source_path: str, spec: RenditionSpec) -> str:
+    """Return where a rendition of `source_path` is written: next to it, suffixed."""
+    stem = os.path.splitext(source_path)[0]
+    return f"{stem}_{spec.name}{spec.extension}"
+
+
+def rendition_context() -> multiprocessing.context.BaseContext:
+    """Return the multiprocessing context the rendition workers are started with.
+
+    Never fork: by the time renditions are needed the process runs threads
+    (the log listener, the manifest writer, Gradio, asyncio.to_thread) whose
+    locks a forked child could inherit held. A forkserver starts the workers
+    from a clean single-threaded process; spawn is the portable fallback.
+    """
+    method = os.getenv("RENDITION_START_METHOD") or (
+        "forkserver"
+        if "forkserver" in multiprocessing.get_all_start_methods()
+        else "spawn"
+    )
+    return multiprocessing.get_context(method)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_rendition_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool the renditions are rendered in."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=RENDITION_WORKERS, mp_context=rendition_context()
+                )
+    return _pool
+
+
+def shutdown_rendition_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _discard_broken_pool(pool: Executor) -> None:
+    """Drop the shared pool once one of its workers died, e.g. killed by the OOM
+    killer: a broken pool refuses every later task, so the next call starts anew.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _rendition_failed(pool: Executor, spec: RenditionSpec, error: Exception) -> None:
+    """Log a failed rendition; renditions are best-effort, the image is kept."""
+    if isinstance(error, BrokenExecutor):
+        _discard_broken_pool(pool)
+    logger.error(f"Error rendering {spec.name}: {str(error)}")
+
+
+def render_all(
+    source_path: str,
+    specs: List[RenditionSpec],
+    pool: Optional[Executor] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Render every spec in the pool, yielding each rendition as soon as it is done."""
+    pool = pool or get_rendition_pool()
+    futures: Dict[Future, RenditionSpec] = {}
+    for spec in specs:
+        try:
+            future = pool.submit(
+                render, source_path, spec, rendition_path(source_path, spec)
+            )
+        except BrokenExecutor as e:
+            _rendition_failed(pool, spec, e)
+            break
+        futures[future] = spec
+    for future in as_completed(futures):
+        try:
+            yield future.result()
+        except Exception as e:
+            _rendition_failed(pool, futures[future], e)
+
+
+async def arender_all(
+    source_path: str,
+    specs: List[RenditionSpec],
+    pool: Optional[Executor] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Async render_all: the event loop only waits on the pool."""
+    pool = pool or get_rendition_pool()
+    loop = asyncio.get_running_loop()
+    futures: Dict[asyncio.Future, RenditionSpec] = {}
+    for spec in specs:
+        try:
+            future = loop.run_in_executor(
+                pool, render, source_path, spec, rendition_path(source_path, spec)
+            )
+        except BrokenExecutor as e:
+            _rendition_failed(pool, spec, e)
+            break
+        futures[future] = spec
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    yield future.result()
+                except Exception as e:
+                    _rendition_failed(pool, futures[future], e)
+    finally:
+        for future in pending:
+            future.cancel()
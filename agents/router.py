@@ -0,0 +1,263 @@
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import time
+
+from .deadline import DeadlineExceeded
+from .limits import CircuitBreaker, CircuitOpenError, get_limiter
+from .metrics import Sample, percentile, registry
+
+logger = logging.getLogger(__name__)
+
+# Latest calls per model that the rolling stats are computed over
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "200"))
+# Calls older than this (in seconds) no longer count, so a demoted model gets retried
+ROUTER_WINDOW_S = float(os.getenv("ROUTER_WINDOW_S", "300"))
+# p95 latency in seconds above which a model is skipped for the next tier
+ROUTER_LATENCY_SLO_S = float(os.getenv("ROUTER_LATENCY_SLO_S", "30"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.25"))
+# Calls needed before a model's stats are trusted to demote it
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "5"))
+
+
+class ModelStats:
+    """Rolling latency and error rate of the calls made to one model."""
+
+    def __init__(
+        self, model: str, window: int = ROUTER_WINDOW, window_s: float = ROUTER_WINDOW_S
+    ):
+        self.model = model
+        self.window_s = window_s
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency: float, failed: bool = False) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), latency, failed))
+            self.calls += 1
+            self.errors += failed
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Time the enclosed call and record it, as failed if it raises.
+
+        Our own deadline and circuit breaker errors say nothing about the model
+        and are not recorded.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        except (DeadlineExceeded, CircuitOpenError):
+            raise
+        except GeneratorExit:
+            # A stream closed early once it had what it needed
+            self.record(time.monotonic() - start)
+            raise
+        except Exception:
+            self.record(time.monotonic() - start, failed=True)
+            raise
+        else:
+            self.record(time.monotonic() - start)
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window_s
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return list(self._samples)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the rolling p50/p95 latency and error rate plus lifetime counters."""
+        samples = self._recent()
+        latencies = [latency for _, latency, _ in samples]
+        failed = sum(1 for _, _, is_failed in samples if is_failed)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "samples": len(samples),
+            "p50_s": round(percentile(latencies, 50), 3),
+            "p95_s": round(percentile(latencies, 95), 3),
+            "error_rate": round(failed / len(samples), 3) if samples else 0.0,
+        }
+
+
+_model_stats: Dict[str, ModelStats] = {}
+_model_stats_lock = threading.Lock()
+
+
+def get_model_stats(model: str) -> ModelStats:
+    """Return the process-wide rolling stats of a model."""
+    stats = _model_stats.get(model)
+    if stats is None:
+        with _model_stats_lock:
+            stats = _model_stats.setdefault(model, ModelStats(model))
+    return stats
+
+
+class ModelRouter:
+    """Route a role to the first model of its ordered tiers that is within its SLO.
+
+    A model is skipped while its rolling p95 latency exceeds the SLO, its error
+    rate exceeds the budget or its circuit breaker is open. Stats age out after
+    ROUTER_WINDOW_S, so a demoted model gets traffic again once it is forgotten.
+    """
+
+    def __init__(
+        self,
+        role: str,
+        models: List[str],
+        latency_slo: float = ROUTER_LATENCY_SLO_S,
+        max_error_rate: float = ROUTER_MAX_ERROR_RATE,
+        min_samples: int = ROUTER_MIN_SAMPLES,
+    ):
+        if not models:
+            raise ValueError(f"No models configured for role: {role}")
+        self.role = role
+        self.models = models
+        self.latency_slo = latency_slo
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self._current = models[0]
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {model: 0 for model in models}
+
+    def health(self, model: str) -> Optional[str]:
+        """Return why a model should be skipped, None if it is healthy."""
+        if get_limiter(model).breaker.state == CircuitBreaker.OPEN:
+            return "circuit open"
+        stats = get_model_stats(model).snapshot()
+        if stats["samples"] < self.min_samples:
+            return None
+        if stats["error_rate"] > self.max_error_rate:
+            return f"error rate {stats['error_rate']:.0%}"
+        if stats["p95_s"] > self.latency_slo:
+            return f"p95 {stats['p95_s']:.1f}s over the {self.latency_slo:.1f}s SLO"
+        return None
+
+    def choose(self) -> str:
+        """Return the model the next call of this role should go to."""
+        reasons = {}
+        for model in self.models:
+            reason = self.health(model)
+            if reason is None:
+                break
+            reasons[model] = reason
+        else:
+            # Every tier is degraded, fall back to the one doing best
+            snapshots = {name: get_model_stats(name).snapshot() for name in self.models}
+            model = min(
+                self.models,
+                key=lambda name: (
+                    snapshots[name]["error_rate"],
+                    snapshots[name]["p95_s"],
+                ),
+            )
+        with self._lock:
+            if model != self._current:
+                skipped = ", ".join(f"{name}: {why}" for name, why in reasons.items())
+                logger.warning(
+                    f"Routing {self.role} from {self._current} to {model}"
+                    + (f" ({skipped})" if skipped else "")
+                )
+                self._current = model
+            self.routed[model] += 1
+        return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the active model and the per-tier stats and health."""
+        return {
+            "active": self._current,
+            "models": {
+                model: {
+                    "tier": tier,
+                    "routed": self.routed[model],
+                    "health": self.health(model) or "ok",
+                    **get_model_stats(model).snapshot(),
+                }
+                for tier, model in enumerate(self.models)
+            },
+        }
+
+
+def parse_latency_slos(value: str) -> Dict[str, float]:
+    """Parse ROUTER_LATENCY_SLOS entries of the form `role=seconds`, comma separated."""
+    slos = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        role, _, seconds = entry.partition("=")
+        slos[role.strip()] = float(seconds)
+    return slos
+
+
+def parse_models(value: str) -> List[str]:
+    """Parse an ordered, comma separated list of model tiers."""
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+_routers: Dict[str, ModelRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(role: str, models: List[str]) -> ModelRouter:
+    """Return the process-wide router of a role, rebuilt if its tiers change."""
+    router = _routers.get(role)
+    if router is None or router.models != models:
+        with _routers_lock:
+            router = _routers.get(role)
+            if router is None or router.models != models:
+                slo = parse_latency_slos(os.getenv("ROUTER_LATENCY_SLOS", "")).get(
+                    role, ROUTER_LATENCY_SLO_S
+                )
+                router = ModelRouter(role, models, latency_slo=slo)
+                _routers[role] = router
+    return router
+
+
+def router_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the stats of every router created so far."""
+    with _routers_lock:
+        routers = list(_routers.values())
+    return {router.role: router.stats() for router in routers}
+
+
+def router_metrics() -> Iterator[Sample]:
+    """Sample the per-model routing stats for the metrics endpoint."""
+    for role, routing in router_stats().items():
+        for model, stats in routing["models"].items():
+            labels = {"role": role, "model": model}
+            yield (
+                "model_routed_total",
+                "counter",
+                "Calls routed to each model tier.",
+                labels,
+                stats["routed"],
+            )
+            for name in ("p50", "p95"):
+                yield (
+                    f"model_latency_{name}_seconds",
+                    "gauge",
+                    f"Rolling {name} latency of each model.",
+                    labels,
+                    stats[f"{name}_s"],
+                )
+            yield (
+                "model_error_rate",
+                "gauge",
+                "Rolling error rate of each model.",
+                labels,
+                stats["error_rate"],
+            )
+            yield (
+                "model_active",
+                "gauge",
+                "1 for the model a role is currently routed to.",
+                labels,
+                int(model == routing["active"]),
+            )
+
+
+registry.register_collector(router_metrics)
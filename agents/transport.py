@@ -0,0 +1,291 @@
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from email.utils import parsedate_to_datetime
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+
+from .deadline import bounded_timeout, check_deadline, check_sleep, remaining
+from .limits import RETRYABLE_STATUS_CODES, get_limiter
+from .metrics import record_bytes, record_retry, span
+
+# requests and aiohttp are imported by the transports that use them, so a process
+# only pays for the HTTP client it actually needs
+if TYPE_CHECKING:
+    import aiohttp
+
+    _LoopSessions = weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, aiohttp.ClientSession
+    ]
+
+logger = logging.getLogger(__name__)
+
+
+def backoff_delay(
+    attempt: int,
+    retry_after: Optional[float] = None,
+    base: float = 1.0,
+    maximum: float = 30.0,
+) -> float:
+    """Return the sleep before the next attempt, honoring Retry-After when given."""
+    if retry_after is not None:
+        # Small jitter keeps clients that got the same hint from retrying in lockstep
+        return min(retry_after, maximum) + random.uniform(0, 0.5)
+    # Full jitter exponential backoff
+    return random.uniform(0, min(maximum, base * 2**attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _TransportConfig:
+    """Timeout, retry and pool settings shared by the sync and async transports."""
+
+    def __init__(
+        self,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        pool_size: Optional[int] = None,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+    ):
+        self.connect_timeout = connect_timeout or float(
+            os.getenv("CONNECT_TIMEOUT", "10")
+        )
+        self.read_timeout = read_timeout or float(os.getenv("TIMEOUT", "120"))
+        self.max_retries = max_retries or int(os.getenv("MAX_RETRIES", "3"))
+        self.pool_size = pool_size or int(os.getenv("HTTP_POOL_SIZE", "16"))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Return the sleep before the next attempt, honoring Retry-After when given."""
+        return backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+
+class HTTPTransport(_TransportConfig):
+    """Keep-alive HTTP transport with a sized connection pool, timeouts and retries."""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.session = requests.Session()
+        # Retries are handled here so Retry-After and jitter apply uniformly
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            pool_block=True,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Return the (connect, read) timeout pair, capped to the current deadline."""
+        return (
+            bounded_timeout(self.connect_timeout),
+            bounded_timeout(self.read_timeout),
+        )
+
+    def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        max_retries: Optional[int] = None,
+    ) -> Any:
+        """POST a JSON payload and return the decoded JSON response, retrying transient errors."""
+        import requests
+
+        attempts = max_retries or self.max_retries
+        limiter = get_limiter(url)
+        for attempt in range(attempts):
+            retry_after = None
+            try:
+                # Every attempt goes through the endpoint's rate and concurrency limits
+                check_deadline(url)
+                with limiter.limit():
+                    try:
+                        # Streamed, so the request and the body download are timed apart
+                        with span("http.request"):
+                            response = self.session.post(
+                                url,
+                                headers=headers,
+                                json=payload,
+                                timeout=self.timeout,
+                                stream=True,
+                            )
+                        with response, span("http.download") as attrs:
+                            if response.status_code in RETRYABLE_STATUS_CODES:
+                                retry_after = parse_retry_after(
+                                    response.headers.get("Retry-After")
+                                )
+                            response.raise_for_status()
+                            body = response.content
+                            attrs["bytes"] = len(body)
+                    except requests.exceptions.Timeout:
+                        # A timeout cut short by the deadline is not the endpoint's fault
+                        check_deadline(url)
+                        raise
+                record_bytes("http.download", len(body))
+                return json.loads(body)
+            except requests.exceptions.RequestException as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                retryable = status is None or status in RETRYABLE_STATUS_CODES
+                logger.warning(f"Attempt {attempt + 1} failed: {str(e)}")
+                if not retryable or attempt >= attempts - 1:
+                    raise
+                delay = self.backoff_delay(attempt, retry_after)
+                check_sleep(delay, url)
+                logger.info(f"Retrying in {delay:.2f}s")
+                record_retry(url)
+                time.sleep(delay)
+
+    def close(self) -> None:
+        """Close the pooled connections."""
+        self.session.close()
+
+
+class AsyncHTTPTransport(_TransportConfig):
+    """asyncio counterpart of HTTPTransport backed by one aiohttp session per event loop."""
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        # aiohttp sessions are bound to the loop they were created on
+        self._sessions: "_LoopSessions" = weakref.WeakKeyDictionary()
+
+    @property
+    def timeout(self) -> "aiohttp.ClientTimeout":
+        """Return the aiohttp timeout with separate connect and read limits."""
+        import aiohttp
+
+        return aiohttp.ClientTimeout(
+            sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        """Return the session for the running loop, creating it on first use."""
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[loop] = session
+        return session
+
+    def _request_timeout(self) -> "aiohttp.ClientTimeout":
+        """Return the session timeout with a total capped to the current deadline."""
+        import aiohttp
+
+        left = remaining()
+        if left is None:
+            return self.timeout
+        return aiohttp.ClientTimeout(
+            total=left, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+        )
+
+    async def post_json(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None,
+        max_retries: Optional[int] = None,
+    ) -> Any:
+        """POST a JSON payload and return the decoded JSON response, retrying transient errors."""
+        import aiohttp
+
+        attempts = max_retries or self.max_retries
+        session = self._get_session()
+        limiter = get_limiter(url)
+        for attempt in range(attempts):
+            retry_after = None
+            try:
+                # Every attempt goes through the endpoint's rate and concurrency limits
+                check_deadline(url)
+                async with limiter.alimit():
+                    try:
+                        with span("http.request"):
+                            response = await session.post(
+                                url,
+                                headers=headers,
+                                json=payload,
+                                timeout=self._request_timeout(),
+                            )
+                        async with response:
+                            with span("http.download") as attrs:
+                                if response.status in RETRYABLE_STATUS_CODES:
+                                    retry_after = parse_retry_after(
+                                        response.headers.get("Retry-After")
+                                    )
+                                response.raise_for_status()
+                                body = await response.read()
+                                attrs["bytes"] = len(body)
+                    except asyncio.TimeoutError:
+                        # A timeout cut short by the deadline is not the endpoint's fault
+                        check_deadline(url)
+                        raise
+                record_bytes("http.download", len(body))
+                return json.loads(body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = getattr(e, "status", None)
+                retryable = status is None or status in RETRYABLE_STATUS_CODES
+                logger.warning(f"Attempt {attempt + 1} failed: {str(e) or repr(e)}")
+                if not retryable or attempt >= attempts - 1:
+                    raise
+                delay = self.backoff_delay(attempt, retry_after)
+                check_sleep(delay, url)
+                logger.info(f"Retrying in {delay:.2f}s")
+                record_retry(url)
+                await asyncio.sleep(delay)
+
+    async def close(self) -> None:
+        """Close the session owned by the running loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+
+_default_transport: Optional[HTTPTransport] = None
+_default_async_transport: Optional[AsyncHTTPTransport] = None
+_default_transport_lock = threading.Lock()
+
+
+def get_default_transport() -> HTTPTransport:
+    """Return the process-wide shared transport, creating it on first use."""
+    global _default_transport
+    if _default_transport is None:
+        with _default_transport_lock:
+            if _default_transport is None:
+                _default_transport = HTTPTransport()
+    return _default_transport
+
+
+def get_default_async_transport() -> AsyncHTTPTransport:
+    """Return the process-wide shared async transport, creating it on first use."""
+    global _default_async_transport
+    if _default_async_transport is None:
+        with _default_transport_lock:
+            if _default_async_transport is None:
+                _default_async_transport = AsyncHTTPTransport()
+    return _default_async_transport
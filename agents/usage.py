@@ -0,0 +1,102 @@
+from typing import Any, Dict, Iterator, Optional
+import threading
+
+from .metrics import Sample, count, registry
+
+
+class TokenUsage:
+    """Thread-safe per-model totals of the token usage reported by the LLM endpoints."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(
+                model, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+        count("prompt_tokens", prompt_tokens)
+        count("completion_tokens", completion_tokens)
+
+    def handler(self, model: str) -> Any:
+        """Return a callback handler that records into these totals under `model`."""
+        return usage_callback_class()(self, model)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return a copy of the per-model totals."""
+        with self._lock:
+            return {model: dict(totals) for model, totals in self._totals.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+    def metrics(self) -> Iterator[Sample]:
+        """Sample the totals for the metrics endpoint."""
+        for model, totals in self.stats().items():
+            for kind in ("prompt", "completion"):
+                yield (
+                    "llm_tokens_total",
+                    "counter",
+                    "Tokens reported by the LLM endpoints.",
+                    {"model": model, "kind": kind},
+                    totals[f"{kind}_tokens"],
+                )
+            yield (
+                "llm_calls_total",
+                "counter",
+                "Completed LLM calls.",
+                {"model": model},
+                totals["calls"],
+            )
+
+
+_usage_callback: Optional[type] = None
+
+
+def usage_callback_class() -> type:
+    """Return the LangChain callback handler class, defined on first use so that
+    importing this module does not import LangChain.
+    """
+    global _usage_callback
+    if _usage_callback is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class UsageCallback(BaseCallbackHandler):
+            """Read the usage metadata off each finished (streamed or not) chat completion."""
+
+            def __init__(self, usage: TokenUsage, model: str):
+                self.usage = usage
+                self.model = model
+
+            def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+                for generations in response.generations:
+                    for generation in generations:
+                        message = getattr(generation, "message", None)
+                        metadata = getattr(message, "usage_metadata", None)
+                        if metadata:
+                            self.usage.record(
+                                self.model,
+                                metadata.get("input_tokens", 0),
+                                metadata.get("output_tokens", 0),
+                            )
+                            return
+                token_usage = (response.llm_output or {}).get("token_usage")
+                if token_usage:
+                    self.usage.record(
+                        self.model,
+                        token_usage.get("prompt_tokens", 0),
+                        token_usage.get("completion_tokens", 0),
+                    )
+
+        _usage_callback = UsageCallback
+    return _usage_callback
+
+
+# Process-wide totals, fed by every agent's chain
+token_usage = TokenUsage()
+registry.register_collector(token_usage.metrics)
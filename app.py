@@ -1,102 +1,383 @@
-import gradio as gr
+if __name__ == "__main__":
+    # Before the imports below, which read their settings from the environment
+    from bootstrap import init
+
+    init()
+
 from workflow import (
-    State,
-    create_agents,
-    create_content,
-    generate_image,
+    MAX_VARIANTS,
+    PIPELINE_MODE,
+    PIPELINE_MODES,
+    Variant,
+    astream_pipeline,
+    astream_variants,
     create_output_directory,
+    get_agent_config,
+    new_state,
+    record_run,
+    warm_up_agents,
 )
+from agents.metrics import registry, run_timings
+from agents.router import router_stats
+from artifacts import gc_if_configured
+from jobs import FINISHED, get_job_store, launch_workers
+from singleflight import AsyncSingleFlight
+from run_logging import run_scope
 import os
-from dotenv import load_dotenv
 import logging
-from PIL import Image
-import io
-import numpy as np
+import signal
+import sys
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
 
-# Load environment variables
-load_dotenv()
+# Gradio (and the FastAPI app under it) is only imported to build the UI
+if TYPE_CHECKING:
+    import gradio as gr
+    from fastapi.responses import PlainTextResponse
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Identical concurrent submissions share one pipeline execution
+pipeline_flights = AsyncSingleFlight()
 
-def process_product_description(
-    product_desc: str,
-) -> tuple[str, str, str, str, np.ndarray]:
-    """Process the product description and generate content and image."""
-    try:
-        # Create output directory
-        output_dir = create_output_directory()
-
-        # Initialize state
-        state = State(
-            product_desc=product_desc,
-            content=None,
-            image=None,
-            feedback=None,
-            error=None,
-            output_dir=output_dir,
+# Submit generations to the job queue instead of running them in this process
+JOB_QUEUE = os.getenv("JOB_QUEUE", "false").lower() in ("1", "true", "yes")
+# Worker processes started with the app when the job queue is used, 0 to run them apart
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0"))
+
+# Address the UI and the metrics endpoint are served on (Gradio's own variables)
+GRADIO_SERVER_NAME = os.getenv("GRADIO_SERVER_NAME", "127.0.0.1")
+GRADIO_SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+
+
+def flight_metrics():
+    """Sample the request coalescing counters for the metrics endpoint."""
+    for name, value in pipeline_flights.stats().items():
+        metric_type = "gauge" if name == "in_flight" else "counter"
+        suffix = "" if name == "in_flight" else "_total"
+        yield (
+            f"pipeline_{name}{suffix}",
+            metric_type,
+            f"Pipeline submissions: {name.replace('_', ' ')}.",
+            {},
+            value,
         )
 
-        # Generate content
-        state = create_content(state)
-        if state.get("error"):
-            return state["error"], "", "", "", None
-
-        # Generate image
-        state = generate_image(state)
-        if state.get("error"):
-            return state["error"], "", "", "", None
-
-        # Convert PIL Image to numpy array for Gradio
-        img_array = np.array(state["image"])
-
-        return (
-            "",  # No error
-            state["content"].title,
-            state["content"].message,
-            ", ".join(state["content"].tags),
-            img_array,
+
+registry.register_collector(flight_metrics)
+
+
+def metrics_response() -> "PlainTextResponse":
+    """Serve the aggregate metrics in the Prometheus text format."""
+    from fastapi.responses import PlainTextResponse
+
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def pipeline_key(
+    product_desc: str, mode: Optional[str] = None, variants: int = 1
+) -> tuple:
+    """Return the coalescing key: the description plus everything that shapes the output."""
+    config = get_agent_config()
+    return (
+        product_desc.strip(),
+        tuple(config["content_models"]),
+        tuple(config["fused_models"]),
+        tuple(config["artist_models"]),
+        config["image_model"],
+        config["image_base_url"],
+        mode or PIPELINE_MODE,
+        variants,
+    )
+
+
+async def stream_pipeline(
+    product_desc: str, mode: Optional[str] = None, variants: int = 1
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Stream content and image generation for one description in a fresh output directory."""
+    # Create output directory
+    output_dir = create_output_directory()
+
+    # Initialize state
+    state = new_state(product_desc, output_dir)
+
+    # Generate content and image without holding a worker thread
+    with run_scope(output_dir), run_timings(output_dir) as timings:
+        if variants > 1:
+            events = astream_variants(state, variants, mode=mode)
+        else:
+            events = astream_pipeline(state, mode=mode)
+        async for event in events:
+            if event[0] == "state":
+                state = event[1]
+            yield event
+        record_run(state, mode, timings)
+
+
+def variant_caption(index: int, variant: Variant) -> str:
+    """Return the gallery caption of a variant: its number and its content."""
+    if variant["error"]:
+        return f"{index + 1}. Failed: {variant['error']}"
+    content = variant["content"]
+    return f"{index + 1}. {content.title}\n{content.message}\n{' '.join(content.tags)}"
+
+
+def job_gallery(result: Dict[str, Any]) -> List[tuple]:
+    """Return the gallery entries of a finished job's variants."""
+    return [
+        (variant["image_path"], job_variant_caption(index, variant))
+        for index, variant in enumerate(result.get("variants") or [])
+        if variant["image_path"]
+    ]
+
+
+def job_variant_caption(index: int, variant: Dict[str, Any]) -> str:
+    """Return the gallery caption of a variant from a job's result."""
+    if variant["error"]:
+        return f"{index + 1}. Failed: {variant['error']}"
+    tags = " ".join(variant["tags"])
+    return f"{index + 1}. {variant['title']}\n{variant['message']}\n{tags}"
+
+
+async def process_queued(
+    product_desc: str, mode: Optional[str] = None, variants: int = 1
+) -> AsyncIterator[tuple[str, str, str, str, Optional[str], List[tuple]]]:
+    """Submit the generation to the interactive lane and push its progress as it is polled.
+
+    Closing the stream (e.g. the Cancel button) cancels the job.
+    """
+    store = get_job_store()
+    job_id = await store.asubmit(product_desc, mode, variants, lane="interactive")
+    job = None
+    try:
+        async for job in store.watch(job_id):
+            if job["status"] in FINISHED:
+                break
+            progress = job["progress"] or {}
+            yield (
+                "",
+                progress.get("title", ""),
+                progress.get("message", ""),
+                ", ".join(progress.get("tags", [])),
+                progress.get("image"),
+                [],
+            )
+        if job["status"] != "succeeded":
+            yield job["error"] or f"Job {job['status']}", "", "", "", None, []
+            return
+        result = job["result"]
+        yield (
+            "",
+            result["title"],
+            result["message"],
+            ", ".join(result["tags"]),
+            result["image_path"],
+            job_gallery(result),
         )
+    finally:
+        if job is None or job["status"] not in FINISHED:
+            await store.acancel(job_id)
+
+
+async def process_product_description(
+    product_desc: str,
+    mode: Optional[str] = None,
+    variants: int = 1,
+) -> AsyncIterator[tuple[str, str, str, str, Optional[str], List[tuple]]]:
+    """Process the product description, pushing the text as it streams and then the image.
+
+    With several variants, each one is added to the gallery as soon as it is done.
+    """
+    title, message, tags = "", "", ""
+    variants = int(variants or 1)
+    if JOB_QUEUE:
+        try:
+            async for outputs in process_queued(product_desc, mode, variants):
+                yield outputs
+        except Exception as e:
+            logger.error(f"Error in process_product_description: {str(e)}")
+            yield str(e), "", "", "", None, []
+        return
+    gallery: List[tuple] = []
+    finished = {}
+    try:
+        async for event, value in pipeline_flights.stream(
+            pipeline_key(product_desc, mode, variants),
+            lambda: stream_pipeline(product_desc, mode, variants),
+        ):
+            if event == "title":
+                title = value
+            elif event == "message":
+                message = value
+            elif event == "tags":
+                tags = ", ".join(value)
+            elif event == "image":
+                # Shown right away, the renditions are still being written
+                yield "", title, message, tags, value, gallery
+                continue
+            elif event == "rendition":
+                continue
+            elif event == "variant":
+                index, variant = value
+                finished[index] = variant
+                gallery = [
+                    (finished[i]["image_path"], variant_caption(i, finished[i]))
+                    for i in sorted(finished)
+                    if finished[i]["image_path"]
+                ]
+            elif event == "state":
+                if value.get("error"):
+                    yield value["error"], "", "", "", None, gallery
+                    return
+                # Gradio serves the saved file as is, without decoding it to pixels
+                yield (
+                    "",  # No error
+                    value["content"].title,
+                    value["content"].message,
+                    ", ".join(value["content"].tags),
+                    value.get("image_path"),
+                    gallery,
+                )
+                continue
+            yield "", title, message, tags, None, gallery
 
     except Exception as e:
         logger.error(f"Error in process_product_description: {str(e)}")
-        return str(e), "", "", "", None
+        yield str(e), "", "", "", None, []
 
 
-# Create Gradio interface
-with gr.Blocks(
-    title="NVIDIA Agentic AI Content Generator", theme=gr.themes.Soft()
-) as demo:
-    gr.Markdown("# NVIDIA Agentic AI Content Generator")
-    gr.Markdown(
-        "Enter a product description to generate promotional content and images."
-    )
+MODEL_STATS_HEADERS = [
+    "Role",
+    "Tier",
+    "Model",
+    "Routed",
+    "p50 (s)",
+    "p95 (s)",
+    "Error rate",
+    "Health",
+]
+
 
-    with gr.Row():
-        with gr.Column():
-            product_input = gr.Textbox(
-                label="Product Description",
-                placeholder="Enter a detailed description of your product...",
-                lines=3,
+def model_stats_rows() -> List[list]:
+    """Return one table row per routed model with its rolling latency and health."""
+    rows = []
+    for role, routing in router_stats().items():
+        for model, stats in routing["models"].items():
+            active = " (active)" if model == routing["active"] else ""
+            rows.append(
+                [
+                    role,
+                    stats["tier"],
+                    model + active,
+                    stats["routed"],
+                    stats["p50_s"],
+                    stats["p95_s"],
+                    f"{stats['error_rate']:.0%}",
+                    stats["health"],
+                ]
             )
-            submit_btn = gr.Button("Generate Content", variant="primary")
-
-    with gr.Row():
-        with gr.Column():
-            error_output = gr.Textbox(label="Error", visible=False)
-            title_output = gr.Textbox(label="Generated Title")
-            message_output = gr.Textbox(label="Generated Message", lines=3)
-            tags_output = gr.Textbox(label="Generated Tags")
-            image_output = gr.Image(label="Generated Image", type="numpy")
-
-    # Set up the processing function
-    submit_btn.click(
-        fn=process_product_description,
-        inputs=[product_input],
-        outputs=[error_output, title_output, message_output, tags_output, image_output],
-    )
+    return rows
+
+
+def build_demo() -> "gr.Blocks":
+    """Create the Gradio interface."""
+    import gradio as gr
+
+    with gr.Blocks(
+        title="NVIDIA Agentic AI Content Generator", theme=gr.themes.Soft()
+    ) as demo:
+        gr.Markdown("# NVIDIA Agentic AI Content Generator")
+        gr.Markdown(
+            "Enter a product description to generate promotional content and images."
+        )
+
+        with gr.Row():
+            with gr.Column():
+                product_input = gr.Textbox(
+                    label="Product Description",
+                    placeholder="Enter a detailed description of your product...",
+                    lines=3,
+                )
+                mode_input = gr.Radio(
+                    choices=list(PIPELINE_MODES),
+                    value=PIPELINE_MODE,
+                    label="Pipeline Mode",
+                    info="fused writes the content and the image prompt in one LLM call",
+                )
+                variants_input = gr.Slider(
+                    minimum=1,
+                    maximum=MAX_VARIANTS,
+                    value=1,
+                    step=1,
+                    label="Variants",
+                    info="Candidate posts to generate concurrently, shown in the gallery",
+                )
+                submit_btn = gr.Button("Generate Content", variant="primary")
+                cancel_btn = gr.Button("Cancel")
+
+        with gr.Row():
+            with gr.Column():
+                error_output = gr.Textbox(label="Error", visible=False)
+                title_output = gr.Textbox(label="Generated Title")
+                message_output = gr.Textbox(label="Generated Message", lines=3)
+                tags_output = gr.Textbox(label="Generated Tags")
+                image_output = gr.Image(label="Generated Image", type="filepath")
+                gallery_output = gr.Gallery(label="Variants", columns=4)
+
+        with gr.Accordion("Model Routing", open=False):
+            model_stats_output = gr.Dataframe(
+                headers=MODEL_STATS_HEADERS, value=model_stats_rows, interactive=False
+            )
+            refresh_btn = gr.Button("Refresh")
+            refresh_btn.click(fn=model_stats_rows, outputs=model_stats_output)
+
+        # Set up the processing function
+        submit_event = submit_btn.click(
+            fn=process_product_description,
+            inputs=[product_input, mode_input, variants_input],
+            outputs=[
+                error_output,
+                title_output,
+                message_output,
+                tags_output,
+                image_output,
+                gallery_output,
+            ],
+            # In-flight generations are bounded by PIPELINE_CONCURRENCY instead
+            concurrency_limit=None,
+        )
+        submit_event.then(fn=model_stats_rows, outputs=model_stats_output)
+        # Closes the running stream, which cancels its queued job, or its in-process
+        # run once no other session is waiting on the same generation
+        cancel_btn.click(fn=None, cancels=[submit_event])
+
+    return demo
+
+
+def main():
+    """Serve the Gradio app, with /metrics, on GRADIO_SERVER_NAME:GRADIO_SERVER_PORT."""
+    import gradio as gr
+    import uvicorn
+    from fastapi import FastAPI
+
+    gc_if_configured()
+    if JOB_QUEUE and JOB_WORKERS:
+        # Runs the exit handlers, which stop the launched workers, on SIGTERM too
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        launch_workers(JOB_WORKERS)
+    try:
+        pool_stats = warm_up_agents()
+        logger.info(f"Agent pool warmed up: {pool_stats}")
+    except Exception as e:
+        logger.warning(f"Agent warm-up failed, agents will be built lazily: {str(e)}")
+
+    # Registered before the UI is mounted at /, so Gradio's routes cannot shadow it
+    server = FastAPI()
+    server.add_api_route("/metrics", metrics_response, methods=["GET"])
+    server = gr.mount_gradio_app(server, build_demo(), path="/")
+    uvicorn.run(server, host=GRADIO_SERVER_NAME, port=GRADIO_SERVER_PORT)
+
 
 if __name__ == "__main__":
-    demo.launch(share=True)
+    main()
@@ -0,0 +1,532 @@
+"""
+Artifact store for the generated runs.
+
+Every run gets its own collision-free directory under ARTIFACT_ROOT. Images are
+stored once per content hash under `objects/` and hard-linked into the run
+directories, and a SQLite manifest indexes the runs (description, models,
+params, outputs and timings) for lookup. Manifest writes go through a
+background thread, off the request path.
+
+    python artifacts.py find "water bottle"
+    python artifacts.py show <run id>
+    python artifacts.py gc --retention-days 30 --max-mb 2048
+"""
+
+if __name__ == "__main__":
+    # Before the imports below, which read their settings from the environment
+    from bootstrap import init
+
+    init()
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import secrets
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ROOT = os.getenv("ARTIFACT_ROOT", "AI_Response")
+# Runs older than this are deleted by the garbage collector, 0 to keep them
+ARTIFACT_RETENTION_DAYS = float(os.getenv("ARTIFACT_RETENTION_DAYS", "0"))
+# Image and rendition bytes kept before the oldest runs are deleted, 0 for no limit
+ARTIFACT_MAX_MB = float(os.getenv("ARTIFACT_MAX_MB", "0"))
+# Unreferenced objects younger than this may belong to a manifest write still queued
+OBJECT_GRACE_S = 600
+# Runs still marked running are only collected once this old (their process died)
+RUNNING_GRACE_S = 3600
+
+RUN_ID_FORMAT = "%d%b%y_%H%M%S"
+
+
+def new_run_id() -> str:
+    """Return a run id: the readable timestamp plus a random suffix, unique per call."""
+    return f"{datetime.now().strftime(RUN_ID_FORMAT)}_{secrets.token_hex(3)}"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        output_dir TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        finished_at REAL,
+        status TEXT NOT NULL DEFAULT 'running',
+        product_desc TEXT,
+        mode TEXT,
+        models TEXT,
+        params TEXT,
+        title TEXT,
+        message TEXT,
+        tags TEXT,
+        image_path TEXT,
+        error TEXT,
+        timings TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at)",
+    "CREATE INDEX IF NOT EXISTS runs_product_desc ON runs (product_desc)",
+    """CREATE TABLE IF NOT EXISTS artifacts (
+        run_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        sha256 TEXT NOT NULL,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (run_id, name)
+    )""",
+    "CREATE INDEX IF NOT EXISTS artifacts_sha256 ON artifacts (sha256)",
+    """CREATE TABLE IF NOT EXISTS objects (
+        sha256 TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL
+    )""",
+)
+
+# Columns of the runs table that hold JSON
+JSON_COLUMNS = ("models", "params", "tags", "timings")
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ManifestWriter:
+    """Apply manifest writes on a background thread, committing them in batches."""
+
+    def __init__(self, path: str, max_batch: int = 256):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="manifest-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, sql: str, params: Sequence[Any] = ()) -> None:
+        """Queue a statement; it is applied shortly, in order."""
+        self._queue.put((sql, tuple(params)))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every write queued so far is committed."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        conn = _connect(self.path)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = []
+            try:
+                for item in batch:
+                    if item is None:
+                        running = False
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        conn.execute(*item)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Error writing artifact manifest: {str(e)}")
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+
+class ArtifactStore:
+    """Run directories, content-addressed images and the manifest indexing them."""
+
+    def __init__(self, root: str = ARTIFACT_ROOT):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifest_path = os.path.join(root, "manifest.sqlite")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = _connect(self.manifest_path)
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        self.writer = ManifestWriter(self.manifest_path)
+
+    def create_run_dir(self) -> str:
+        """Create the directory of a new run and register the run in the manifest."""
+        while True:
+            run_id = new_run_id()
+            output_dir = os.path.join(self.root, run_id)
+            try:
+                os.makedirs(output_dir)
+                break
+            except FileExistsError:
+                continue
+        self.writer.write(
+            "INSERT OR IGNORE INTO runs (run_id, output_dir, created_at, status) "
+            "VALUES (?, ?, ?, ?)",
+            (run_id, output_dir, time.time(), "running"),
+        )
+        return output_dir
+
+    def _object_path(self, sha256: str, extension: str) -> str:
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}{extension}")
+
+    def save_image(
+        self, output_dir: str, name: str, data: bytes, extension: str
+    ) -> str:
+        """Store image bytes once per content hash and link them into the run directory.
+
+        Returns the path in the run directory, `<output_dir>/<name><extension>`.
+        """
+        sha256 = content_hash(data)
+        object_path = self._object_path(sha256, extension)
+        created = not os.path.exists(object_path)
+        if created:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # Written aside and renamed, so a concurrent reader never sees half a file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(memoryview(data))
+                os.replace(tmp_path, object_path)
+            except BaseException:
+                _remove_quietly(tmp_path)
+                raise
+
+        path = os.path.join(output_dir, f"{name}{extension}")
+        # Linked aside and renamed over the path: a regenerated image replaces the
+        # previous one, and concurrent saves into one directory do not collide
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        try:
+            try:
+                os.link(object_path, tmp_path)
+            except OSError:
+                # No hard links across filesystems (or on some platforms), keep a copy
+                shutil.copyfile(object_path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            # Gone after the rename, unless the path already linked to the same
+            # object: renaming one link of a file over another keeps both names
+            _remove_quietly(tmp_path)
+
+        now = time.time()
+        if created:
+            self.writer.write(
+                "INSERT OR IGNORE INTO objects VALUES (?, ?, ?, ?)",
+                (sha256, object_path, len(data), now),
+            )
+        self.writer.write(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+            (os.path.basename(output_dir), name, sha256, path, len(data), now),
+        )
+        return path
+
+    def record_artifact(
+        self, output_dir: str, name: str, sha256: str, path: str, size: int
+    ) -> None:
+        """Queue a manifest entry for a file a run wrote itself, e.g. a rendition."""
+        self.writer.write(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?)",
+            (os.path.basename(output_dir), name, sha256, path, size, time.time()),
+        )
+
+    def record_run(self, output_dir: str, **fields: Any) -> None:
+        """Queue an update of the run's manifest entry (status, outputs, timings...)."""
+        values = {
+            name: json.dumps(value) if name in JSON_COLUMNS else value
+            for name, value in fields.items()
+        }
+        columns = ["run_id", "output_dir", "created_at", *values]
+        updates = ", ".join(f"{name} = excluded.{name}" for name in values)
+        self.writer.write(
+            f"INSERT INTO runs ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT (run_id) DO UPDATE SET {updates}",
+            (
+                os.path.basename(output_dir),
+                output_dir,
+                time.time(),
+                *values.values(),
+            ),
+        )
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        run = dict(row)
+        for name in JSON_COLUMNS:
+            if run.get(name) is not None:
+                run[name] = json.loads(run[name])
+        return run
+
+    def find_runs(
+        self,
+        product_desc: Optional[str] = None,
+        contains: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[float] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Return the latest runs matching an exact description, a substring or a status."""
+        conditions, params = [], []
+        if product_desc is not None:
+            conditions.append("product_desc = ?")
+            params.append(product_desc)
+        if contains:
+            conditions.append("product_desc LIKE ?")
+            params.append(f"%{contains}%")
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM runs {where} ORDER BY created_at DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Return a run's manifest entry with its artifacts, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            artifacts = self._conn.execute(
+                "SELECT name, sha256, path, size FROM artifacts WHERE run_id = ?",
+                (run_id,),
+            ).fetchall()
+        if row is None:
+            return None
+        run = self._decode(row)
+        run["artifacts"] = [dict(artifact) for artifact in artifacts]
+        return run
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of runs and the unique and linked image bytes."""
+        with self._lock:
+            runs = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+            objects, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects"
+            ).fetchone()
+            linked = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM artifacts"
+            ).fetchone()[0]
+        return {
+            "runs": runs,
+            "objects": objects,
+            "stored_bytes": stored,
+            "linked_bytes": linked,
+        }
+
+    def _owns(self, output_dir: str) -> bool:
+        """Whether `output_dir` lies inside the store's root, outside its objects."""
+        root = os.path.realpath(self.root)
+        objects_dir = os.path.realpath(self.objects_dir)
+        path = os.path.realpath(output_dir)
+        return (
+            path != root
+            and os.path.commonpath([root, path]) == root
+            and os.path.commonpath([objects_dir, path]) != objects_dir
+        )
+
+    def _delete_runs(self, runs: List[Tuple[str, str]]) -> None:
+        for run_id, output_dir in runs:
+            # Runs registered outside the root (e.g. a batch's images directory)
+            # only lose their manifest entries, their files are not ours to delete
+            if self._owns(output_dir):
+                shutil.rmtree(output_dir, ignore_errors=True)
+            else:
+                logger.warning(f"Not deleting {output_dir}: outside {self.root}")
+        self._conn.executemany(
+            "DELETE FROM artifacts WHERE run_id = ?", [(run_id,) for run_id, _ in runs]
+        )
+        self._conn.executemany(
+            "DELETE FROM runs WHERE run_id = ?", [(run_id,) for run_id, _ in runs]
+        )
+
+    def _referenced_bytes(self) -> int:
+        # Deduplicated images count once, files a run wrote itself (renditions)
+        # are only recorded in artifacts and count per run
+        return self._conn.execute(
+            "SELECT (SELECT COALESCE(SUM(size), 0) FROM objects WHERE sha256 IN "
+            "(SELECT sha256 FROM artifacts)) + (SELECT COALESCE(SUM(size), 0) "
+            "FROM artifacts WHERE sha256 NOT IN (SELECT sha256 FROM objects))"
+        ).fetchone()[0]
+
+    def collect_garbage(
+        self,
+        retention_days: float = ARTIFACT_RETENTION_DAYS,
+        max_bytes: float = ARTIFACT_MAX_MB * 2**20,
+    ) -> Dict[str, int]:
+        """Delete runs past the retention period, then the oldest runs while the
+        images and renditions they reference exceed `max_bytes`, then the images
+        no run references.
+        """
+        self.writer.flush()
+        now = time.time()
+        deleted_runs = 0
+        finished = "(status != 'running' OR created_at < ?)"
+        with self._lock:
+            if retention_days:
+                expired = self._conn.execute(
+                    f"SELECT run_id, output_dir FROM runs WHERE created_at < ? "
+                    f"AND {finished}",
+                    (now - retention_days * 86400, now - RUNNING_GRACE_S),
+                ).fetchall()
+                self._delete_runs([tuple(row) for row in expired])
+                deleted_runs += len(expired)
+            if max_bytes:
+                oldest = self._conn.execute(
+                    f"SELECT run_id, output_dir FROM runs WHERE {finished} "
+                    "ORDER BY created_at",
+                    (now - RUNNING_GRACE_S,),
+                ).fetchall()
+                for row in oldest:
+                    if self._referenced_bytes() <= max_bytes:
+                        break
+                    self._delete_runs([tuple(row)])
+                    deleted_runs += 1
+
+            referenced = {
+                row[0]
+                for row in self._conn.execute("SELECT DISTINCT sha256 FROM artifacts")
+            }
+            deleted_objects = freed = 0
+            for directory, _, files in os.walk(self.objects_dir):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    sha256 = os.path.splitext(filename)[0]
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if sha256 in referenced or now - stat.st_mtime < OBJECT_GRACE_S:
+                        continue
+                    os.remove(path)
+                    self._conn.execute(
+                        "DELETE FROM objects WHERE sha256 = ?", (sha256,)
+                    )
+                    deleted_objects += 1
+                    freed += stat.st_size
+            self._conn.commit()
+        logger.info(
+            f"Artifact GC deleted {deleted_runs} runs and {deleted_objects} images "
+            f"({freed} bytes)"
+        )
+        return {"runs": deleted_runs, "objects": deleted_objects, "bytes": freed}
+
+    def close(self) -> None:
+        self.writer.close()
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[ArtifactStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """Return the process-wide artifact store under ARTIFACT_ROOT."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = ArtifactStore()
+                # Queued manifest writes are committed before the process exits
+                atexit.register(_default_store.writer.flush, 10)
+    return _default_store
+
+
+def gc_if_configured() -> Optional[Dict[str, int]]:
+    """Collect garbage when a retention period or size limit is configured."""
+    if not (ARTIFACT_RETENTION_DAYS or ARTIFACT_MAX_MB):
+        return None
+    try:
+        return get_artifact_store().collect_garbage()
+    except Exception as e:
+        logger.error(f"Error collecting artifacts: {str(e)}")
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    find = commands.add_parser("find", help="list runs, latest first")
+    find.add_argument("contains", nargs="?", help="substring of the description")
+    find.add_argument("--status", default=None)
+    find.add_argument("--limit", type=int, default=20)
+
+    show = commands.add_parser("show", help="show a run and its artifacts")
+    show.add_argument("run_id")
+
+    gc = commands.add_parser("gc", help="delete old runs and unreferenced images")
+    gc.add_argument("--retention-days", type=float, default=ARTIFACT_RETENTION_DAYS)
+    gc.add_argument("--max-mb", type=float, default=ARTIFACT_MAX_MB)
+
+    commands.add_parser("stats", help="count runs and stored bytes")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    store = get_artifact_store()
+    if args.command == "find":
+        for run in store.find_runs(
+            contains=args.contains, status=args.status, limit=args.limit
+        ):
+            created = datetime.fromtimestamp(run["created_at"]).isoformat(
+                " ", "seconds"
+            )
+            print(
+                f"{run['run_id']}  {created}  {run['status']:<9} "
+                f"{run['product_desc'] or ''}"
+            )
+    elif args.command == "show":
+        run = store.get_run(args.run_id)
+        if run is None:
+            raise SystemExit(f"Unknown run: {args.run_id}")
+        print(json.dumps(run, indent=2))
+    elif args.command == "gc":
+        stats = store.collect_garbage(args.retention_days, args.max_mb * 2**20)
+        print(json.dumps(stats, indent=2))
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+if __name__ == "__main__":
+    # Before the imports below, which read their settings from the environment
+    from bootstrap import init
+
+    init()
+
+from typing import Any, Dict, Iterator, List, Optional, Set
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+
+from workflow import (
+    PIPELINE_MODE,
+    PIPELINE_MODES,
+    get_content_creator,
+    get_digital_artist,
+    get_fused_creator,
+    warm_up_agents,
+)
+from agents.limits import TokenBucket
+from agents.metrics import percentile, run_timings
+from agents.router import router_stats
+from agents.transport import get_default_async_transport
+from jobs import SUCCEEDED, JobStore
+from run_logging import run_scope
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_FIELDS = ("product_desc", "description", "product_description")
+
+
+def item_id(record: Dict[str, Any], description: str) -> str:
+    """Return the item's own id, or a stable hash of its description."""
+    for key in ("id", "sku"):
+        if record.get(key) not in (None, ""):
+            return str(record[key])
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+
+
+def read_items(path: str) -> Iterator[Dict[str, str]]:
+    """Stream {id, product_desc} items from a JSONL or CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+
+        for line_no, record in enumerate(records, start=1):
+            description = next(
+                (record[k] for k in DESCRIPTION_FIELDS if record.get(k)), None
+            )
+            if not isinstance(description, str):
+                logger.warning(f"Skipping record {line_no}: no product description")
+                continue
+            yield {"id": item_id(record, description), "product_desc": description}
+
+
+def load_completed(path: str) -> Set[str]:
+    """Return the ids already completed successfully in an existing output file."""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if not result.get("error"):
+                completed.add(result["id"])
+    return completed
+
+
+class BatchRunner:
+    """Run the content+image pipeline over many items with bounded concurrency."""
+
+    def __init__(
+        self,
+        output_path: str,
+        images_dir: str,
+        concurrency: int = 8,
+        mode: Optional[str] = None,
+        content_rpm: Optional[float] = None,
+        prompt_rpm: Optional[float] = None,
+        image_rpm: Optional[float] = None,
+        queue: Optional[JobStore] = None,
+    ):
+        self.output_path = output_path
+        self.images_dir = images_dir
+        self.concurrency = concurrency
+        self.mode = mode or PIPELINE_MODE
+        if self.mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {self.mode}")
+        # A burst of one spaces the calls of each stage evenly
+        self.limiters = {
+            stage: TokenBucket(rpm, burst=1) if rpm else None
+            for stage, rpm in (
+                ("content", content_rpm),
+                ("prompt", prompt_rpm),
+                ("image", image_rpm),
+            )
+        }
+        # When set, items are submitted to the batch lane of the job queue instead
+        self.queue = queue
+        self.latencies: List[float] = []
+        self.failed = 0
+        self.skipped = 0
+
+    async def _limited(self, stage: str, coro_factory) -> Any:
+        """Run one stage call after its rate limiter admits it."""
+        limiter = self.limiters[stage]
+        delay = limiter.reserve() if limiter else 0.0
+        if delay:
+            await asyncio.sleep(delay)
+        return await coro_factory()
+
+    async def process_queued(self, item: Dict[str, str]) -> Dict[str, Any]:
+        """Run one item as a batch-lane job on the worker processes and return its record."""
+        result: Dict[str, Any] = {
+            "id": item["id"],
+            "product_desc": item["product_desc"],
+        }
+        start = time.perf_counter()
+        try:
+            job_id = await self.queue.asubmit(
+                item["product_desc"],
+                self.mode,
+                lane="batch",
+                output_dir=os.path.join(self.images_dir, item["id"]),
+            )
+            job = await self.queue.wait(job_id)
+            if job["status"] != SUCCEEDED:
+                raise RuntimeError(job["error"] or f"Job {job['status']}")
+            output = job["result"]
+            result.update(
+                title=output["title"],
+                message=output["message"],
+                tags=output["tags"],
+                image_prompt=output["image_prompt"],
+                image_path=output["image_path"],
+                job_id=job_id,
+                error=None,
+            )
+        except Exception as e:
+            logger.error(f"Error processing item {item['id']}: {str(e)}")
+            result["error"] = str(e)
+        result["latency_s"] = round(time.perf_counter() - start, 3)
+        return result
+
+    async def process(self, item: Dict[str, str]) -> Dict[str, Any]:
+        """Run the pipeline for one item and return its result record."""
+        if self.queue is not None:
+            return await self.process_queued(item)
+        description = item["product_desc"]
+        result: Dict[str, Any] = {"id": item["id"], "product_desc": description}
+        start = time.perf_counter()
+        try:
+            # Inside the try: a worker that raised would leave the batch waiting
+            content_creator = get_content_creator()
+            digital_artist = get_digital_artist()
+            if self.mode == "fused":
+                content = await self._limited(
+                    "content",
+                    lambda: get_fused_creator().acreate_content(description),
+                )
+                image_prompt = content.image_prompt
+            elif self.mode == "parallel":
+                content, image_prompt = await asyncio.gather(
+                    self._limited(
+                        "content", lambda: content_creator.acreate_content(description)
+                    ),
+                    self._limited(
+                        "prompt", lambda: digital_artist.aenhance_prompt(description)
+                    ),
+                )
+            else:
+                content = await self._limited(
+                    "content", lambda: content_creator.acreate_content(description)
+                )
+                image_prompt = await self._limited(
+                    "prompt", lambda: digital_artist.aenhance_prompt(content.title)
+                )
+            image = await self._limited(
+                "image", lambda: digital_artist.arequest_image_data(image_prompt)
+            )
+
+            image_path = os.path.join(self.images_dir, f"{item['id']}{image.extension}")
+            await asyncio.to_thread(image.save, image_path)
+            result.update(
+                title=content.title,
+                message=content.message,
+                tags=content.tags,
+                image_prompt=image_prompt,
+                image_path=image_path,
+                error=None,
+            )
+        except Exception as e:
+            logger.error(f"Error processing item {item['id']}: {str(e)}")
+            result["error"] = str(e)
+        result["latency_s"] = round(time.perf_counter() - start, 3)
+        return result
+
+    async def run(self, input_path: str) -> Dict[str, Any]:
+        """Process every pending item of the input file and return summary stats."""
+        os.makedirs(self.images_dir, exist_ok=True)
+        completed = load_completed(self.output_path)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        start = time.perf_counter()
+
+        with open(self.output_path, "a", encoding="utf-8") as out:
+
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    result = await self.process(item)
+                    # Flush every result so an interrupted run can resume
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+                    if result["error"]:
+                        self.failed += 1
+                    else:
+                        self.latencies.append(result["latency_s"])
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            for item in read_items(input_path):
+                if item["id"] in completed:
+                    self.skipped += 1
+                    continue
+                # Duplicate descriptions in the input are only processed once
+                completed.add(item["id"])
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """Return throughput and latency percentiles for the finished run."""
+        stats: Dict[str, Any] = {
+            "succeeded": len(self.latencies),
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_min": (
+                round(len(self.latencies) / elapsed * 60, 2) if elapsed else 0.0
+            ),
+        }
+        if self.latencies:
+            for pct in (50, 90, 95, 99):
+                stats[f"p{pct}_s"] = round(percentile(self.latencies, pct), 3)
+        return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate content and images for a file of product descriptions."
+    )
+    parser.add_argument("input", help="JSONL or CSV file with product descriptions")
+    parser.add_argument(
+        "-o", "--output", default="batch_results.jsonl", help="results JSONL file"
+    )
+    parser.add_argument(
+        "--images-dir", default=None, help="image directory (default: next to output)"
+    )
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=PIPELINE_MODES, default=None)
+    parser.add_argument("--content-rpm", type=float, default=None)
+    parser.add_argument("--prompt-rpm", type=float, default=None)
+    parser.add_argument("--image-rpm", type=float, default=None)
+    parser.add_argument(
+        "--queue",
+        action="store_true",
+        help="run the items on the job queue workers (jobs.py worker), batch lane",
+    )
+    return parser.parse_args(argv)
+
+
+async def arun_batch(args: argparse.Namespace) -> Dict[str, Any]:
+    images_dir = args.images_dir or os.path.join(
+        os.path.dirname(os.path.abspath(args.output)), "batch_images"
+    )
+    runner = BatchRunner(
+        args.output,
+        images_dir,
+        concurrency=args.concurrency,
+        mode=args.mode,
+        content_rpm=args.content_rpm,
+        prompt_rpm=args.prompt_rpm,
+        image_rpm=args.image_rpm,
+        queue=JobStore() if args.queue else None,
+    )
+    try:
+        if runner.queue is None:
+            warm_up_agents()
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        with (
+            run_scope(output_dir, "batch.log"),
+            run_timings(output_dir, "batch_timings.json"),
+        ):
+            return await runner.run(args.input)
+    finally:
+        await get_default_async_transport().close()
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    stats = asyncio.run(arun_batch(args))
+    print("Batch finished:")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+    print("Model routing:")
+    for role, routing in router_stats().items():
+        for model, model_stats in routing["models"].items():
+            print(
+                f"  {role} tier {model_stats['tier']} {model}: "
+                f"{model_stats['routed']} routed, p50 {model_stats['p50_s']}s, "
+                f"p95 {model_stats['p95_s']}s, errors {model_stats['error_rate']:.0%}, "
+                f"{model_stats['health']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare latency and token usage of the fused single-call mode with the two-agent path.
+
+serial and parallel make two LLM calls per request (content, then or alongside
+the image prompt); fused makes one that writes both. By default the network
+calls are faked, with a per-token delay and estimated token counts; pass
+--live to call the real endpoints with NVIDIA_API_KEY and report the usage they
+return. Renditions are disabled, the agents are built and each mode runs once
+untimed before the timed rounds, which alternate the order of the modes so none
+always goes first.
+"""
+
+from typing import Dict, List
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from agents.metrics import percentile
+from agents.usage import token_usage
+
+PRODUCT_DESC = "A sleek 1L stainless steel water bottle that keeps drinks cold for 24h"
+
+
+async def run_mode(mode: str, requests: int, concurrency: int) -> List[float]:
+    """Run the async pipeline for the given mode and return per-request latencies."""
+    import workflow
+
+    semaphore = asyncio.Semaphore(concurrency)
+    output_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+
+    async def one() -> float:
+        async with semaphore:
+            state = workflow.new_state(PRODUCT_DESC, output_dir)
+            state["bypass_cache"] = True
+            start = time.perf_counter()
+            state = await workflow.arun_pipeline(state, mode=mode)
+            if state.get("error"):
+                raise RuntimeError(state["error"])
+            return time.perf_counter() - start
+
+    try:
+        return await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        await workflow.get_default_async_transport().close()
+
+
+def usage_per_request(requests: int) -> Dict[str, float]:
+    """Return the LLM calls and tokens spent per request since the last reset."""
+    totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    for model_totals in token_usage.stats().values():
+        for name in totals:
+            totals[name] += model_totals[name]
+    return {name: value / requests for name, value in totals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--live", action="store_true", help="call the real endpoints")
+    parser.add_argument("--content-latency", type=float, default=0.8)
+    parser.add_argument("--prompt-latency", type=float, default=0.4)
+    parser.add_argument("--image-latency", type=float, default=6.0)
+    parser.add_argument("--token-latency", type=float, default=0.03)
+    parser.add_argument(
+        "--scale", type=float, default=0.1, help="multiply fake latencies by this"
+    )
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # Only the call topology is measured; read when the workflow is imported
+    os.environ["RENDITIONS"] = ""
+    scale = 1.0
+    if not args.live:
+        from benchmarks.fakes import install_fake_latencies
+
+        scale = args.scale
+        install_fake_latencies(
+            args.content_latency * scale,
+            args.prompt_latency * scale,
+            args.image_latency * scale,
+            token_latency=args.token_latency * scale,
+        )
+
+    import workflow
+
+    modes = ("serial", "parallel", "fused")
+    # Lazy imports, agent builds and first-call setup are paid before timing
+    workflow.warm_up_agents()
+    for mode in modes:
+        asyncio.run(run_mode(mode, 1, 1))
+    runs: Dict[str, List[float]] = {mode: [] for mode in modes}
+    usage: Dict[str, List[Dict[str, float]]] = {mode: [] for mode in modes}
+    for round_index in range(args.rounds):
+        for mode in modes if round_index % 2 == 0 else modes[::-1]:
+            token_usage.reset()
+            runs[mode] += asyncio.run(run_mode(mode, args.requests, args.concurrency))
+            usage[mode].append(usage_per_request(args.requests))
+
+    source = "reported" if args.live else "estimated"
+    results = {}
+    for mode, latencies in runs.items():
+        mode_usage = {
+            name: statistics.mean(round_usage[name] for round_usage in usage[mode])
+            for name in usage[mode][0]
+        }
+        results[mode] = statistics.mean(latencies)
+        print(
+            f"{mode:>8}: mean {statistics.mean(latencies) / scale:6.2f}s  "
+            f"p50 {percentile(latencies, 50) / scale:6.2f}s  "
+            f"p95 {percentile(latencies, 95) / scale:6.2f}s  "
+            f"| {mode_usage['calls']:.1f} LLM calls, "
+            f"{mode_usage['prompt_tokens']:.0f} prompt + "
+            f"{mode_usage['completion_tokens']:.0f} completion tokens per request "
+            f"({source})"
+        )
+
+    for baseline in ("serial", "parallel"):
+        reduction = 1 - results["fused"] / results[baseline]
+        print(f"fused vs {baseline}: mean end-to-end latency {-reduction:+.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Compare memory and latency of the original and the lean image path.
+
+original: b64decode -> PIL open -> re-encode to output.jpg -> np.array for Gradio
+lean:     a2b_base64 once -> write the encoded bytes -> hand Gradio the file path
+"""
+
+from io import BytesIO
+import argparse
+import base64
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from agents.image import GeneratedImage
+
+
+def make_response(size: int) -> dict:
+    """Return an API-like response holding a noisy (hard to compress) JPEG."""
+    pixels = np.random.default_rng(0).integers(0, 256, (size, size, 3), np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=95)
+    return {"image": base64.b64encode(buffer.getvalue()).decode("ascii")}
+
+
+def original_path(response: dict, output_dir: str):
+    image = Image.open(BytesIO(base64.b64decode(response["image"])))
+    image.save(os.path.join(output_dir, "output.jpg"))
+    return np.array(image)
+
+
+def lean_path(response: dict, output_dir: str):
+    image = GeneratedImage.from_base64(response["image"])
+    return image.save(os.path.join(output_dir, f"output{image.extension}"))
+
+
+def measure(fn, response: dict, output_dir: str, repeat: int):
+    """Return (median seconds, peak traced bytes) for fn."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(response, output_dir)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(response, output_dir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=1024, help="image edge in pixels")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    response = make_response(args.size)
+    print(f"encoded image: {len(response['image']) / 2**20:.2f} MiB of base64")
+    output_dir = tempfile.mkdtemp(prefix="bench_image_")
+
+    results = {}
+    for name, fn in (("original", original_path), ("lean", lean_path)):
+        seconds, peak = measure(fn, response, output_dir, args.repeat)
+        results[name] = (seconds, peak)
+        print(f"{name:>8}: {seconds * 1000:7.1f} ms  peak {peak / 2**20:6.2f} MiB")
+
+    (orig_s, orig_peak), (lean_s, lean_peak) = results["original"], results["lean"]
+    print(
+        f"lean path is {orig_s / lean_s:.1f}x faster and peaks "
+        f"{(orig_peak - lean_peak) / 2**20:.2f} MiB lower"
+    )
+
+
+if __name__ == "__main__":
+    main()
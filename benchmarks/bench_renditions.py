@@ -0,0 +1,109 @@
+"""
+Measure channel renditions per second against the number of pool processes.
+
+Renders every configured rendition (RENDITIONS, or the channel preset when it is
+empty) of a set of generated-size source images, first serially in this
+process, then through process pools of increasing size, and reports throughput,
+speedup and parallel efficiency.
+"""
+
+from typing import List
+import argparse
+import base64
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from agents.renditions import (
+    CHANNEL_RENDITIONS,
+    RENDITIONS,
+    parse_renditions,
+    render,
+    render_all,
+    rendition_context,
+    rendition_path,
+)
+from benchmarks.stub_server import noisy_image_b64
+
+RENDITION_SPECS = parse_renditions(RENDITIONS or CHANNEL_RENDITIONS)
+
+
+def write_sources(directory: str, count: int, size: int) -> List[str]:
+    """Write `count` distinct noisy JPEGs, about the size the image endpoint returns."""
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"source_{index}.jpg")
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(noisy_image_b64(size + index)))
+        paths.append(path)
+    return paths
+
+
+def run_serial(sources: List[str]) -> float:
+    start = time.perf_counter()
+    for source in sources:
+        for spec in RENDITION_SPECS:
+            render(source, spec, rendition_path(source, spec))
+    return time.perf_counter() - start
+
+
+def run_pool(sources: List[str], workers: int) -> float:
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=rendition_context()
+    ) as pool:
+        # Start every worker before timing
+        list(pool.map(abs, range(workers * 4)))
+        start = time.perf_counter()
+        # Every image's renditions are in flight at once, as with concurrent runs
+        streams = [render_all(source, RENDITION_SPECS, pool) for source in sources]
+        for stream in streams:
+            for _ in stream:
+                pass
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--size", type=int, default=1024, help="source edge in px")
+    parser.add_argument(
+        "--workers",
+        default=None,
+        help="comma separated pool sizes (default: powers of two up to the cores)",
+    )
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        levels = [int(level) for level in args.workers.split(",")]
+    else:
+        levels = [1]
+        while levels[-1] * 2 <= cores:
+            levels.append(levels[-1] * 2)
+        if levels[-1] != cores:
+            levels.append(cores)
+
+    directory = tempfile.mkdtemp(prefix="bench_renditions_")
+    sources = write_sources(directory, args.images, args.size)
+    total = len(sources) * len(RENDITION_SPECS)
+    print(
+        f"{args.images} images x {len(RENDITION_SPECS)} renditions "
+        f"({', '.join(spec.name for spec in RENDITION_SPECS)}), {cores} cores"
+    )
+
+    serial = run_serial(sources)
+    print(f"  serial: {total / serial:7.1f} renditions/s")
+    base = None
+    for workers in levels:
+        elapsed = run_pool(sources, workers)
+        rate = total / elapsed
+        base = base or rate
+        print(
+            f"  pool {workers:>3}: {rate:7.1f} renditions/s  "
+            f"speedup {rate / base:5.2f}x  efficiency {rate / base / workers:5.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Measure the import time of the entry point modules, as a cold start pays it.
+
+Imports each module in a fresh interpreter under `python -X importtime` and
+reports the median cumulative import time, the median wall time of the whole
+process (interpreter start included), the heavy dependencies the import pulled
+in and, with --top, the slowest imports below it.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ("agents", "workflow", "app", "batch", "jobs")
+# Dependencies that should only be imported once they are actually used
+HEAVY_MODULES = (
+    "langchain_core",
+    "langchain_nvidia_ai_endpoints",
+    "langgraph",
+    "PIL",
+    "requests",
+    "aiohttp",
+    "gradio",
+    "numpy",
+    "dotenv",
+)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """Return (depth, cumulative microseconds, module) per line of -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        entries.append((depth, int(cumulative), name.strip()))
+    return entries
+
+
+def measure(module: str) -> Tuple[float, float, List[str], List[Tuple[int, str]]]:
+    """Import `module` in a fresh interpreter and return its import ms, the process
+    wall ms, the heavy modules it loaded and its imports by cumulative time.
+    """
+    code = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    entries = parse_importtime(result.stderr)
+    import_us = next(
+        cumulative
+        for depth, cumulative, name in entries
+        if name == module and not depth
+    )
+    # A module's imports are listed right before it, one level deeper
+    index = next(i for i, entry in enumerate(entries) if entry[2] == module)
+    start_index = index
+    while start_index and entries[start_index - 1][0] > 0:
+        start_index -= 1
+    below = sorted(
+        ((cumulative, name) for _, cumulative, name in entries[start_index:index]),
+        reverse=True,
+    )
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return import_us / 1000, wall_ms, heavy, below
+
+
+def interpreter_ms(runs: int) -> float:
+    """Return the median wall time of an interpreter that imports nothing."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--modules", default=",".join(MODULES), help="comma separated modules"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="imports per module")
+    parser.add_argument("--top", type=int, default=0, help="slowest imports to list")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results: List[Dict] = []
+    for module in filter(None, (m.strip() for m in args.modules.split(","))):
+        samples = [measure(module) for _ in range(args.runs)]
+        results.append(
+            {
+                "module": module,
+                "import_ms": statistics.median(s[0] for s in samples),
+                "process_ms": statistics.median(s[1] for s in samples),
+                "heavy_modules": samples[-1][2],
+                "slowest": [
+                    {"module": name, "ms": cumulative / 1000}
+                    for cumulative, name in samples[-1][3][: args.top]
+                ],
+            }
+        )
+    baseline = interpreter_ms(args.runs)
+
+    if args.json:
+        print(json.dumps({"interpreter_ms": baseline, "modules": results}, indent=2))
+        return
+    print(f"interpreter start: {baseline:7.1f} ms")
+    for result in results:
+        heavy = ", ".join(result["heavy_modules"]) or "none"
+        print(
+            f"{result['module']:>10}: import {result['import_ms']:7.1f} ms  "
+            f"process {result['process_ms']:7.1f} ms  heavy: {heavy}"
+        )
+        for entry in result["slowest"]:
+            print(f"{'':>14}{entry['ms']:7.1f} ms  {entry['module']}")
+
+
+if __name__ == "__main__":
+    main()
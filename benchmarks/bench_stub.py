@@ -0,0 +1,320 @@
+"""
+Load test the whole stack offline, against a local stub of the NVIDIA endpoints.
+
+Starts benchmarks/stub_server.py (or uses --stub-url), points the agents at it
+and drives each target at every concurrency level, reporting throughput,
+p50/p95/p99 latency and peak RSS:
+
+    nodes  the async workflow nodes (workflow.arun_pipeline)
+    batch  the batch path (batch.BatchRunner over a generated JSONL)
+    app    the Gradio handler (app.process_product_description), fully consumed
+
+Unlike the other benchmarks nothing is patched: the real clients, limiters,
+retries and image decoding run against the stub over HTTP.
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+TARGETS = ("nodes", "batch", "app")
+# Module each target drives, imported before timing so its import is not measured
+TARGET_MODULES = {"nodes": "workflow", "batch": "batch", "app": "app"}
+
+
+def current_rss() -> Optional[int]:
+    """Return the resident set size of this process in bytes, None if unknown."""
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def max_rss() -> int:
+    """Return the peak RSS of this process so far in bytes."""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in KiB on Linux, in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Track the peak RSS while a load level runs, by polling in a thread."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+
+    def _poll(self):
+        while not self._stop.is_set():
+            rss = current_rss()
+            if rss is None:
+                return
+            self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        if not self.peak:
+            # No way to sample the current RSS, fall back to the process peak
+            self.peak = max_rss()
+
+
+def wait_for_port(host: str, port: int, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Stub server did not start on {host}:{port}")
+
+
+def start_stub(args: argparse.Namespace) -> subprocess.Popen:
+    """Run the stub server in a subprocess, so it does not compete for our loop."""
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.stub_server",
+        "--port",
+        str(args.port),
+        "--llm-latency",
+        str(args.llm_latency),
+        "--token-latency",
+        str(args.token_latency),
+        "--image-latency",
+        str(args.image_latency),
+        "--jitter",
+        str(args.jitter),
+        "--error-rate",
+        str(args.error_rate),
+        "--throttle-rate",
+        str(args.throttle_rate),
+        "--image-size",
+        str(args.image_size),
+        "--seed",
+        "0",
+    ]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(command, cwd=root, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port("127.0.0.1", args.port)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process
+
+
+def descriptions(target: str, concurrency: int, requests: int) -> List[str]:
+    """Return distinct descriptions, so no request is answered by coalescing."""
+    return [
+        f"A sleek 1L stainless steel water bottle that keeps drinks cold for 24h "
+        f"({target} c{concurrency} #{index})"
+        for index in range(requests)
+    ]
+
+
+async def gather_limited(
+    concurrency: int, items: List[str], call: Callable[[str], Any]
+) -> List[Optional[float]]:
+    """Run `call` over items, at most `concurrency` at a time; None marks a failure."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item: str) -> Optional[float]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await call(item)
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one(item) for item in items))
+
+
+async def run_nodes(
+    items: List[str], concurrency: int, mode: str, work_dir: str
+) -> List[Optional[float]]:
+    import workflow
+
+    async def call(description: str):
+        state = workflow.new_state(description, work_dir)
+        state = await workflow.arun_pipeline(state, mode=mode)
+        if state.get("error"):
+            raise RuntimeError(state["error"])
+
+    return await gather_limited(concurrency, items, call)
+
+
+async def run_batch(
+    items: List[str], concurrency: int, mode: str, work_dir: str
+) -> List[Optional[float]]:
+    from batch import BatchRunner
+
+    run_dir = tempfile.mkdtemp(dir=work_dir)
+    input_path = os.path.join(run_dir, "input.jsonl")
+    with open(input_path, "w", encoding="utf-8") as f:
+        for description in items:
+            f.write(json.dumps({"product_desc": description}) + "\n")
+    runner = BatchRunner(
+        os.path.join(run_dir, "results.jsonl"),
+        os.path.join(run_dir, "images"),
+        concurrency=concurrency,
+        mode=mode,
+    )
+    await runner.run(input_path)
+    return list(runner.latencies) + [None] * runner.failed
+
+
+async def run_app(
+    items: List[str], concurrency: int, mode: str, work_dir: str
+) -> List[Optional[float]]:
+    import app
+
+    async def call(description: str):
+        error = None
+        async for error, *_ in app.process_product_description(description, mode, 1):
+            pass
+        if error:
+            raise RuntimeError(error)
+
+    return await gather_limited(concurrency, items, call)
+
+
+RUNNERS = {"nodes": run_nodes, "batch": run_batch, "app": run_app}
+
+
+async def run_level(
+    target: str, concurrency: int, requests: int, mode: str, work_dir: str
+) -> Dict[str, Any]:
+    """Run one target at one concurrency level and return its stats."""
+    from agents.metrics import percentile
+    import workflow
+
+    items = descriptions(target, concurrency, requests)
+    start = time.perf_counter()
+    try:
+        with RssSampler() as rss:
+            results = await RUNNERS[target](items, concurrency, mode, work_dir)
+    finally:
+        await workflow.get_default_async_transport().close()
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency in results if latency is not None)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": requests,
+        "failed": len(results) - len(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "peak_rss_mb": rss.peak / 2**20,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--targets",
+        default=",".join(TARGETS),
+        help="comma separated, of " + "/".join(TARGETS),
+    )
+    parser.add_argument(
+        "--concurrency", default="1,4,16", help="comma separated levels to run"
+    )
+    parser.add_argument("--requests", type=int, default=32, help="per level")
+    parser.add_argument(
+        "--mode", default="parallel", choices=["serial", "parallel", "fused"]
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    stub = parser.add_argument_group("stub")
+    stub.add_argument("--stub-url", help="use a running stub instead of starting one")
+    stub.add_argument("--port", type=int, default=8765)
+    stub.add_argument("--llm-latency", type=float, default=0.3)
+    stub.add_argument("--token-latency", type=float, default=0.01)
+    stub.add_argument("--image-latency", type=float, default=2.0)
+    stub.add_argument("--jitter", type=float, default=0.2)
+    stub.add_argument("--error-rate", type=float, default=0.0)
+    stub.add_argument("--throttle-rate", type=float, default=0.0)
+    stub.add_argument("--image-size", type=int, default=1024)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        raise SystemExit(f"Unknown targets: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    stub = None if args.stub_url else start_stub(args)
+    base_url = (args.stub_url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    # Set before the agents are imported, which read them at import time
+    os.environ.setdefault("NVIDIA_API_KEY", "stub")
+    os.environ["LLM_API_BASE_URL"] = f"{base_url}/v1"
+    os.environ["IMAGE_API_BASE_URL"] = f"{base_url}/v1/genai"
+    os.environ["CACHE_ENABLED"] = "false"
+
+    logging.disable(logging.CRITICAL)
+    for target in targets:
+        importlib.import_module(TARGET_MODULES[target])
+    work_dir = tempfile.mkdtemp(prefix="bench_stub_")
+    # The app writes its runs under ./AI_Response
+    os.chdir(work_dir)
+    results = []
+    try:
+        for target in targets:
+            for concurrency in levels:
+                result = asyncio.run(
+                    run_level(target, concurrency, args.requests, args.mode, work_dir)
+                )
+                results.append(result)
+                if not args.json:
+                    print(
+                        f"{target:>6} c={concurrency:<3} "
+                        f"{result['throughput_per_s']:6.2f} req/s  "
+                        f"p50 {result['p50_s']:6.2f}s  "
+                        f"p95 {result['p95_s']:6.2f}s  "
+                        f"p99 {result['p99_s']:6.2f}s  "
+                        f"failed {result['failed']:>3}/{result['requests']}  "
+                        f"peak RSS {result['peak_rss_mb']:7.1f} MiB",
+                        flush=True,
+                    )
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
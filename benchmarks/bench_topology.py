@@ -0,0 +1,93 @@
+"""
+Compare end-to-end latency of the serial and parallel pipeline topologies.
+
+Network calls are replaced by sleeps so the numbers isolate the effect of the
+topology: serial pays content + prompt + image, parallel pays
+max(content, prompt) + image. Renditions are disabled, the agents are built and
+each mode runs once untimed before the timed rounds, which alternate the order
+of the modes so neither always goes first.
+"""
+
+from typing import Dict, List
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fakes import install_fake_latencies
+from agents.metrics import percentile
+
+
+async def run_mode(mode: str, requests: int, concurrency: int) -> List[float]:
+    """Run the async pipeline for the given mode and return per-request latencies."""
+    import workflow
+
+    semaphore = asyncio.Semaphore(concurrency)
+    output_dir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+
+    async def one() -> float:
+        async with semaphore:
+            state = workflow.new_state(
+                "A sleek 1L stainless steel water bottle", output_dir
+            )
+            start = time.perf_counter()
+            state = await workflow.arun_pipeline(state, mode=mode)
+            if state.get("error"):
+                raise RuntimeError(state["error"])
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--content-latency", type=float, default=4.0)
+    parser.add_argument("--prompt-latency", type=float, default=1.5)
+    parser.add_argument("--image-latency", type=float, default=6.0)
+    parser.add_argument(
+        "--scale", type=float, default=0.1, help="multiply all latencies by this"
+    )
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # Only the topology is measured; read when the workflow is imported
+    os.environ["RENDITIONS"] = ""
+    install_fake_latencies(
+        args.content_latency * args.scale,
+        args.prompt_latency * args.scale,
+        args.image_latency * args.scale,
+    )
+
+    import workflow
+
+    modes = ("serial", "parallel")
+    # Lazy imports, agent builds and first-call setup are paid before timing
+    workflow.warm_up_agents()
+    for mode in modes:
+        asyncio.run(run_mode(mode, 1, 1))
+    runs: Dict[str, List[float]] = {mode: [] for mode in modes}
+    for round_index in range(args.rounds):
+        for mode in modes if round_index % 2 == 0 else modes[::-1]:
+            runs[mode] += asyncio.run(run_mode(mode, args.requests, args.concurrency))
+
+    results = {}
+    for mode, latencies in runs.items():
+        results[mode] = statistics.mean(latencies)
+        print(
+            f"{mode:>8}: mean {statistics.mean(latencies) / args.scale:6.2f}s  "
+            f"p50 {percentile(latencies, 50) / args.scale:6.2f}s  "
+            f"p95 {percentile(latencies, 95) / args.scale:6.2f}s  (unscaled)"
+        )
+
+    reduction = 1 - results["parallel"] / results["serial"]
+    print(f"parallel topology reduces mean end-to-end latency by {reduction:.1%}")
+
+
+if __name__ == "__main__":
+    main()
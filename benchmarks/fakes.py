@@ -0,0 +1,108 @@
+from typing import Any, Dict, Optional
+from io import BytesIO
+from PIL import Image
+import asyncio
+import base64
+import os
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from agents.base_agent import BaseAgent
+from agents.content_creator import ContentCreatorAgent, FusedContentCreatorAgent
+from agents.transport import AsyncHTTPTransport, HTTPTransport
+from agents.usage import token_usage
+
+FAKE_CONTENT = (
+    "Title: Stay Hydrated in Style\n"
+    "Message: Keep your hydration game strong with our sleek 1L water bottle.\n"
+    "Tags: #StayHydrated, #WaterBottle, #Fitness"
+)
+FAKE_PROMPT = (
+    "A sleek matte-black 1L stainless steel water bottle with condensation "
+    "droplets on a sunlit gym bench, soft studio lighting, shallow depth of "
+    "field, photorealistic product shot"
+)
+FAKE_FUSED_CONTENT = (
+    "Title: Stay Hydrated in Style\n"
+    f"Image Prompt: {FAKE_PROMPT}\n"
+    "Message: Keep your hydration game strong with our sleek 1L water bottle.\n"
+    "Tags: #StayHydrated, #WaterBottle, #Fitness"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for fake completions."""
+    return max(1, len(text) // 4)
+
+
+def make_image_b64(size: int = 64) -> str:
+    """Return a base64 encoded JPEG of the given edge length."""
+    buffer = BytesIO()
+    Image.new("RGB", (size, size), (30, 120, 200)).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def install_fake_latencies(
+    content_latency: float,
+    prompt_latency: float,
+    image_latency: float,
+    image_size: int = 64,
+    token_latency: float = 0.0,
+) -> None:
+    """Replace the network calls of both agents with sleeps of the given durations.
+
+    Only the LLM chain and the HTTP transport are faked, so everything the
+    agents do around those calls still runs. Each LLM call additionally sleeps
+    `token_latency` per estimated completion token and records its estimated
+    usage in `token_usage`. The response cache is disabled unless
+    CACHE_ENABLED is set explicitly.
+    """
+    os.environ.setdefault("NVIDIA_API_KEY", "nvapi-benchmark")
+    os.environ.setdefault("CACHE_ENABLED", "false")
+    image_response = {"image": make_image_b64(image_size)}
+
+    def fake_chain(agent: BaseAgent, latency: float, output: str) -> RunnableLambda:
+        completion_tokens = estimate_tokens(output)
+        latency += completion_tokens * token_latency
+
+        def record(input_data: Dict[str, Any]) -> None:
+            prompt_tokens = estimate_tokens(agent.system_prompt + input_data["input"])
+            token_usage.record(agent.model_name, prompt_tokens, completion_tokens)
+
+        def invoke(input_data: Dict[str, Any]) -> str:
+            time.sleep(latency)
+            record(input_data)
+            return output
+
+        async def ainvoke(input_data: Dict[str, Any]) -> str:
+            await asyncio.sleep(latency)
+            record(input_data)
+            return output
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+    setup_chain = BaseAgent._setup_chain
+
+    def _setup_chain(self, system_prompt: str):
+        setup_chain(self, system_prompt)
+        if isinstance(self, FusedContentCreatorAgent):
+            self.chain = fake_chain(self, content_latency, FAKE_FUSED_CONTENT)
+        elif isinstance(self, ContentCreatorAgent):
+            self.chain = fake_chain(self, content_latency, FAKE_CONTENT)
+        else:
+            self.chain = fake_chain(self, prompt_latency, FAKE_PROMPT)
+
+    def post_json(self, url, payload, headers=None, max_retries: Optional[int] = None):
+        time.sleep(image_latency)
+        return image_response
+
+    async def apost_json(
+        self, url, payload, headers=None, max_retries: Optional[int] = None
+    ):
+        await asyncio.sleep(image_latency)
+        return image_response
+
+    BaseAgent._setup_chain = _setup_chain
+    HTTPTransport.post_json = post_json
+    AsyncHTTPTransport.post_json = apost_json
@@ -0,0 +1,261 @@
+"""
+Local stand-in for the NVIDIA endpoints the agents call, for offline benchmarks.
+
+Serves an OpenAI-compatible chat completions endpoint (plain and streamed,
+with usage), the model listing, and the stable-diffusion-3-medium image
+endpoint, each with configurable latency, jitter, error rate and image size.
+Point the agents at it with:
+
+    LLM_API_BASE_URL=http://127.0.0.1:8765/v1
+    IMAGE_API_BASE_URL=http://127.0.0.1:8765/v1/genai
+"""
+
+from typing import Any, Dict, List, Optional
+from io import BytesIO
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import random
+import re
+import time
+
+from aiohttp import web
+import numpy as np
+from PIL import Image
+
+from benchmarks.fakes import (
+    FAKE_CONTENT,
+    FAKE_FUSED_CONTENT,
+    FAKE_PROMPT,
+    estimate_tokens,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+IMAGE_ROUTE = "/v1/genai/stabilityai/stable-diffusion-3-medium"
+# Listed by /v1/models, which ChatNVIDIA checks the configured model against
+STUB_MODELS = (
+    "meta/llama-3.1-405b-instruct",
+    "meta/llama-3.1-70b-instruct",
+    "meta/llama-3.1-8b-instruct",
+    "mistralai/mixtral-8x7b-instruct-v0.1",
+)
+
+
+class StubConfig:
+    """Latency and failure behaviour of the stub endpoints."""
+
+    def __init__(
+        self,
+        llm_latency: float = 0.3,
+        token_latency: float = 0.01,
+        image_latency: float = 2.0,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        image_size: int = 1024,
+        seed: Optional[int] = None,
+    ):
+        self.llm_latency = llm_latency
+        self.token_latency = token_latency
+        self.image_latency = image_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.image_size = image_size
+        self.random = random.Random(seed)
+
+    def delay(self, base: float) -> float:
+        """Return `base` spread uniformly by +/- jitter (a fraction of it)."""
+        return max(0.0, base * (1 + self.random.uniform(-self.jitter, self.jitter)))
+
+    def failure(self) -> Optional[web.Response]:
+        """Return an injected 429 or 503 response, or None to serve the request."""
+        draw = self.random.random()
+        if draw < self.throttle_rate:
+            return web.json_response(
+                {"detail": "Too many requests"},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+        if draw < self.throttle_rate + self.error_rate:
+            return web.json_response({"detail": "Service unavailable"}, status=503)
+        return None
+
+
+def noisy_image_b64(size: int) -> str:
+    """Return a base64 encoded noisy JPEG, about the size a real render would be."""
+    pixels = np.random.default_rng(size).integers(0, 256, (size, size, 3), np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, "JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def completion_text(messages: List[Dict[str, Any]]) -> str:
+    """Pick the canned completion that matches the agent behind the system prompt."""
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    if "Image Prompt:" in system:
+        return FAKE_FUSED_CONTENT
+    if "Title:" in system:
+        return FAKE_CONTENT
+    return FAKE_PROMPT
+
+
+def split_chunks(text: str) -> List[str]:
+    """Split a completion into word-sized stream chunks that join back to it."""
+    return re.findall(r"\S+\s*", text)
+
+
+class StubServer:
+    """aiohttp application serving the stubbed endpoints."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.image_b64 = noisy_image_b64(config.image_size)
+        self.requests = {"chat": 0, "image": 0, "failed": 0}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/models", self.models)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        app.router.add_post(IMAGE_ROUTE, self.image)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    async def models(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "object": "list",
+                "data": [
+                    {"id": model, "object": "model", "owned_by": "stub"}
+                    for model in STUB_MODELS
+                ],
+            }
+        )
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.requests)
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self.requests["chat"] += 1
+        body = await request.json()
+        failure = self.config.failure()
+        if failure is not None:
+            self.requests["failed"] += 1
+            await asyncio.sleep(self.config.delay(self.config.llm_latency) / 4)
+            return failure
+
+        text = completion_text(body.get("messages", []))
+        prompt_tokens = sum(
+            estimate_tokens(str(m.get("content", ""))) for m in body["messages"]
+        )
+        completion_tokens = estimate_tokens(text)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{int(time.time() * 1000)}"
+        # Time to first token, then the rest as the tokens are "generated"
+        await asyncio.sleep(self.config.delay(self.config.llm_latency))
+
+        if not body.get("stream"):
+            await asyncio.sleep(
+                self.config.delay(self.config.token_latency * completion_tokens)
+            )
+            return web.json_response(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "model": body.get("model"),
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta: Dict[str, Any], finish_reason=None, **extra) -> None:
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": body.get("model"),
+                "choices": [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+                **extra,
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        chunks = split_chunks(text)
+        per_chunk = self.config.token_latency * completion_tokens / len(chunks)
+        try:
+            await send({"role": "assistant", "content": ""})
+            for piece in chunks:
+                await asyncio.sleep(self.config.delay(per_chunk))
+                await send({"content": piece})
+            await send({}, finish_reason="stop", usage=usage)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client stopped reading once it had every field it needed
+            pass
+        return response
+
+    async def image(self, request: web.Request) -> web.Response:
+        self.requests["image"] += 1
+        await request.json()
+        failure = self.config.failure()
+        if failure is not None:
+            self.requests["failed"] += 1
+            return failure
+        await asyncio.sleep(self.config.delay(self.config.image_latency))
+        return web.json_response({"image": self.image_b64})
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    parser.add_argument("--image-latency", type=float, default=2.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503s")
+    parser.add_argument(
+        "--throttle-rate", type=float, default=0.0, help="share of 429s"
+    )
+    parser.add_argument("--image-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    config = StubConfig(
+        llm_latency=args.llm_latency,
+        token_latency=args.token_latency,
+        image_latency=args.image_latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        image_size=args.image_size,
+        seed=args.seed,
+    )
+    logging.basicConfig(level=logging.WARNING)
+    print(f"Stub NVIDIA endpoints on http://{args.host}:{args.port}", flush=True)
+    web.run_app(StubServer(config).app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""
+Process setup for the entry points: the CLI, the Gradio app, the batch runner,
+the job workers and the artifacts CLI.
+
+Importing the other modules has no side effects, so job workers, benchmarks and
+other applications can use them without loading .env or touching the logging
+configuration. Each entry point calls init() first thing when run as a script,
+before importing the modules that read their settings from the environment.
+"""
+
+from typing import Optional
+
+_initialized = False
+
+
+def init(log_level: Optional[str] = None) -> None:
+    """Load .env into the environment (set variables win) and configure logging."""
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+    from dotenv import load_dotenv
+
+    from run_logging import configure_logging
+
+    load_dotenv()
+    configure_logging(log_level)
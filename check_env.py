@@ -8,10 +8,32 @@ def main():
     print("NVIDIA_API_KEY:", "***" if os.getenv("NVIDIA_API_KEY") else "Not set")
     print("CONTENT_CREATOR_MODEL:", os.getenv("CONTENT_CREATOR_MODEL"))
     print("DIGITAL_ARTIST_MODEL:", os.getenv("DIGITAL_ARTIST_MODEL"))
+    print("CONTENT_CREATOR_MODELS:", os.getenv("CONTENT_CREATOR_MODELS"))
+    print("DIGITAL_ARTIST_MODELS:", os.getenv("DIGITAL_ARTIST_MODELS"))
+    print("ROUTER_LATENCY_SLO_S:", os.getenv("ROUTER_LATENCY_SLO_S"))
     print("IMAGE_GENERATION_MODEL:", os.getenv("IMAGE_GENERATION_MODEL"))
+    print("IMAGE_API_BASE_URL:", os.getenv("IMAGE_API_BASE_URL"))
+    print("LLM_API_BASE_URL:", os.getenv("LLM_API_BASE_URL"))
     print("LOG_LEVEL:", os.getenv("LOG_LEVEL"))
     print("MAX_RETRIES:", os.getenv("MAX_RETRIES"))
     print("TIMEOUT:", os.getenv("TIMEOUT"))
+    print("CONNECT_TIMEOUT:", os.getenv("CONNECT_TIMEOUT"))
+    print("HTTP_POOL_SIZE:", os.getenv("HTTP_POOL_SIZE"))
+    print("RATE_LIMIT_RPM:", os.getenv("RATE_LIMIT_RPM"))
+    print("RATE_LIMIT_TPM:", os.getenv("RATE_LIMIT_TPM"))
+    print("RATE_LIMITS:", os.getenv("RATE_LIMITS"))
+    print("ENDPOINT_CONCURRENCY:", os.getenv("ENDPOINT_CONCURRENCY"))
+    print("PIPELINE_DEADLINE:", os.getenv("PIPELINE_DEADLINE"))
+    print("BREAKER_FAILURES:", os.getenv("BREAKER_FAILURES"))
+    print("BREAKER_RESET_S:", os.getenv("BREAKER_RESET_S"))
+    print("ARTIFACT_ROOT:", os.getenv("ARTIFACT_ROOT"))
+    print("ARTIFACT_RETENTION_DAYS:", os.getenv("ARTIFACT_RETENTION_DAYS"))
+    print("ARTIFACT_MAX_MB:", os.getenv("ARTIFACT_MAX_MB"))
+    print("RENDITIONS:", os.getenv("RENDITIONS"))
+    print("RENDITION_WORKERS:", os.getenv("RENDITION_WORKERS"))
+    print("JOB_QUEUE:", os.getenv("JOB_QUEUE"))
+    print("JOB_DB:", os.getenv("JOB_DB"))
+    print("JOB_WORKERS:", os.getenv("JOB_WORKERS"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,713 @@
+"""
+Durable job queue: generations are submitted to a SQLite table and run by a
+pool of worker processes, so they survive a restart of the submitting process
+and scale past one interpreter.
+
+    python jobs.py worker --processes 4        # run the workers
+    python jobs.py submit "A stainless steel water bottle" --lane batch
+    python jobs.py status <job id>
+    python jobs.py cancel <job id>
+    python jobs.py stats
+"""
+
+if __name__ == "__main__":
+    # Before the imports below, which read their settings from the environment
+    from bootstrap import init
+
+    init()
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from workflow import (
+    AI_RESPONSE_DIR,
+    MAX_VARIANTS,
+    PIPELINE_MODES,
+    State,
+    astream_pipeline,
+    arun_variants,
+    create_output_directory,
+    new_state,
+    record_run,
+    warm_up_agents,
+)
+from agents.metrics import run_timings
+from agents.transport import get_default_async_transport
+from run_logging import configure_logging, run_scope
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding the job queue, shared by the submitting and worker processes
+JOB_DB = os.getenv("JOB_DB", os.path.join(AI_RESPONSE_DIR, "jobs.sqlite"))
+# Seconds a claimed job stays leased without a heartbeat before another worker retries it
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))
+# Seconds between lease renewals, which also publish progress and pick up cancellations
+JOB_HEARTBEAT_S = float(os.getenv("JOB_HEARTBEAT_S", "1"))
+# Attempts of a job whose worker died before it is given up as failed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Jobs run at once by each worker process
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "0.25"))
+# Seconds stopped worker processes get to exit before they are killed
+WORKER_STOP_TIMEOUT_S = 10.0
+
+# Lanes in claim order: a queued interactive job always runs before a batch one
+LANES = {"interactive": 0, "batch": 1}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+JSON_COLUMNS = ("progress", "result")
+
+
+class JobStore:
+    """Jobs table in a single SQLite file, safe to share between processes."""
+
+    def __init__(
+        self,
+        path: str = JOB_DB,
+        lease_s: float = JOB_LEASE_S,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ):
+        self.path = path
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                lane TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                product_desc TEXT NOT NULL,
+                mode TEXT,
+                variants INTEGER NOT NULL,
+                output_dir TEXT,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires REAL,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )""")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at)"
+        )
+
+    def submit(
+        self,
+        product_desc: str,
+        mode: Optional[str] = None,
+        variants: int = 1,
+        lane: str = "interactive",
+        output_dir: Optional[str] = None,
+    ) -> str:
+        """Queue a generation and return its job id."""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        if mode is not None and mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode: {mode}")
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"Variant count must be between 1 and {MAX_VARIANTS}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, lane, priority, status, product_desc, mode, "
+                "variants, output_dir, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    lane,
+                    LANES[lane],
+                    QUEUED,
+                    product_desc,
+                    mode,
+                    variants,
+                    output_dir,
+                    time.time(),
+                ),
+            )
+        logger.info(f"Submitted job {job_id} to the {lane} lane")
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job as a dict, or None if there is no such job."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for column in JSON_COLUMNS:
+            if job[column] is not None:
+                job[column] = json.loads(job[column])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job now, or ask the worker of a running one to stop it.
+
+        Returns False if the job is unknown or already finished.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED),
+            )
+            if cursor.rowcount:
+                logger.info(f"Cancelled queued job {job_id}")
+                return True
+            cursor = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING),
+            )
+        if cursor.rowcount:
+            logger.info(f"Requested cancellation of running job {job_id}")
+        return bool(cursor.rowcount)
+
+    def claim(self, worker: str, lanes: Optional[List[str]] = None) -> Optional[Dict]:
+        """Lease the next job for `worker`, highest priority lane first, oldest first.
+
+        Jobs whose lease ran out (their worker died) are queued again first, or
+        failed once they used up their attempts.
+        """
+        lanes = lanes or list(LANES)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._requeue_expired(now)
+                placeholders = ",".join("?" * len(lanes))
+                row = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE status = ? AND lane IN ({placeholders}) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (QUEUED, *lanes),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, "
+                        "attempts = attempts + 1, started_at = ? WHERE id = ?",
+                        (RUNNING, worker, now + self.lease_s, now, row["id"]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return None if row is None else self.get(row["id"])
+
+    def _requeue_expired(self, now: float) -> None:
+        expired = self._conn.execute(
+            "SELECT id, attempts, worker, cancel_requested FROM jobs "
+            "WHERE status = ? AND lease_expires < ?",
+            (RUNNING, now),
+        ).fetchall()
+        for job in expired:
+            if job["cancel_requested"]:
+                status, error = CANCELLED, "Cancelled"
+            elif job["attempts"] >= self.max_attempts:
+                status, error = FAILED, "Worker lost"
+            else:
+                logger.warning(
+                    f"Job {job['id']} lost its worker {job['worker']}, retrying it"
+                )
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL "
+                    "WHERE id = ?",
+                    (QUEUED, job["id"]),
+                )
+                continue
+            logger.warning(f"Job {job['id']} lost its worker {job['worker']}: {status}")
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, worker = NULL, "
+                "lease_expires = NULL, finished_at = ? WHERE id = ?",
+                (status, error, now, job["id"]),
+            )
+
+    def heartbeat(
+        self, job_id: str, worker: str, progress: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """Extend the lease of a job `worker` still holds and save its progress.
+
+        Returns False when the worker should stop: the job was cancelled or its
+        lease already went to another worker.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires = ?, progress = COALESCE(?, progress) "
+                "WHERE id = ? AND worker = ? AND status = ? AND cancel_requested = 0",
+                (
+                    time.time() + self.lease_s,
+                    None if progress is None else json.dumps(progress),
+                    job_id,
+                    worker,
+                    RUNNING,
+                ),
+            )
+        return bool(cursor.rowcount)
+
+    def finish(
+        self,
+        job_id: str,
+        worker: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+    ) -> bool:
+        """Record the outcome of a job, unless its lease was lost to another worker."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, worker = NULL, "
+                "lease_expires = NULL, finished_at = ? "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (
+                    status,
+                    None if result is None else json.dumps(result),
+                    error,
+                    time.time(),
+                    job_id,
+                    worker,
+                    RUNNING,
+                ),
+            )
+        return bool(cursor.rowcount)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return the number of jobs per lane and status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT lane, status, COUNT(*) FROM jobs GROUP BY lane, status"
+            ).fetchall()
+        stats: Dict[str, Dict[str, int]] = {lane: {} for lane in LANES}
+        for lane, status, count in rows:
+            stats.setdefault(lane, {})[status] = count
+        return stats
+
+    async def asubmit(self, *args: Any, **kwargs: Any) -> str:
+        """Async submit that keeps the database write off the event loop."""
+        return await asyncio.to_thread(self.submit, *args, **kwargs)
+
+    async def aget(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def acancel(self, job_id: str) -> bool:
+        return await asyncio.to_thread(self.cancel, job_id)
+
+    async def watch(
+        self, job_id: str, poll_interval: float = JOB_POLL_S
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Poll a job, yielding it whenever its status or progress changes, until it is done."""
+        last = None
+        while True:
+            job = await self.aget(job_id)
+            if job is None:
+                raise KeyError(f"Unknown job: {job_id}")
+            seen = (job["status"], job["progress"])
+            if seen != last:
+                last = seen
+                yield job
+            if job["status"] in FINISHED:
+                return
+            await asyncio.sleep(poll_interval)
+
+    async def wait(self, job_id: str, poll_interval: float = JOB_POLL_S) -> Dict:
+        """Poll a job until it is done and return it."""
+        async for job in self.watch(job_id, poll_interval):
+            pass
+        return job
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_store: Optional[JobStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Return the process-wide job store at JOB_DB."""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = JobStore()
+    return _default_store
+
+
+def job_result(state: State) -> Dict[str, Any]:
+    """Return the JSON-serializable outcome of a finished run."""
+    content = state.get("content")
+    result: Dict[str, Any] = {
+        "output_dir": state["output_dir"],
+        "title": content.title if content else None,
+        "message": content.message if content else None,
+        "tags": content.tags if content else None,
+        "image_prompt": state.get("image_prompt"),
+        "image_path": state.get("image_path"),
+        "renditions": state.get("renditions"),
+    }
+    if state.get("variants"):
+        result["variants"] = [
+            {
+                "title": variant["content"].title if variant["content"] else None,
+                "message": variant["content"].message if variant["content"] else None,
+                "tags": variant["content"].tags if variant["content"] else None,
+                "image_prompt": variant["image_prompt"],
+                "image_path": variant["image_path"],
+                "error": variant["error"],
+            }
+            for variant in state["variants"]
+        ]
+    return result
+
+
+class JobWorker:
+    """Claim jobs from the store and run up to `concurrency` of them on one event loop."""
+
+    def __init__(
+        self,
+        store: JobStore,
+        concurrency: int = JOB_CONCURRENCY,
+        lanes: Optional[List[str]] = None,
+        poll_interval: float = JOB_POLL_S,
+        heartbeat_s: float = JOB_HEARTBEAT_S,
+    ):
+        self.store = store
+        self.concurrency = concurrency
+        self.lanes = lanes
+        self.poll_interval = poll_interval
+        # Well within the lease, so a slow heartbeat does not hand the job to another worker
+        self.heartbeat_s = min(heartbeat_s, store.lease_s / 3)
+        self.name = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.processed = 0
+        self._stopping = False
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        """Run one claimed job, renewing its lease until it finishes or is cancelled."""
+        output_dir = job["output_dir"] or create_output_directory()
+        os.makedirs(output_dir, exist_ok=True)
+        progress: Dict[str, Any] = {"output_dir": output_dir}
+        state = new_state(job["product_desc"], output_dir)
+
+        async def generate() -> State:
+            nonlocal state
+            with run_scope(output_dir), run_timings(output_dir) as timings:
+                logger.info(f"Running job {job['id']} in directory: {output_dir}")
+                if job["variants"] > 1:
+                    state = await arun_variants(
+                        state, job["variants"], mode=job["mode"]
+                    )
+                else:
+                    async for event, value in astream_pipeline(state, mode=job["mode"]):
+                        if event == "state":
+                            state = value
+                        elif event == "rendition":
+                            name, path = value
+                            progress.setdefault("renditions", {})[name] = path
+                        else:
+                            progress[event] = value
+                record_run(state, job["mode"], timings)
+                return state
+
+        task = asyncio.create_task(generate())
+        keep_running = True
+        while keep_running and not task.done():
+            await asyncio.wait({task}, timeout=self.heartbeat_s)
+            if not task.done():
+                keep_running = await asyncio.to_thread(
+                    self.store.heartbeat, job["id"], self.name, dict(progress)
+                )
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            # Cancelled by request, or the job went to another worker already
+            await asyncio.to_thread(
+                self.store.finish, job["id"], self.name, CANCELLED, error="Cancelled"
+            )
+            logger.info(f"Stopped job {job['id']}")
+            return
+
+        self.processed += 1
+        try:
+            state = task.result()
+        except Exception as e:
+            logger.error(f"Error running job {job['id']}: {str(e)}")
+            await asyncio.to_thread(
+                self.store.finish, job["id"], self.name, FAILED, error=str(e)
+            )
+            return
+        status = FAILED if state.get("error") else SUCCEEDED
+        await asyncio.to_thread(
+            self.store.finish,
+            job["id"],
+            self.name,
+            status,
+            job_result(state),
+            state.get("error"),
+        )
+        logger.info(f"Job {job['id']} {status}")
+
+    async def run(self, max_jobs: Optional[int] = None) -> None:
+        """Claim and run jobs until stopped, or until `max_jobs` were claimed."""
+        running: set = set()
+        claimed = 0
+        lanes = self.lanes or list(LANES)
+        try:
+            while not self._stopping and (max_jobs is None or claimed < max_jobs):
+                running = {task for task in running if not task.done()}
+                if len(running) >= self.concurrency:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                # Keep the last slot for the interactive lane, so a backlog of
+                # batch jobs cannot delay an interactive one by a whole job
+                claim_lanes = lanes
+                if (
+                    self.concurrency > 1
+                    and len(running) == self.concurrency - 1
+                    and "interactive" in lanes
+                ):
+                    claim_lanes = ["interactive"]
+                job = await asyncio.to_thread(self.store.claim, self.name, claim_lanes)
+                if job is None:
+                    if running:
+                        await asyncio.wait(
+                            running,
+                            timeout=self.poll_interval,
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                    else:
+                        await asyncio.sleep(self.poll_interval)
+                    continue
+                claimed += 1
+                running.add(asyncio.create_task(self.run_job(job)))
+            if running:
+                await asyncio.wait(running)
+        finally:
+            await get_default_async_transport().close()
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; the running ones are finished."""
+        self._stopping = True
+
+
+def worker_main(
+    db_path: str, concurrency: int, lanes: Optional[List[str]] = None
+) -> None:
+    """Entry point of a worker process."""
+    configure_logging()
+    try:
+        warm_up_agents()
+    except Exception as e:
+        logger.warning(f"Agent warm-up failed, agents will be built lazily: {str(e)}")
+    worker = JobWorker(JobStore(db_path), concurrency, lanes)
+    logger.info(f"Worker {worker.name} started")
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        pass
+
+
+def start_workers(
+    processes: int,
+    concurrency: int = JOB_CONCURRENCY,
+    lanes: Optional[List[str]] = None,
+    db_path: str = JOB_DB,
+) -> List[multiprocessing.Process]:
+    """Start worker processes; spawned, so they do not inherit our threads."""
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(processes):
+        process = context.Process(
+            target=worker_main, args=(db_path, concurrency, lanes), daemon=True
+        )
+        process.start()
+        workers.append(process)
+    logger.info(f"Started {processes} job worker processes")
+    return workers
+
+
+def stop_workers(
+    workers: List[multiprocessing.Process], timeout: float = WORKER_STOP_TIMEOUT_S
+) -> None:
+    """Terminate the worker processes, killing any still alive after `timeout`.
+
+    Their running jobs are retried by another worker once the leases expire.
+    """
+    for process in workers:
+        if process.is_alive():
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    for process in workers:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+
+def run_workers(
+    processes: int,
+    concurrency: int = JOB_CONCURRENCY,
+    lanes: Optional[List[str]] = None,
+    db_path: str = JOB_DB,
+    parent_pid: Optional[int] = None,
+) -> None:
+    """Run worker processes until they exit, we are signalled or `parent_pid` dies."""
+    # atexit does not run on SIGTERM (e.g. a container stop), exit normally instead
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    workers = start_workers(processes, concurrency, lanes, db_path)
+    try:
+        while any(process.is_alive() for process in workers):
+            multiprocessing.connection.wait(
+                [process.sentinel for process in workers], timeout=1.0
+            )
+            # Reparented: whoever launched us is gone, even if it was SIGKILLed
+            if parent_pid is not None and os.getppid() != parent_pid:
+                logger.info(f"Parent process {parent_pid} exited, stopping workers")
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_workers(workers)
+
+
+def signal_group(process: subprocess.Popen, sig: int) -> None:
+    """Send a signal to the process group led by `process`, or to it alone."""
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            pass
+    elif sig == signal.SIGTERM:
+        process.terminate()
+    else:
+        process.kill()
+
+
+def stop_launched(
+    process: subprocess.Popen, timeout: float = WORKER_STOP_TIMEOUT_S
+) -> None:
+    """Stop a `jobs.py worker` command started by launch_workers, with its workers."""
+    if process.poll() is not None:
+        return
+    signal_group(process, signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        signal_group(process, getattr(signal, "SIGKILL", signal.SIGTERM))
+        process.wait()
+
+
+def launch_workers(
+    processes: int, concurrency: int = JOB_CONCURRENCY, db_path: str = JOB_DB
+) -> subprocess.Popen:
+    """Run `jobs.py worker` next to another entry point, e.g. the Gradio app.
+
+    A separate command, so the workers do not re-import the caller's main module.
+    It runs in its own process group, stopped as a whole when we exit, and exits
+    by itself if we die without running our exit handlers.
+    """
+    script = os.path.abspath(__file__)
+    command = [sys.executable, script, "--db", db_path, "worker"]
+    command += ["--processes", str(processes), "--concurrency", str(concurrency)]
+    command += ["--parent-pid", str(os.getpid())]
+    process = subprocess.Popen(command, start_new_session=True)
+    atexit.register(stop_launched, process)
+    logger.info(f"Launched {processes} job worker processes (pid {process.pid})")
+    return process
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db", default=JOB_DB, help="job queue database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    worker = commands.add_parser("worker", help="run worker processes")
+    worker.add_argument("-p", "--processes", type=int, default=os.cpu_count() or 1)
+    worker.add_argument("-c", "--concurrency", type=int, default=JOB_CONCURRENCY)
+    worker.add_argument("--lane", action="append", choices=list(LANES))
+    worker.add_argument(
+        "--parent-pid", type=int, help="exit when this process exits (internal)"
+    )
+
+    submit = commands.add_parser("submit", help="queue a generation")
+    submit.add_argument("product_desc")
+    submit.add_argument("--lane", choices=list(LANES), default="interactive")
+    submit.add_argument("--mode", choices=PIPELINE_MODES, default=None)
+    submit.add_argument("--variants", type=int, default=1)
+    submit.add_argument("--wait", action="store_true", help="wait for the result")
+
+    status = commands.add_parser("status", help="show a job")
+    status.add_argument("job_id")
+
+    cancel = commands.add_parser("cancel", help="cancel a job")
+    cancel.add_argument("job_id")
+
+    commands.add_parser("stats", help="count jobs per lane and status")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    configure_logging()
+    if args.command == "worker":
+        run_workers(
+            args.processes, args.concurrency, args.lane, args.db, args.parent_pid
+        )
+        return
+
+    store = JobStore(args.db)
+    if args.command == "submit":
+        job_id = store.submit(args.product_desc, args.mode, args.variants, args.lane)
+        print(job_id)
+        if args.wait:
+            print(json.dumps(asyncio.run(store.wait(job_id)), indent=2))
+    elif args.command == "status":
+        job = store.get(args.job_id)
+        if job is None:
+            raise SystemExit(f"Unknown job: {args.job_id}")
+        print(json.dumps(job, indent=2))
+    elif args.command == "cancel":
+        if not store.cancel(args.job_id):
+            raise SystemExit(f"Job {args.job_id} is not queued or running")
+        print(f"Cancelled {args.job_id}")
+    elif args.command == "stats":
+        print(json.dumps(store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
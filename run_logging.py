@@ -0,0 +1,118 @@
+from typing import Dict, Iterator, Optional, TextIO
+from contextlib import contextmanager
+from contextvars import ContextVar
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Log file of the run the current task/thread is working on
+current_run: ContextVar[Optional[str]] = ContextVar("current_run", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+
+class RunContextFilter(logging.Filter):
+    """Stamp each record with the run it was emitted in, before it leaves the thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_log = current_run.get()
+        return True
+
+
+class RunLogDispatcher(logging.Handler):
+    """Single handler that writes to the console and routes records to per-run files."""
+
+    def __init__(self, console: logging.Handler):
+        super().__init__()
+        self.console = console
+        # Concurrent runs may share a directory, so files are reference counted
+        self._files: Dict[str, TextIO] = {}
+        self._refs: Dict[str, int] = {}
+        self.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        # Open/close markers travel through the queue so they stay ordered with the records
+        marker = getattr(record, "run_log_marker", None)
+        if marker == "open":
+            if record.run_log not in self._files:
+                self._files[record.run_log] = open(
+                    record.run_log, "a", encoding="utf-8"
+                )
+            self._refs[record.run_log] = self._refs.get(record.run_log, 0) + 1
+            return True
+        if marker == "close":
+            self._refs[record.run_log] = self._refs.get(record.run_log, 1) - 1
+            if self._refs[record.run_log] <= 0:
+                del self._refs[record.run_log]
+                log_file = self._files.pop(record.run_log, None)
+                if log_file is not None:
+                    log_file.close()
+            return True
+        return super().handle(record)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if record.levelno >= self.console.level:
+                self.console.handle(record)
+            log_file = self._files.get(getattr(record, "run_log", None))
+            if log_file is not None:
+                log_file.write(self.format(record) + "\n")
+                log_file.flush()
+        except Exception:
+            self.handleError(record)
+
+    def close(self) -> None:
+        for log_file in self._files.values():
+            log_file.close()
+        self._files.clear()
+        self._refs.clear()
+        super().close()
+
+
+def configure_logging(level: Optional[str] = None) -> None:
+    """Route all logging through one queue-backed dispatcher, at LOG_LEVEL by default."""
+    global _listener
+    level_name = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    root = logging.getLogger()
+    root.setLevel(level_name)
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(LOG_FORMAT))
+    dispatcher = RunLogDispatcher(console)
+
+    queue_handler = logging.handlers.QueueHandler(_log_queue)
+    queue_handler.addFilter(RunContextFilter())
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(_log_queue, dispatcher)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _send_marker(log_path: str, marker: str) -> None:
+    if _listener is None:
+        return
+    record = logging.makeLogRecord({"run_log": log_path, "run_log_marker": marker})
+    _log_queue.put_nowait(record)
+
+
+@contextmanager
+def run_scope(output_dir: str, filename: str = "execution.log") -> Iterator[str]:
+    """Send the records emitted in this context to a log file in the run's directory."""
+    log_path = os.path.join(output_dir, filename)
+    _send_marker(log_path, "open")
+    token = current_run.set(log_path)
+    try:
+        yield log_path
+    finally:
+        current_run.reset(token)
+        _send_marker(log_path, "close")
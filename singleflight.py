@@ -0,0 +1,128 @@
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+)
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _StreamFlight:
+    """One shared async generator run whose events are replayed to every subscriber."""
+
+    def __init__(self):
+        self.events: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers = 0
+
+    async def pump(self, events: AsyncIterator[Any]) -> None:
+        try:
+            async for event in events:
+                async with self.changed:
+                    self.events.append(event)
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(
+                    lambda: index < len(self.events) or self.done
+                )
+                pending = self.events[index:]
+                finished = self.done
+            for event in pending:
+                yield event
+            index += len(pending)
+            if finished and index >= len(self.events):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class AsyncSingleFlight:
+    """Coalesce concurrent calls with the same key into one shared execution."""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, _StreamFlight] = {}
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await the in-flight execution for `key`, starting `fn()` if there is none."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            # Run in its own task so a disconnecting caller cannot cancel the others
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.deduplicated += 1
+            logger.info(
+                f"Joined in-flight execution ({self.deduplicated} deduplicated)"
+            )
+        return await asyncio.shield(task)
+
+    async def stream(
+        self, key: Hashable, fn: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Any]:
+        """Yield the events of the in-flight stream for `key`, starting `fn()` if there is none.
+
+        Late subscribers first receive the events they missed, then the live ones.
+        Once the last subscriber leaves (e.g. cancelled), the stream is cancelled.
+        """
+        self.calls += 1
+        flight = self._streams.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = _StreamFlight()
+            # Run in its own task so a disconnecting caller cannot stop the others
+            flight.task = asyncio.ensure_future(flight.pump(fn()))
+            self._streams[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.deduplicated += 1
+            logger.info(f"Joined in-flight stream ({self.deduplicated} deduplicated)")
+        flight.subscribers += 1
+        try:
+            async for event in flight.subscribe():
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                # Nobody is left to receive its events; later callers start anew
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _forget(self, key: Hashable, flight: _StreamFlight) -> None:
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return call, execution and deduplication counters."""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._in_flight) + len(self._streams),
+        }
@@ -0,0 +1,154 @@
+import os
+import shutil
+import time
+
+import pytest
+
+import artifacts
+from artifacts import ArtifactStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # Collect unreferenced images and finished runs at once
+    monkeypatch.setattr(artifacts, "OBJECT_GRACE_S", 0)
+    monkeypatch.setattr(artifacts, "RUNNING_GRACE_S", 0)
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    yield store
+    store.close()
+
+
+def age_run(store, output_dir, days):
+    store.writer.flush()
+    with store._lock:
+        store._conn.execute(
+            "UPDATE runs SET created_at = ? WHERE output_dir = ?",
+            (time.time() - days * 86400, output_dir),
+        )
+        store._conn.commit()
+
+
+def finished_run(store, data=b"image", days=0):
+    output_dir = store.create_run_dir()
+    store.save_image(output_dir, "image", data, ".png")
+    store.record_run(output_dir, status="succeeded", product_desc="A water bottle")
+    age_run(store, output_dir, days)
+    return output_dir
+
+
+def object_files(store):
+    return [files for _, _, files in os.walk(store.objects_dir) if files]
+
+
+def test_run_directories_are_unique(store):
+    dirs = {store.create_run_dir() for _ in range(20)}
+    assert len(dirs) == 20
+    assert all(os.path.isdir(d) for d in dirs)
+
+
+def test_identical_images_are_stored_once_and_linked(store):
+    first, second = store.create_run_dir(), store.create_run_dir()
+    path_1 = store.save_image(first, "image", b"same bytes", ".png")
+    path_2 = store.save_image(second, "image", b"same bytes", ".png")
+    assert os.path.samefile(path_1, path_2)
+    assert len(object_files(store)) == 1
+    store.writer.flush()
+    stats = store.stats()
+    assert (stats["objects"], stats["stored_bytes"], stats["linked_bytes"]) == (
+        1,
+        10,
+        20,
+    )
+
+
+def test_saving_again_replaces_the_run_image(store):
+    output_dir = store.create_run_dir()
+    store.save_image(output_dir, "image", b"first", ".png")
+    path = store.save_image(output_dir, "image", b"second", ".png")
+    with open(path, "rb") as f:
+        assert f.read() == b"second"
+    assert sorted(os.listdir(output_dir)) == ["image.png"]
+
+
+def test_saving_the_same_image_again_leaves_no_temporary_file(store):
+    output_dir = store.create_run_dir()
+    store.save_image(output_dir, "image", b"same bytes", ".png")
+    path = store.save_image(output_dir, "image", b"same bytes", ".png")
+    assert os.listdir(output_dir) == ["image.png"]
+    with open(path, "rb") as f:
+        assert f.read() == b"same bytes"
+
+
+def test_failed_save_leaves_no_temporary_file(store, monkeypatch):
+    output_dir = store.create_run_dir()
+
+    def fail(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "link", fail)
+    monkeypatch.setattr(shutil, "copyfile", fail)
+    with pytest.raises(OSError, match="disk full"):
+        store.save_image(output_dir, "image", b"bytes", ".png")
+    assert os.listdir(output_dir) == []
+
+
+def test_runs_are_found_in_the_manifest(store):
+    output_dir = finished_run(store)
+    store.record_run(output_dir, title="Stay Hydrated", tags=["#a", "#b"])
+    store.writer.flush()
+    [run] = store.find_runs(contains="water")
+    assert (run["title"], run["tags"]) == ("Stay Hydrated", ["#a", "#b"])
+    run = store.get_run(os.path.basename(output_dir))
+    assert [a["name"] for a in run["artifacts"]] == ["image"]
+    assert store.find_runs(status="failed") == []
+
+
+def test_gc_deletes_expired_runs_and_their_unshared_images(store):
+    old = finished_run(store, b"old image", days=10)
+    shared_old = finished_run(store, b"shared", days=10)
+    recent = finished_run(store, b"shared")
+    result = store.collect_garbage(retention_days=7, max_bytes=0)
+    assert result["runs"] == 2
+    assert not os.path.exists(old) and not os.path.exists(shared_old)
+    assert os.path.exists(os.path.join(recent, "image.png"))
+    # The image the recent run still links to survives
+    assert result["objects"] == 1
+    assert len(object_files(store)) == 1
+
+
+def test_gc_keeps_young_running_runs(store, monkeypatch):
+    monkeypatch.setattr(artifacts, "RUNNING_GRACE_S", 3600)
+    output_dir = store.create_run_dir()
+    age_run(store, output_dir, 10)
+    # Created ten days ago but its status was never updated: presumed dead
+    assert store.collect_garbage(retention_days=7, max_bytes=0)["runs"] == 1
+    running = store.create_run_dir()
+    store.save_image(running, "image", b"over the cap", ".png")
+    store.writer.flush()
+    assert store.collect_garbage(retention_days=7, max_bytes=1)["runs"] == 0
+    assert os.path.exists(running)
+
+
+def test_size_cap_deletes_the_oldest_runs_counting_renditions(store):
+    oldest = finished_run(store, b"a" * 100, days=3)
+    store.record_artifact(
+        oldest, "thumbnail", "thumbhash", os.path.join(oldest, "thumbnail.webp"), 900
+    )
+    middle = finished_run(store, b"b" * 100, days=2)
+    newest = finished_run(store, b"c" * 100, days=1)
+    # 300 bytes of images fit, the rendition pushes the total over the cap
+    result = store.collect_garbage(retention_days=0, max_bytes=500)
+    assert result["runs"] == 1
+    assert not os.path.exists(oldest)
+    assert os.path.exists(middle) and os.path.exists(newest)
+
+
+def test_gc_never_deletes_directories_outside_the_root(store, tmp_path):
+    outside = tmp_path / "batch_images" / "item-1"
+    outside.mkdir(parents=True)
+    (outside / "image.png").write_bytes(b"keep me")
+    store.record_run(str(outside), status="succeeded")
+    age_run(store, str(outside), 10)
+    assert store.collect_garbage(retention_days=7, max_bytes=0)["runs"] == 1
+    assert (outside / "image.png").read_bytes() == b"keep me"
+    assert store.get_run("item-1") is None
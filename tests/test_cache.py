@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from agents.cache import MemoryLRUCache, ResponseCache, SQLiteCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def disk(tmp_path):
+    return SQLiteCache(str(tmp_path / "cache" / "responses.sqlite3"))
+
+
+class LockedDisk(SQLiteCache):
+    def get(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def set(self, key, value):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_keys_are_stable_and_cover_every_part():
+    key = make_cache_key("model", "system", {"seed": 1, "steps": 4})
+    assert key == make_cache_key("model", "system", {"steps": 4, "seed": 1})
+    assert key != make_cache_key("model", "system", {"seed": 2, "steps": 4})
+    assert key != make_cache_key("other", "system", {"seed": 1, "steps": 4})
+    assert len(key) == 64
+
+
+def test_memory_evicts_the_least_recently_used_entry():
+    memory = MemoryLRUCache(max_entries=2)
+    memory.set("a", b"1")
+    memory.set("b", b"2")
+    # Reading "a" makes "b" the least recently used
+    assert memory.get("a") == b"1"
+    memory.set("c", b"3")
+    assert memory.get("b") is None
+    assert (memory.get("a"), memory.get("c")) == (b"1", b"3")
+
+
+def test_memory_is_bounded_by_bytes():
+    memory = MemoryLRUCache(max_bytes=10)
+    memory.set("a", b"x" * 6)
+    memory.set("b", b"x" * 6)
+    assert memory.get("a") is None
+    # Larger than the whole tier: not stored, nothing else evicted
+    memory.set("c", b"x" * 11)
+    assert memory.get("c") is None
+    assert memory.stats() == {"entries": 1, "bytes": 6}
+
+
+def test_memory_entries_expire(clock):
+    memory = MemoryLRUCache(ttl=60)
+    memory.set("a", b"1")
+    clock.now += 61
+    assert memory.get("a") is None
+    assert memory.stats()["entries"] == 0
+
+
+def test_disk_evicts_the_least_recently_read_entries(disk, clock):
+    disk.max_bytes = 10
+    disk.set("a", b"x" * 4)
+    clock.now += 1
+    disk.set("b", b"x" * 4)
+    clock.now += 1
+    disk.get("a")
+    clock.now += 1
+    disk.set("c", b"x" * 4)
+    assert disk.get("b") is None
+    assert disk.get("a")[0] == disk.get("c")[0] == b"x" * 4
+
+
+def test_disk_entries_expire(disk, clock):
+    disk.ttl = 60
+    disk.set("a", b"1")
+    assert disk.get("a") == (b"1", clock.now)
+    clock.now += 61
+    assert disk.get("a") is None
+
+
+def test_disk_hits_are_promoted_to_memory_keeping_their_age(disk, clock):
+    ResponseCache(MemoryLRUCache(), disk).set("key", b"value")
+    clock.now += 30
+    # A new process: empty memory, same disk
+    cache = ResponseCache(MemoryLRUCache(ttl=60), disk)
+    assert cache.get("key") == b"value"
+    assert cache.get("key") == b"value"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["hit_rate"]) == (1, 1, 1.0)
+    # The promoted entry expires when the original write would have
+    clock.now += 31
+    assert cache.memory.get("key") is None
+
+
+def test_disk_read_errors_are_misses(tmp_path):
+    cache = ResponseCache(MemoryLRUCache(), LockedDisk(str(tmp_path / "c.sqlite3")))
+    cache.set("key", b"value")
+    cache.memory.delete("key")
+    assert cache.get("key") is None
+    assert asyncio.run(cache.aget("key")) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_delete_drops_both_tiers(disk):
+    cache = ResponseCache(MemoryLRUCache(), disk)
+    cache.set("key", b"value")
+    cache.delete("key")
+    assert cache.get("key") is None
+    assert disk.get("key") is None
+
+
+def test_async_lookups_and_writes():
+    cache = ResponseCache(MemoryLRUCache())
+
+    async def main():
+        await cache.aset("key", b"value")
+        return await cache.aget("key"), await cache.aget("missing")
+
+    assert asyncio.run(main()) == (b"value", None)
+    assert cache.stats()["writes"] == 1
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from agents.content_creator import (
+    FUSED_FIELD_PREFIXES,
+    ContentCreatorAgent,
+    ContentStreamParser,
+    split_tags,
+)
+
+COMPLETION = (
+    "Title: Stay Hydrated in Style\n"
+    "Message: Keep your hydration game strong.\n"
+    "Tags: #StayHydrated #WaterBottle\n"
+)
+
+
+class ScriptedCreator(ContentCreatorAgent):
+    """Content creator that replays canned completions instead of calling a model."""
+
+    def __init__(self, completion: str, repairs=()):
+        self.cache = None
+        self.chunks = [completion[i : i + 7] for i in range(0, len(completion), 7)]
+        self.repairs = list(repairs)
+        self.repair_prompts = []
+        self.streamed = 0
+
+    def stream(self, input_data, use_cache=True):
+        # Trailing chatter the parser should not wait for once the fields are in
+        for chunk in self.chunks + ["\nHope this helps!"]:
+            self.streamed += 1
+            yield chunk
+
+    async def astream(self, input_data, use_cache=True):
+        for chunk in self.stream(input_data, use_cache):
+            yield chunk
+
+    def invoke(self, input_data, use_cache=True):
+        self.repair_prompts.append(input_data["input"])
+        return self.repairs.pop(0)
+
+    async def ainvoke(self, input_data, use_cache=True):
+        return self.invoke(input_data, use_cache)
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i : i + size]))
+    return events + parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 3, 64])
+def test_fields_complete_as_their_lines_arrive(size):
+    parser = ContentStreamParser()
+    events = feed_in_chunks(parser, COMPLETION, size)
+    assert [field for field, _ in events] == ["title", "message", "tags"]
+    assert parser.complete
+    assert parser.fields["tags"] == ["#StayHydrated", "#WaterBottle"]
+
+
+def test_field_is_emitted_before_the_rest_of_the_completion():
+    parser = ContentStreamParser()
+    assert parser.feed("Title: Cold for 24h") == []
+    assert parser.feed("\nMess") == [("title", "Cold for 24h")]
+
+
+def test_markdown_and_value_on_the_next_line_are_tolerated():
+    parser = ContentStreamParser()
+    feed_in_chunks(
+        parser, "**Title:** Bold\nMessage:\n\nOn its own line\nTags: a, b c\n", 5
+    )
+    assert parser.fields == {
+        "title": "Bold",
+        "message": "On its own line",
+        "tags": ["a", "b c"],
+    }
+
+
+def test_first_value_of_a_repeated_field_wins():
+    parser = ContentStreamParser()
+    feed_in_chunks(parser, "Title: First\nTitle: Second\n", 4)
+    assert parser.fields == {"title": "First"}
+    assert parser.missing() == ["message", "tags"]
+
+
+def test_fused_prefixes_parse_the_image_prompt():
+    parser = ContentStreamParser(FUSED_FIELD_PREFIXES)
+    feed_in_chunks(parser, "Title: T\nImage Prompt: A steel bottle\n", 8)
+    assert parser.fields["image_prompt"] == "A steel bottle"
+    assert parser.missing() == ["message", "tags"]
+
+
+def test_split_tags():
+    assert split_tags("#a #b,#c") == ["#a", "#b", "#c"]
+    assert split_tags("summer sale, outdoors") == ["summer sale", "outdoors"]
+
+
+def test_stream_stops_once_every_field_is_parsed():
+    agent = ScriptedCreator(COMPLETION)
+    content = agent.create_content("A water bottle")
+    assert content.title == "Stay Hydrated in Style"
+    assert agent.streamed == len(agent.chunks)
+
+
+def test_missing_field_is_repaired_alone():
+    agent = ScriptedCreator(
+        "Title: Stay Hydrated\nMessage: Drink up.\n", repairs=["Tags: #Hydrate"]
+    )
+    events = list(agent.stream_content("A water bottle"))
+    assert [field for field, _ in events] == ["title", "message", "tags", "content"]
+    assert events[-1][1].tags == ["#Hydrate"]
+    # The repair asks for the one line and passes along what is already known
+    [prompt] = agent.repair_prompts
+    assert "Tags:" in prompt and "Title: Stay Hydrated" in prompt
+
+
+def test_async_repair():
+    agent = ScriptedCreator("Title: T\nTags: #a\n", repairs=["Message: M"])
+    content = asyncio.run(agent.acreate_content("A water bottle"))
+    assert (content.title, content.message, content.tags) == ("T", "M", ["#a"])
+
+
+def test_failed_repair_raises():
+    agent = ScriptedCreator("Title: T\nMessage: M\n", repairs=["no tags here"])
+    with pytest.raises(ValueError, match="Could not repair tags"):
+        agent.create_content("A water bottle")
+
+
+def test_unusable_completion_is_not_repaired():
+    agent = ScriptedCreator("I cannot help with that.\n")
+    with pytest.raises(ValueError, match="Missing required fields"):
+        agent.create_content("A water bottle")
+    assert agent.repair_prompts == []
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from agents.base_agent import bound_client_timeouts
+from agents.deadline import (
+    DeadlineExceeded,
+    await_with_deadline,
+    bounded_timeout,
+    check_deadline,
+    check_sleep,
+    current_deadline,
+    deadline_scope,
+    new_deadline,
+    remaining,
+)
+
+
+def test_no_deadline_by_default():
+    assert remaining() is None
+    assert check_deadline("stage") is None
+    assert bounded_timeout(30) == 30
+
+
+def test_new_deadline_can_be_disabled():
+    assert new_deadline(0) is None
+    assert new_deadline(10) == pytest.approx(time.time() + 10, abs=1)
+
+
+def test_scope_sets_and_restores_the_deadline():
+    with deadline_scope(time.time() + 10):
+        assert 9 < remaining() <= 10
+        assert bounded_timeout(60) <= 10
+        assert bounded_timeout(1) == 1
+        with deadline_scope(None):
+            assert remaining() is None
+        assert remaining() is not None
+    assert current_deadline.get() is None
+
+
+def test_passed_deadline_raises_and_bounds_timeouts_to_zero():
+    with deadline_scope(time.time() - 1):
+        with pytest.raises(DeadlineExceeded, match="before stage"):
+            check_deadline("stage")
+        assert bounded_timeout(30) == 0
+
+
+def test_sleeping_past_the_deadline_raises_instead():
+    with deadline_scope(time.time() + 1):
+        check_sleep(0.1, "backoff")
+        with pytest.raises(DeadlineExceeded):
+            check_sleep(5, "backoff")
+
+
+def test_deadline_is_per_context():
+    seen = {}
+
+    def worker():
+        seen["thread"] = remaining()
+
+    with deadline_scope(time.time() + 10):
+        # A plain thread starts from an empty context
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        # A copied context, as asyncio.to_thread uses, carries it along
+        contextvars.copy_context().run(lambda: seen.update(copied=remaining()))
+    assert seen["thread"] is None
+    assert seen["copied"] is not None
+
+
+def test_tasks_inherit_the_deadline_of_their_creator():
+    async def main():
+        with deadline_scope(time.time() + 10):
+            task = asyncio.create_task(asyncio.sleep(0, remaining()))
+        return await task, remaining()
+
+    inherited, after = asyncio.run(main())
+    assert inherited is not None and after is None
+
+
+def test_await_is_cancelled_at_the_deadline():
+    async def main():
+        with deadline_scope(time.time() + 0.05):
+            await await_with_deadline(asyncio.sleep(5), "slow call")
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="during slow call"):
+        asyncio.run(main())
+    assert time.monotonic() - start < 1
+
+
+def test_await_after_the_deadline_does_not_start_the_call():
+    async def call():
+        raise AssertionError("should not run")
+
+    async def main():
+        with deadline_scope(time.time() - 1):
+            await await_with_deadline(call(), "late call")
+
+    with pytest.raises(DeadlineExceeded, match="before late call"):
+        asyncio.run(main())
+
+
+def test_await_without_a_deadline_returns_the_result():
+    async def main():
+        return await await_with_deadline(asyncio.sleep(0, "done"), "call")
+
+    assert asyncio.run(main()) == "done"
+
+
+class RecordingSession:
+    def __init__(self):
+        self.timeouts = []
+
+    def request(self, method, url, **kwargs):
+        self.timeouts.append(kwargs.get("timeout"))
+
+
+class Client:
+    def __init__(self):
+        self.get_session_fn = RecordingSession
+
+
+class Llm:
+    def __init__(self):
+        self._client = Client()
+
+
+def test_sync_client_requests_time_out_at_the_deadline():
+    llm = Llm()
+    bound_client_timeouts(llm)
+    session = llm._client.get_session_fn()
+    session.request("POST", "http://stub", timeout=60)
+    with deadline_scope(time.time() + 5):
+        session.request("POST", "http://stub", timeout=60)
+    assert session.timeouts[0] == 60
+    assert session.timeouts[1] <= 5
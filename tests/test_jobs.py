@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+import pytest
+
+from jobs import (
+    CANCELLED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    JobStore,
+    JobWorker,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"), lease_s=60, max_attempts=2)
+    yield store
+    store.close()
+
+
+def expire_lease(store, job_id):
+    with store._lock:
+        store._conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ?", (time.time() - 1, job_id)
+        )
+
+
+def test_interactive_jobs_are_claimed_first_then_oldest_first(store):
+    first_batch = store.submit("first batch", lane="batch")
+    second_batch = store.submit("second batch", lane="batch")
+    interactive = store.submit("interactive")
+    claimed = [store.claim("worker")["id"] for _ in range(3)]
+    assert claimed == [interactive, first_batch, second_batch]
+    assert store.claim("worker") is None
+
+
+def test_claim_only_takes_the_given_lanes(store):
+    store.submit("batch", lane="batch")
+    assert store.claim("worker", ["interactive"]) is None
+    assert store.claim("worker", ["batch"])["lane"] == "batch"
+
+
+def test_claim_leases_the_job_to_the_worker(store):
+    job_id = store.submit("A water bottle", mode="fused", variants=2)
+    job = store.claim("worker-1")
+    assert job["id"] == job_id
+    assert (job["status"], job["worker"], job["attempts"]) == (RUNNING, "worker-1", 1)
+    assert job["lease_expires"] > time.time() + 50
+    assert (job["mode"], job["variants"]) == ("fused", 2)
+
+
+def test_submit_validates_its_arguments(store):
+    with pytest.raises(ValueError):
+        store.submit("x", lane="bulk")
+    with pytest.raises(ValueError):
+        store.submit("x", mode="sideways")
+    with pytest.raises(ValueError):
+        store.submit("x", variants=0)
+
+
+def test_heartbeat_renews_the_lease_and_saves_progress(store):
+    job_id = store.submit("A water bottle")
+    store.claim("worker-1")
+    assert store.heartbeat(job_id, "worker-1", {"title": "Stay Hydrated"})
+    assert store.get(job_id)["progress"] == {"title": "Stay Hydrated"}
+    # Only the lease holder can renew it
+    assert not store.heartbeat(job_id, "worker-2")
+
+
+def test_expired_lease_is_retried_by_another_worker(store):
+    job_id = store.submit("A water bottle")
+    store.claim("worker-1")
+    expire_lease(store, job_id)
+    job = store.claim("worker-2")
+    assert (job["id"], job["worker"], job["attempts"]) == (job_id, "worker-2", 2)
+    # The first worker lost the job and can no longer renew or finish it
+    assert not store.heartbeat(job_id, "worker-1")
+    assert not store.finish(job_id, "worker-1", SUCCEEDED, {"title": "stale"})
+    assert store.finish(job_id, "worker-2", SUCCEEDED, {"title": "fresh"})
+    job = store.get(job_id)
+    assert (job["status"], job["result"]) == (SUCCEEDED, {"title": "fresh"})
+
+
+def test_job_fails_once_its_attempts_are_used_up(store):
+    job_id = store.submit("A water bottle")
+    for _ in range(2):
+        store.claim("worker")
+        expire_lease(store, job_id)
+    assert store.claim("worker") is None
+    job = store.get(job_id)
+    assert (job["status"], job["error"], job["attempts"]) == (FAILED, "Worker lost", 2)
+
+
+def test_cancelling_a_queued_job_cancels_it_at_once(store):
+    job_id = store.submit("A water bottle")
+    assert store.cancel(job_id)
+    assert store.get(job_id)["status"] == CANCELLED
+    assert store.claim("worker") is None
+    assert not store.cancel(job_id)
+
+
+def test_cancelling_a_running_job_stops_its_heartbeat(store):
+    job_id = store.submit("A water bottle")
+    store.claim("worker")
+    assert store.cancel(job_id)
+    job = store.get(job_id)
+    assert (job["status"], job["cancel_requested"]) == (RUNNING, True)
+    assert not store.heartbeat(job_id, "worker")
+    # A cancelled job whose worker died is not retried
+    expire_lease(store, job_id)
+    store.claim("worker")
+    assert store.get(job_id)["status"] == CANCELLED
+
+
+def test_stats_count_jobs_per_lane_and_status(store):
+    store.submit("a")
+    store.submit("b", lane="batch")
+    store.claim("worker")
+    assert store.stats() == {"interactive": {RUNNING: 1}, "batch": {QUEUED: 1}}
+
+
+def test_wait_returns_the_finished_job(store):
+    job_id = store.submit("A water bottle")
+    store.claim("worker")
+    store.finish(job_id, "worker", FAILED, error="boom")
+    job = asyncio.run(store.wait(job_id, poll_interval=0.01))
+    assert (job["status"], job["error"]) == (FAILED, "boom")
+
+
+def run_worker(worker, max_jobs, durations):
+    """Run the worker with jobs that just sleep, returning their claim order."""
+    order = []
+
+    async def run_job(job):
+        order.append(job["product_desc"])
+        await asyncio.sleep(durations.get(job["product_desc"], 0.01))
+        worker.store.finish(job["id"], worker.name, SUCCEEDED, {})
+
+    worker.run_job = run_job
+    asyncio.run(asyncio.wait_for(worker.run(max_jobs=max_jobs), 10))
+    return order
+
+
+def test_worker_keeps_its_last_slot_for_interactive_jobs(store):
+    for name in ("batch 1", "batch 2"):
+        store.submit(name, lane="batch")
+    worker = JobWorker(store, concurrency=2, poll_interval=0.01)
+
+    async def submit_interactive_later():
+        await asyncio.sleep(0.05)
+        await store.asubmit("interactive")
+
+    original_run = worker.run
+
+    async def run(max_jobs):
+        submitter = asyncio.create_task(submit_interactive_later())
+        await original_run(max_jobs)
+        await submitter
+
+    worker.run = run
+    order = run_worker(worker, 3, {"batch 1": 0.3})
+    # batch 2 waits for a free slot other than the reserved one, the
+    # interactive job submitted meanwhile takes the reserved slot right away
+    assert order == ["batch 1", "interactive", "batch 2"]
+
+
+def test_worker_claims_again_as_soon_as_a_job_finishes(store):
+    for name in ("long", "short", "next"):
+        store.submit(name)
+    worker = JobWorker(store, concurrency=2, poll_interval=5)
+    start = time.monotonic()
+    order = run_worker(worker, 3, {"long": 0.3, "short": 0.01})
+    assert order == ["long", "short", "next"]
+    # Not held up by the long job nor by a poll interval
+    assert time.monotonic() - start < 1
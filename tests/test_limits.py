@@ -0,0 +1,217 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from agents.deadline import DeadlineExceeded, deadline_scope
+from agents.limits import (
+    AdaptiveConcurrency,
+    CircuitBreaker,
+    CircuitOpenError,
+    EndpointLimiter,
+    TokenBucket,
+    error_status,
+    is_retryable,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+def test_bucket_serves_the_burst_then_spaces_reservations(clock):
+    bucket = TokenBucket(per_minute=60, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # Reservations queue up behind each other instead of all waiting one interval
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_bucket_refills_up_to_its_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst=2)
+    bucket.reserve(2)
+    clock.now += 60
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_bucket_charges_oversized_requests_at_most_the_burst(clock):
+    bucket = TokenBucket(per_minute=60, burst=2)
+    assert bucket.reserve(10) == 0
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_concurrency_grows_additively_and_cuts_multiplicatively(clock):
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=8, cooldown=1.0)
+    # About one more slot per window of `limit` successful calls
+    for _ in range(5):
+        assert concurrency.acquire(timeout=0)
+        concurrency.release()
+    assert concurrency.limit == 5
+
+    concurrency.acquire(timeout=0)
+    concurrency.release(overloaded=True)
+    assert concurrency.limit == 2
+    # A burst of failures within the cooldown only cuts once
+    concurrency.acquire(timeout=0)
+    concurrency.release(overloaded=True)
+    assert concurrency.limit == 2
+    clock.now += 1.0
+    concurrency.acquire(timeout=0)
+    concurrency.release(overloaded=True)
+    assert concurrency.limit == 1
+
+
+def test_failed_calls_do_not_grow_the_limit():
+    concurrency = AdaptiveConcurrency(initial=2)
+    for _ in range(10):
+        concurrency.acquire(timeout=0)
+        concurrency.release(succeeded=False)
+    assert concurrency.limit == 2
+
+
+def test_acquire_waits_for_a_released_slot():
+    concurrency = AdaptiveConcurrency(initial=1)
+    assert concurrency.acquire(timeout=0)
+    assert not concurrency.acquire(timeout=0.01)
+    threading.Timer(0.05, concurrency.release).start()
+    assert concurrency.acquire(timeout=5)
+    assert concurrency.in_flight == 1
+
+
+def test_async_waiter_is_woken_by_a_release_from_another_thread():
+    concurrency = AdaptiveConcurrency(initial=1)
+    concurrency.acquire(timeout=0)
+
+    async def wait_for_slot():
+        threading.Timer(0.05, concurrency.release).start()
+        return await concurrency.aacquire(timeout=5)
+
+    assert asyncio.run(wait_for_slot())
+
+
+def test_cancelled_async_waiter_hands_its_wakeup_on():
+    concurrency = AdaptiveConcurrency(initial=1)
+    concurrency.acquire(timeout=0)
+
+    async def main():
+        cancelled = asyncio.create_task(concurrency.aacquire())
+        waiting = asyncio.create_task(concurrency.aacquire(timeout=5))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        concurrency.release()
+        return await waiting
+
+    assert asyncio.run(main())
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("model", failure_threshold=3, reset_timeout=10)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record(True)
+    breaker.before_call()
+    breaker.record(False)
+    # A success resets the run of failures
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert (breaker.opened, breaker.rejected) == (1, 1)
+
+
+def test_breaker_lets_one_probe_through_after_the_timeout(clock):
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record(True)
+    clock.now += 10
+    assert breaker.before_call() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError, match="probe in flight"):
+        breaker.before_call()
+    breaker.record(False, probe=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record(True)
+    clock.now += 10
+    probe = breaker.before_call()
+    breaker.record(True, probe)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened == 2
+
+
+def test_probe_without_an_outcome_frees_the_probe_slot(clock):
+    breaker = CircuitBreaker("model", failure_threshold=1, reset_timeout=10)
+    breaker.before_call()
+    breaker.record(True)
+    clock.now += 10
+    breaker.record(None, breaker.before_call())
+    assert breaker.before_call() is True
+
+
+def test_limiter_trips_on_errors_but_not_on_throttling():
+    limiter = EndpointLimiter(
+        "model", breaker=CircuitBreaker("model", failure_threshold=2)
+    )
+    for _ in range(3):
+        with pytest.raises(Throttled):
+            with limiter.limit():
+                raise Throttled()
+    assert limiter.breaker.state == CircuitBreaker.CLOSED
+    for _ in range(2):
+        with pytest.raises(Unavailable):
+            with limiter.limit():
+                raise Unavailable()
+    with pytest.raises(CircuitOpenError):
+        with limiter.limit():
+            pass
+    stats = limiter.stats()
+    assert (stats["overloaded"], stats["in_flight"]) == (5, 0)
+
+
+def test_limiter_refuses_a_slot_past_the_deadline():
+    limiter = EndpointLimiter("model", rpm=60)
+    limiter.requests.reserve(limiter.requests.capacity)
+    with deadline_scope(time.time() + 0.1):
+        with pytest.raises(DeadlineExceeded):
+            with limiter.limit():
+                pass
+    assert limiter.concurrency.in_flight == 0
+
+
+def test_error_classification():
+    assert error_status(Exception("[429] Too Many Requests")) == 429
+    assert is_retryable(Unavailable())
+    assert not is_retryable(ValueError("bad input"))
+    assert is_retryable(TimeoutError())
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import signal
+import time
+
+import pytest
+from PIL import Image
+
+from agents import renditions
+from agents.renditions import (
+    arender_all,
+    fit_size,
+    get_rendition_pool,
+    parse_renditions,
+    render_all,
+)
+
+SPECS = parse_renditions("square=64x64:jpeg:80,thumbnail=32x16:webp:75")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / "output.jpg")
+    Image.new("RGB", (120, 80), (30, 120, 200)).save(path, "JPEG")
+    return path
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(renditions, "RENDITION_WORKERS", 1)
+    renditions.shutdown_rendition_pool()
+    yield
+    renditions.shutdown_rendition_pool()
+
+
+def test_parse_renditions_defaults_format_and_quality():
+    [spec] = parse_renditions(" story=1080x1920 , ")
+    assert (spec.name, spec.width, spec.height) == ("story", 1080, 1920)
+    assert (spec.format, spec.quality, spec.extension) == ("jpeg", 85, ".jpg")
+    with pytest.raises(ValueError):
+        parse_renditions("x=1x1:gif")
+
+
+def test_fit_size_never_upscales():
+    assert fit_size((2000, 2000), (1080, 1350)) == (1080, 1350)
+    assert fit_size((540, 2000), (1080, 1350)) == (540, 675)
+
+
+def test_renditions_are_written_next_to_the_image(source, pool):
+    done = {r["name"]: r for r in render_all(source, SPECS)}
+    assert set(done) == {"square", "thumbnail"}
+    assert done["square"]["path"].endswith("output_square.jpg")
+    with Image.open(done["thumbnail"]["path"]) as image:
+        assert (image.format, image.size) == ("WEBP", (32, 16))
+
+
+def kill_worker():
+    pool = get_rendition_pool()
+    [pid] = list(pool._processes)
+    os.kill(pid, signal.SIGKILL)
+    # Wait for the pool to notice, so the next call sees it broken
+    deadline = time.monotonic() + 10
+    while not pool._broken and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pool._broken
+
+
+def test_killed_worker_only_costs_the_renditions_in_flight(source, pool):
+    assert len(list(render_all(source, SPECS))) == 2
+    kill_worker()
+    # Logged and skipped instead of raising into the run
+    assert list(render_all(source, SPECS)) == []
+    # The broken pool was dropped and the next run gets a fresh one
+    assert len(list(render_all(source, SPECS))) == 2
+
+
+def test_killed_worker_does_not_break_async_renditions(source, pool):
+    async def render():
+        return [r["name"] async for r in arender_all(source, SPECS)]
+
+    assert len(asyncio.run(render())) == 2
+    kill_worker()
+    assert asyncio.run(render()) == []
+    assert sorted(asyncio.run(render())) == ["square", "thumbnail"]
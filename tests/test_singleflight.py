@@ -0,0 +1,62 @@
+import asyncio
+
+from singleflight import AsyncSingleFlight
+
+
+def counting_stream(progress):
+    async def events():
+        try:
+            for index in range(100):
+                progress.append(index)
+                yield index
+                await asyncio.sleep(0.01)
+        except asyncio.CancelledError:
+            progress.append("cancelled")
+            raise
+
+    return events
+
+
+async def take(flights, key, fn, count):
+    events = []
+    async for event in flights.stream(key, fn):
+        events.append(event)
+        if len(events) == count:
+            break
+    return events
+
+
+def test_late_subscribers_replay_the_missed_events():
+    flights = AsyncSingleFlight()
+    progress = []
+
+    async def main():
+        first = asyncio.create_task(take(flights, "key", counting_stream(progress), 5))
+        await asyncio.sleep(0.03)
+        second = await take(flights, "key", counting_stream(progress), 5)
+        return await first, second
+
+    first, second = asyncio.run(main())
+    assert first == second == [0, 1, 2, 3, 4]
+    assert flights.stats()["executions"] == 1
+
+
+def test_stream_is_cancelled_when_its_last_subscriber_leaves():
+    flights = AsyncSingleFlight()
+    progress = []
+
+    async def main():
+        stay = asyncio.create_task(take(flights, "key", counting_stream(progress), 6))
+        leave = asyncio.create_task(
+            take(flights, "key", counting_stream(progress), 100)
+        )
+        await asyncio.sleep(0.02)
+        leave.cancel()
+        # The other subscriber still receives every event it waits for
+        assert await stay == [0, 1, 2, 3, 4, 5]
+        await asyncio.sleep(0.05)
+        return flights.stats()["in_flight"]
+
+    assert asyncio.run(main()) == 0
+    assert progress[-1] == "cancelled"
+    assert len(progress) < 20
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import pytest
+
+from agents.content_creator import ContentCreatorAgent
+from agents.digital_artist import DigitalArtistAgent
+from agents.transport import AsyncHTTPTransport, HTTPTransport
+from benchmarks.fakes import FAKE_CONTENT
+from benchmarks.stub_server import StubConfig, StubServer
+
+MODEL = "meta/llama-3.1-8b-instruct"
+
+
+@pytest.fixture(scope="module")
+def stub():
+    """Serve the stub endpoints on a free port from a background event loop."""
+    from aiohttp import web
+
+    server = StubServer(
+        StubConfig(llm_latency=0, token_latency=0, image_latency=0, image_size=64)
+    )
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(server.app())
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{port}"
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(timeout=5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
+
+
+@pytest.fixture
+def agents(stub, monkeypatch):
+    server, url = stub
+    monkeypatch.setenv("CACHE_ENABLED", "false")
+    monkeypatch.setenv("LLM_API_BASE_URL", f"{url}/v1")
+    creator = ContentCreatorAgent(MODEL, "stub-key")
+    artist = DigitalArtistAgent(
+        MODEL,
+        "stub-key",
+        image_model="stub",
+        base_url=f"{url}/v1/genai",
+        transport=HTTPTransport(),
+        async_transport=AsyncHTTPTransport(),
+    )
+    return server, creator, artist
+
+
+def test_content_streams_from_the_stub(agents):
+    server, creator, _ = agents
+    before = server.requests["chat"]
+    content = creator.create_content("A sleek 1L stainless steel water bottle")
+    assert f"Title: {content.title}" in FAKE_CONTENT
+    assert content.tags and all(tag.startswith("#") for tag in content.tags)
+    assert server.requests["chat"] == before + 1
+
+
+def test_async_content_and_image_from_the_stub(agents):
+    server, creator, artist = agents
+
+    async def generate():
+        try:
+            content = await creator.acreate_content("A water bottle")
+            prompt = await artist.aenhance_prompt(content.title)
+            return prompt, await artist.arequest_image_data(prompt)
+        finally:
+            await artist.async_transport.close()
+
+    prompt, image = asyncio.run(generate())
+    assert prompt
+    assert image.extension == ".jpg"
+    assert image.to_pil().size == (64, 64)
+
+
+def test_sync_image_from_the_stub(agents):
+    server, _, artist = agents
+    before = server.requests["image"]
+    image = artist.request_image_data("A steel bottle on a rock", seed=3)
+    assert len(image.data) > 0
+    assert server.requests["image"] == before + 1
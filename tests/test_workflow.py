@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+import workflow
+from agents.base_agent import BaseAgent
+from agents.pool import agent_pool
+from agents.transport import AsyncHTTPTransport, HTTPTransport
+from agents.usage import token_usage
+from artifacts import ArtifactStore
+from benchmarks.fakes import install_fake_latencies
+
+
+@pytest.fixture
+def image_requests(tmp_path, monkeypatch):
+    """Fake the endpoints of both agents and return the list of image requests."""
+    monkeypatch.setenv("NVIDIA_API_KEY", "nvapi-test")
+    monkeypatch.setenv("CACHE_ENABLED", "false")
+    # install_fake_latencies patches the classes, restored after the test
+    monkeypatch.setattr(BaseAgent, "_setup_chain", BaseAgent._setup_chain)
+    monkeypatch.setattr(HTTPTransport, "post_json", HTTPTransport.post_json)
+    monkeypatch.setattr(AsyncHTTPTransport, "post_json", AsyncHTTPTransport.post_json)
+    install_fake_latencies(0, 0, 0)
+    requests = []
+    fake_post_json = AsyncHTTPTransport.post_json
+
+    async def post_json(self, url, payload, *args, **kwargs):
+        requests.append(payload)
+        return await fake_post_json(self, url, payload, *args, **kwargs)
+
+    monkeypatch.setattr(AsyncHTTPTransport, "post_json", post_json)
+    store = ArtifactStore(str(tmp_path / "artifacts"))
+    monkeypatch.setattr(workflow, "get_artifact_store", lambda: store)
+    token_usage.reset()
+    yield requests
+    agent_pool.clear()
+    store.close()
+
+
+def content_calls() -> int:
+    models = workflow.get_agent_config()["content_models"]
+    return sum(token_usage.stats().get(model, {}).get("calls", 0) for model in models)
+
+
+@pytest.mark.parametrize(
+    "answer, expected_content_calls, expected_image_calls",
+    [("text", 2, 1), ("image", 1, 2)],
+)
+def test_only_the_rejected_stage_is_regenerated(
+    image_requests,
+    monkeypatch,
+    answer,
+    expected_content_calls,
+    expected_image_calls,
+):
+    answers = iter(["A water bottle", answer, "yes", "quit"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    runs = []
+    monkeypatch.setattr(
+        workflow, "record_run", lambda state, *args, **kwargs: runs.append(state)
+    )
+    checkpointer = InMemorySaver()
+
+    asyncio.run(workflow.arun_cli(checkpointer))
+
+    [state] = runs
+    assert state["feedback"] == "yes" and not state["error"]
+    assert content_calls() == expected_content_calls
+    assert len(image_requests) == expected_image_calls
+    # The kept stage's output is still the run's
+    assert state["content"].title == "Stay Hydrated in Style"
+    assert os.path.basename(state["image_path"]) == "output.jpg"
+    assert os.path.exists(state["image_path"])
+    # A completed run leaves no checkpoints behind to resume
+    assert list(checkpointer.list(None)) == []
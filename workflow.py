@@ -1,81 +1,257 @@
-from typing import Dict, Any, Optional, TypedDict
-from langgraph.graph import StateGraph, END
-from agents.content_creator import ContentCreatorAgent, ContentOutput
-from agents.digital_artist import DigitalArtistAgent
+if __name__ == "__main__":
+    # Before the imports below, which read their settings from the environment
+    from bootstrap import init
+
+    init()
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Any,
+    AsyncIterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+)
+from agents.deadline import deadline_scope, new_deadline
+from agents.content_creator import (
+    ContentCreatorAgent,
+    ContentOutput,
+    FusedContentCreatorAgent,
+)
+from agents.digital_artist import DigitalArtistAgent, DEFAULT_IMAGE_API_BASE_URL
+from agents.image import GeneratedImage
+from agents.metrics import RunTimings, record_bytes, run_timings, span
+from agents.pool import agent_pool
+from agents.renditions import RENDITION_SPECS, arender_all, render_all
+from agents.router import get_router, parse_models
+from agents.transport import get_default_async_transport
 import os
-from dotenv import load_dotenv
 import logging
-from datetime import datetime
 import shutil
+import asyncio
+import contextvars
+import functools
+import inspect
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from artifacts import ARTIFACT_ROOT, gc_if_configured, get_artifact_store
+from run_logging import run_scope
+
+# LangGraph is imported when a graph is built
+if TYPE_CHECKING:
+    from langgraph.checkpoint.base import BaseCheckpointSaver
 
-# Configure logging
-# logging.basicConfig(level=logging.INFO)
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Created by the artifact store on first use
+AI_RESPONSE_DIR = ARTIFACT_ROOT
+
+
+# Upper bound on generations in flight per event loop
+PIPELINE_CONCURRENCY = int(os.getenv("PIPELINE_CONCURRENCY", "100"))
+
+# "serial" derives the image prompt from the generated title, "parallel" derives it
+# from the product description concurrently with content creation, "fused" writes
+# it in the same completion as the content
+PIPELINE_MODES = ("serial", "parallel", "fused")
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "serial")
 
-# Create AI_Response directory if it doesn't exist
-AI_RESPONSE_DIR = "AI_Response"
-os.makedirs(AI_RESPONSE_DIR, exist_ok=True)
+# SQLite file holding the CLI workflow checkpoints, empty to disable checkpointing
+CHECKPOINT_DB = os.getenv(
+    "CHECKPOINT_DB", os.path.join(AI_RESPONSE_DIR, "checkpoints.sqlite")
+)
+
+# Upper bound on the variants generated for one product description
+MAX_VARIANTS = int(os.getenv("MAX_VARIANTS", "8"))
+
+# Feedback answers that regenerate a single stage; any other rejection redoes both
+REGENERATE_CHOICES = ("text", "image")
+
+_pipeline_semaphores: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+) = weakref.WeakKeyDictionary()
+
+
+class Variant(TypedDict):
+    content: Optional[ContentOutput]
+    image_prompt: Optional[str]
+    image_path: Optional[str]
+    image_seed: int
+    error: Optional[str]
 
 
 class State(TypedDict):
     product_desc: str
     content: Optional[ContentOutput]
-    image: Optional[Any]
     feedback: Optional[str]
     error: Optional[str]
     output_dir: Optional[str]  # New field for output directory
+    image_prompt: Optional[str]
+    # The image stays on disk so the state can be checkpointed
+    image_path: Optional[str]
+    image_seed: Optional[int]
+    regenerate: Optional[str]  # "text", "image" or "all" after a rejection
+    bypass_cache: Optional[bool]  # Set when the user asks to regenerate
+    variant: Optional[int]  # Index of the variant this state generates, if any
+    variants: Optional[List[Variant]]
+    renditions: Optional[Dict[str, str]]  # Channel rendition name -> path
+    deadline: Optional[float]  # Epoch time the current attempt must finish by
+
+
+def new_state(product_desc: str, output_dir: str) -> State:
+    """Return the initial state of a run."""
+    return State(
+        product_desc=product_desc,
+        content=None,
+        feedback=None,
+        error=None,
+        output_dir=output_dir,
+        image_prompt=None,
+        image_path=None,
+        image_seed=0,
+        regenerate=None,
+        bypass_cache=False,
+        variant=None,
+        variants=None,
+        renditions=None,
+        deadline=new_deadline(),
+    )
 
 
 def create_output_directory() -> str:
-    """Create a timestamped directory for storing outputs."""
-    timestamp = datetime.now().strftime("%d%b%y_%H%M%S")
-    output_dir = os.path.join(AI_RESPONSE_DIR, timestamp)
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Set up file handler for logging
-    log_file = os.path.join(output_dir, "execution.log")
-    file_handler = logging.FileHandler(log_file)
-    file_handler.setFormatter(
-        logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    )
-    logger.addHandler(file_handler)
+    """Create the directory of a new run, under a collision-free run id."""
+    return get_artifact_store().create_run_dir()
 
-    return output_dir
 
+def get_agent_config() -> Dict[str, Any]:
+    """Read the agent configuration from the environment.
 
-def create_agents() -> tuple[ContentCreatorAgent, DigitalArtistAgent]:
-    """Create and initialize the agents."""
-    try:
-        api_key = os.getenv("NVIDIA_API_KEY")
-        if not api_key:
-            raise ValueError("NVIDIA_API_KEY not found in environment variables")
+    Each `*_models` entry lists the model tiers of a role in routing order,
+    from the `*_MODELS` variable or else the single `*_MODEL` one.
+    """
+    api_key = os.getenv("NVIDIA_API_KEY")
+    if not api_key:
+        raise ValueError("NVIDIA_API_KEY not found in environment variables")
 
-        content_model = os.getenv(
-            "CONTENT_CREATOR_MODEL", "meta/llama-3.1-405b-instruct"
-        )
-        artist_model = os.getenv(
-            "DIGITAL_ARTIST_MODEL", "mistralai/mixtral-8x7b-instruct-v0.1"
-        )
-        image_model = os.getenv("IMAGE_GENERATION_MODEL", "stabilityai/sdxl-turbo")
+    content_model = os.getenv("CONTENT_CREATOR_MODEL", "meta/llama-3.1-405b-instruct")
+    artist_model = os.getenv(
+        "DIGITAL_ARTIST_MODEL", "mistralai/mixtral-8x7b-instruct-v0.1"
+    )
+    return {
+        "api_key": api_key,
+        "content_models": parse_models(
+            os.getenv("CONTENT_CREATOR_MODELS", content_model)
+        ),
+        "fused_models": parse_models(
+            os.getenv("FUSED_CONTENT_MODELS")
+            or os.getenv("FUSED_CONTENT_MODEL")
+            or os.getenv("CONTENT_CREATOR_MODELS", content_model)
+        ),
+        "artist_models": parse_models(os.getenv("DIGITAL_ARTIST_MODELS", artist_model)),
+        "image_model": os.getenv("IMAGE_GENERATION_MODEL", "stabilityai/sdxl-turbo"),
+        "image_base_url": os.getenv("IMAGE_API_BASE_URL", DEFAULT_IMAGE_API_BASE_URL),
+    }
+
+
+def get_content_creator() -> ContentCreatorAgent:
+    """Return the pooled content creator agent of the currently routed model."""
+    config = get_agent_config()
+    model = get_router("content", config["content_models"]).choose()
+    return agent_pool.get(ContentCreatorAgent, model, config["api_key"])
+
+
+def get_fused_creator() -> FusedContentCreatorAgent:
+    """Return the pooled agent that writes the content and image prompt together."""
+    config = get_agent_config()
+    model = get_router("fused", config["fused_models"]).choose()
+    return agent_pool.get(FusedContentCreatorAgent, model, config["api_key"])
+
+
+def get_digital_artist() -> DigitalArtistAgent:
+    """Return the pooled digital artist agent of the currently routed prompt model."""
+    config = get_agent_config()
+    model = get_router("artist", config["artist_models"]).choose()
+    return agent_pool.get(
+        DigitalArtistAgent,
+        model,
+        config["api_key"],
+        image_model=config["image_model"],
+        base_url=config["image_base_url"],
+    )
 
-        content_creator = ContentCreatorAgent(content_model, api_key)
-        digital_artist = DigitalArtistAgent(artist_model, api_key, image_model)
 
-        return content_creator, digital_artist
+def create_agents() -> tuple[ContentCreatorAgent, DigitalArtistAgent]:
+    """Return the initialized agents, building them once per process."""
+    try:
+        return get_content_creator(), get_digital_artist()
     except Exception as e:
         logger.error(f"Error creating agents: {str(e)}")
         raise
 
 
+def warm_up_agents() -> Dict[str, int]:
+    """Build the pooled agents at startup and return the pool stats."""
+    try:
+        config = get_agent_config()
+        # Every tier, so that falling back does not pay for building an agent
+        for model in config["content_models"]:
+            agent_pool.warm_up(ContentCreatorAgent, model, config["api_key"])
+        for model in config["artist_models"]:
+            agent_pool.warm_up(
+                DigitalArtistAgent,
+                model,
+                config["api_key"],
+                image_model=config["image_model"],
+                base_url=config["image_base_url"],
+            )
+        if PIPELINE_MODE == "fused":
+            for model in config["fused_models"]:
+                agent_pool.warm_up(FusedContentCreatorAgent, model, config["api_key"])
+    except Exception as e:
+        logger.error(f"Error warming up agents: {str(e)}")
+        raise
+    return agent_pool.stats()
+
+
+def stage(node):
+    """Run a pipeline node under the deadline carried in its state, as a timed span."""
+    name = f"node.{node.__name__}"
+    if inspect.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def run(state: State) -> State:
+            with deadline_scope(state.get("deadline")), span(name):
+                return await node(state)
+
+    else:
+
+        @functools.wraps(node)
+        def run(state: State) -> State:
+            with deadline_scope(state.get("deadline")), span(name):
+                return node(state)
+
+    return run
+
+
+def use_cache(state: State) -> bool:
+    """Return whether cached responses may be served for this state."""
+    return not state.get("bypass_cache")
+
+
+@stage
 def create_content(state: State) -> State:
     """Create promotional content."""
     try:
-        content_creator, _ = create_agents()
-        state["content"] = content_creator.create_content(state["product_desc"])
+        content_creator = get_content_creator()
+        state["content"] = content_creator.create_content(
+            state["product_desc"],
+            use_cache=use_cache(state),
+            variant=variant_index(state),
+        )
         state["error"] = None
         logger.info(f"Content created successfully: {state['content']}")
     except Exception as e:
@@ -84,26 +260,532 @@ def create_content(state: State) -> State:
     return state
 
 
+def image_seed(state: State) -> int:
+    """Return the seed to render this state's image with."""
+    return state.get("image_seed") or 0
+
+
+def variant_index(state: State) -> int:
+    """Return the variant index of this state, 0 outside of a fan-out."""
+    return state.get("variant") or 0
+
+
+def save_image(state: State, image: GeneratedImage) -> str:
+    """Write the generated image's encoded bytes to the run's output directory."""
+    name = (
+        "output" if state.get("variant") is None else f"output_{state['variant'] + 1}"
+    )
+    with span("image.save", bytes=image.nbytes):
+        # Stored once per content hash and linked into the run directory
+        image_path = get_artifact_store().save_image(
+            state["output_dir"], name, image.data, image.extension
+        )
+    record_bytes("image.save", image.nbytes)
+    state["image_path"] = image_path
+    logger.info(f"Image saved to: {image_path}")
+    return image_path
+
+
+def record_run(
+    state: State, mode: Optional[str] = None, timings: Optional[RunTimings] = None
+) -> None:
+    """Index a finished run in the artifact manifest: its inputs, outputs and timings."""
+    try:
+        config = get_agent_config()
+        models = {
+            "content": config["content_models"],
+            "fused": config["fused_models"],
+            "artist": config["artist_models"],
+            "image": config["image_model"],
+        }
+    except ValueError:
+        models = None
+    content = state.get("content")
+    fields: Dict[str, Any] = dict(
+        status="failed" if state.get("error") else "succeeded",
+        finished_at=time.time(),
+        product_desc=state["product_desc"],
+        mode=mode or PIPELINE_MODE,
+        models=models,
+        params={
+            "image_seed": image_seed(state),
+            "variants": len(state.get("variants") or []) or 1,
+            "bypass_cache": bool(state.get("bypass_cache")),
+        },
+        title=content.title if content else None,
+        message=content.message if content else None,
+        tags=content.tags if content else None,
+        image_path=state.get("image_path"),
+        error=state.get("error"),
+    )
+    if timings is not None:
+        summary = timings.to_dict()
+        fields["timings"] = {"total_s": summary["total_s"], "stages": summary["stages"]}
+    get_artifact_store().record_run(state["output_dir"], **fields)
+
+
+@stage
 def generate_image(state: State) -> State:
     """Generate image based on content."""
     try:
         if state.get("error"):
             return state
 
-        _, digital_artist = create_agents()
-        state["image"] = digital_artist.generate_image(state["content"].title)
+        digital_artist = get_digital_artist()
+        state["image_prompt"] = digital_artist.enhance_prompt(
+            state["content"].title, use_cache=use_cache(state)
+        )
+        image = digital_artist.request_image_data(
+            state["image_prompt"], use_cache=use_cache(state), seed=image_seed(state)
+        )
+        state["error"] = None
+
+        # Save the image to the output directory
+        save_image(state, image)
+    except Exception as e:
+        logger.error(f"Error generating image: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+def create_content_parallel(state: State) -> State:
+    """Create promotional content and the image prompt concurrently."""
+    if state.get("regenerate") == "text":
+        # The image and its prompt are kept, only the text is redone
+        return create_content(state)
+    try:
+        content_creator = get_content_creator()
+        digital_artist = get_digital_artist()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            # Each task gets a copy of the context so run-scoped logging follows it
+            content_future = executor.submit(
+                contextvars.copy_context().run,
+                content_creator.create_content,
+                state["product_desc"],
+                use_cache=use_cache(state),
+                variant=variant_index(state),
+            )
+            prompt_future = executor.submit(
+                contextvars.copy_context().run,
+                digital_artist.enhance_prompt,
+                state["product_desc"],
+                use_cache=use_cache(state),
+            )
+            state["content"] = content_future.result()
+            state["image_prompt"] = prompt_future.result()
+        state["error"] = None
+        logger.info(f"Content created successfully: {state['content']}")
+    except Exception as e:
+        logger.error(f"Error creating content: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+def create_content_fused(state: State) -> State:
+    """Create promotional content and the image prompt in a single completion."""
+    try:
+        fused_creator = get_fused_creator()
+        state["content"] = fused_creator.create_content(
+            state["product_desc"],
+            use_cache=use_cache(state),
+            variant=variant_index(state),
+        )
+        # On a text-only regeneration the prompt of the kept image stays
+        if state.get("regenerate") != "text":
+            state["image_prompt"] = state["content"].image_prompt
+        state["error"] = None
+        logger.info(f"Content created successfully: {state['content']}")
+    except Exception as e:
+        logger.error(f"Error creating content: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+def render_image(state: State) -> State:
+    """Render the image from the prompt prepared alongside the content."""
+    try:
+        if state.get("error"):
+            return state
+
+        digital_artist = get_digital_artist()
+        image = digital_artist.request_image_data(
+            state["image_prompt"], use_cache=use_cache(state), seed=image_seed(state)
+        )
         state["error"] = None
 
         # Save the image to the output directory
-        image_path = os.path.join(state["output_dir"], "output.jpg")
-        state["image"].save(image_path)
-        logger.info(f"Image saved to: {image_path}")
+        save_image(state, image)
     except Exception as e:
         logger.error(f"Error generating image: {str(e)}")
         state["error"] = str(e)
     return state
 
 
+@stage
+async def acreate_content(state: State) -> State:
+    """Asynchronously create promotional content."""
+    try:
+        content_creator = get_content_creator()
+        state["content"] = await content_creator.acreate_content(
+            state["product_desc"],
+            use_cache=use_cache(state),
+            variant=variant_index(state),
+        )
+        state["error"] = None
+        logger.info(f"Content created successfully: {state['content']}")
+    except Exception as e:
+        logger.error(f"Error creating content: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+async def agenerate_image(state: State) -> State:
+    """Asynchronously generate image based on content."""
+    try:
+        if state.get("error"):
+            return state
+
+        digital_artist = get_digital_artist()
+        state["image_prompt"] = await digital_artist.aenhance_prompt(
+            state["content"].title, use_cache=use_cache(state)
+        )
+        image = await digital_artist.arequest_image_data(
+            state["image_prompt"], use_cache=use_cache(state), seed=image_seed(state)
+        )
+        state["error"] = None
+
+        # Save the image to the output directory without blocking the event loop
+        await asyncio.to_thread(save_image, state, image)
+    except Exception as e:
+        logger.error(f"Error generating image: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+async def acreate_content_parallel(state: State) -> State:
+    """Asynchronously create promotional content and the image prompt concurrently."""
+    if state.get("regenerate") == "text":
+        # The image and its prompt are kept, only the text is redone
+        return await acreate_content(state)
+    try:
+        content_creator = get_content_creator()
+        digital_artist = get_digital_artist()
+        state["content"], state["image_prompt"] = await asyncio.gather(
+            content_creator.acreate_content(
+                state["product_desc"],
+                use_cache=use_cache(state),
+                variant=variant_index(state),
+            ),
+            digital_artist.aenhance_prompt(
+                state["product_desc"], use_cache=use_cache(state)
+            ),
+        )
+        state["error"] = None
+        logger.info(f"Content created successfully: {state['content']}")
+    except Exception as e:
+        logger.error(f"Error creating content: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+async def acreate_content_fused(state: State) -> State:
+    """Asynchronously create the content and the image prompt in a single completion."""
+    try:
+        fused_creator = get_fused_creator()
+        state["content"] = await fused_creator.acreate_content(
+            state["product_desc"],
+            use_cache=use_cache(state),
+            variant=variant_index(state),
+        )
+        # On a text-only regeneration the prompt of the kept image stays
+        if state.get("regenerate") != "text":
+            state["image_prompt"] = state["content"].image_prompt
+        state["error"] = None
+        logger.info(f"Content created successfully: {state['content']}")
+    except Exception as e:
+        logger.error(f"Error creating content: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+@stage
+async def arender_image(state: State) -> State:
+    """Asynchronously render the image from the prompt prepared alongside the content."""
+    try:
+        if state.get("error"):
+            return state
+
+        digital_artist = get_digital_artist()
+        image = await digital_artist.arequest_image_data(
+            state["image_prompt"], use_cache=use_cache(state), seed=image_seed(state)
+        )
+        state["error"] = None
+
+        # Save the image to the output directory without blocking the event loop
+        await asyncio.to_thread(save_image, state, image)
+    except Exception as e:
+        logger.error(f"Error generating image: {str(e)}")
+        state["error"] = str(e)
+    return state
+
+
+def add_rendition(state: State, rendition: Dict[str, Any]) -> None:
+    """Record a finished rendition in the state and the artifact manifest."""
+    state["renditions"][rendition["name"]] = rendition["path"]
+    get_artifact_store().record_artifact(
+        state["output_dir"],
+        rendition["name"],
+        rendition["sha256"],
+        rendition["path"],
+        rendition["bytes"],
+    )
+    record_bytes("image.rendition", rendition["bytes"])
+
+
+def needs_renditions(state: State) -> bool:
+    return bool(RENDITION_SPECS and state.get("image_path")) and not state.get("error")
+
+
+@stage
+def postprocess_image(state: State) -> State:
+    """Render the channel renditions of the image in the process pool."""
+    if not needs_renditions(state):
+        return state
+    # A failed rendition is logged and skipped, the run keeps its image
+    state["renditions"] = {}
+    for rendition in render_all(state["image_path"], RENDITION_SPECS):
+        add_rendition(state, rendition)
+    return state
+
+
+@stage
+async def apostprocess_image(state: State) -> State:
+    """Asynchronously render the channel renditions of the image in the process pool."""
+    if not needs_renditions(state):
+        return state
+    state["renditions"] = {}
+    async for rendition in arender_all(state["image_path"], RENDITION_SPECS):
+        add_rendition(state, rendition)
+    return state
+
+
+def get_pipeline_nodes(use_async: bool = False, mode: Optional[str] = None):
+    """Return the (content, image) node functions for the given pipeline mode."""
+    mode = mode or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+    if mode == "parallel":
+        if use_async:
+            return acreate_content_parallel, arender_image
+        return create_content_parallel, render_image
+    if mode == "fused":
+        if use_async:
+            return acreate_content_fused, arender_image
+        return create_content_fused, render_image
+    if use_async:
+        return acreate_content, agenerate_image
+    return create_content, generate_image
+
+
+def get_pipeline_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore bounding in-flight generations on the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _pipeline_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PIPELINE_CONCURRENCY)
+        _pipeline_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def arun_pipeline(state: State, mode: Optional[str] = None) -> State:
+    """Run content creation and image generation under the shared concurrency limit,
+    then the renditions, which are bounded by their process pool instead.
+    """
+    content_node, image_node = get_pipeline_nodes(use_async=True, mode=mode)
+    async with get_pipeline_semaphore():
+        state = await content_node(state)
+        state = await image_node(state)
+    return await apostprocess_image(state)
+
+
+async def astream_pipeline(
+    state: State, mode: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Run the pipeline while yielding ("title"|"message"|"tags", value) as the content
+    streams in and ("state", state) once the content and again once the image is done.
+
+    In between, ("image", path) comes as soon as the image is saved and
+    ("rendition", (name, path)) as each channel rendition is written.
+    """
+    mode = mode or PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown pipeline mode: {mode}")
+
+    async with get_pipeline_semaphore():
+        with deadline_scope(state.get("deadline")):
+            prompt_task = None
+            image_task = None
+            try:
+                if mode == "fused":
+                    content_creator = get_fused_creator()
+                else:
+                    content_creator = get_content_creator()
+                digital_artist = get_digital_artist()
+                if mode == "parallel":
+                    prompt_task = asyncio.create_task(
+                        digital_artist.aenhance_prompt(
+                            state["product_desc"], use_cache=use_cache(state)
+                        )
+                    )
+
+                async for field, value in content_creator.astream_content(
+                    state["product_desc"],
+                    use_cache=use_cache(state),
+                    variant=variant_index(state),
+                ):
+                    if field == "content":
+                        state["content"] = value
+                        continue
+                    # The fused completion carries the prompt, start the image right away
+                    if field == "image_prompt":
+                        state["image_prompt"] = value
+                        image_task = asyncio.create_task(
+                            digital_artist.arequest_image_data(
+                                value,
+                                use_cache=use_cache(state),
+                                seed=image_seed(state),
+                            )
+                        )
+                        continue
+                    # Enhance the prompt from the title while message and tags still stream
+                    if field == "title" and prompt_task is None and mode != "fused":
+                        prompt_task = asyncio.create_task(
+                            digital_artist.aenhance_prompt(
+                                value, use_cache=use_cache(state)
+                            )
+                        )
+                    yield field, value
+                state["error"] = None
+                logger.info(f"Content created successfully: {state['content']}")
+                yield "state", state
+
+                if image_task is None:
+                    state["image_prompt"] = await prompt_task
+                    image_task = asyncio.create_task(
+                        digital_artist.arequest_image_data(
+                            state["image_prompt"],
+                            use_cache=use_cache(state),
+                            seed=image_seed(state),
+                        )
+                    )
+                image = await image_task
+                await asyncio.to_thread(save_image, state, image)
+                yield "image", state["image_path"]
+                if needs_renditions(state):
+                    state["renditions"] = {}
+                    async for rendition in arender_all(
+                        state["image_path"], RENDITION_SPECS
+                    ):
+                        add_rendition(state, rendition)
+                        yield "rendition", (rendition["name"], rendition["path"])
+            except Exception as e:
+                logger.error(f"Error in streaming pipeline: {str(e)}")
+                state["error"] = str(e)
+            finally:
+                # Also when the stream is cancelled, the calls must not outlive it
+                for task in (prompt_task, image_task):
+                    if task is not None:
+                        task.cancel()
+            yield "state", state
+
+
+async def astream_variants(
+    state: State, count: int, mode: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Generate `count` content and image variants concurrently, yielding
+    ("variant", (index, variant)) as each one finishes, ("rendition", (name, path))
+    for the renditions of the main image and ("state", state) at the end.
+
+    Every variant takes its own slot of the shared pipeline concurrency limit and
+    renders with its own seed.
+    """
+    if not 1 <= count <= MAX_VARIANTS:
+        raise ValueError(f"Variant count must be between 1 and {MAX_VARIANTS}")
+    content_node, image_node = get_pipeline_nodes(use_async=True, mode=mode)
+
+    async def run_variant(index: int) -> Tuple[int, Variant]:
+        variant_state = State(**state)
+        variant_state.update(
+            variant=index,
+            image_seed=image_seed(state) + index,
+            content=None,
+            image_prompt=None,
+            image_path=None,
+            error=None,
+            regenerate=None,
+            variants=None,
+            renditions=None,
+        )
+        async with get_pipeline_semaphore():
+            variant_state = await content_node(variant_state)
+            variant_state = await image_node(variant_state)
+        return index, Variant(
+            content=variant_state["content"],
+            image_prompt=variant_state["image_prompt"],
+            image_path=variant_state["image_path"],
+            image_seed=variant_state["image_seed"],
+            error=variant_state["error"],
+        )
+
+    variants: List[Optional[Variant]] = [None] * count
+    tasks = [asyncio.create_task(run_variant(i)) for i in range(count)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            index, variant = await finished
+            variants[index] = variant
+            yield "variant", (index, variant)
+    finally:
+        # A consumer that stops early (or is cancelled) must not leave the
+        # remaining variants generating in the background
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    state["variants"] = variants
+    succeeded = [variant for variant in variants if not variant["error"]]
+    if succeeded:
+        # The first successful variant doubles as the run's main result
+        state.update(
+            content=succeeded[0]["content"],
+            image_prompt=succeeded[0]["image_prompt"],
+            image_path=succeeded[0]["image_path"],
+            error=None,
+        )
+    else:
+        state["error"] = variants[0]["error"]
+    logger.info(f"Generated {len(succeeded)} of {count} variants")
+    if needs_renditions(state):
+        state["renditions"] = {}
+        async for rendition in arender_all(state["image_path"], RENDITION_SPECS):
+            add_rendition(state, rendition)
+            yield "rendition", (rendition["name"], rendition["path"])
+    yield "state", state
+
+
+async def arun_variants(state: State, count: int, mode: Optional[str] = None) -> State:
+    """Generate `count` variants concurrently and collect them in state["variants"]."""
+    async for event, value in astream_variants(state, count, mode=mode):
+        if event == "state":
+            state = value
+    return state
+
+
 def get_human_feedback(state: State) -> State:
     """Get human feedback on the generated content and image."""
     try:
@@ -111,6 +793,9 @@ def get_human_feedback(state: State) -> State:
             print(f"\nError occurred: {state['error']}")
             feedback = input("\nDo you want to try again? (yes/no): ")
             state["feedback"] = feedback.lower()
+            state["regenerate"] = "all"
+            state["bypass_cache"] = True
+            state["deadline"] = new_deadline()
             return state
 
         print("\nGenerated Content:")
@@ -118,13 +803,28 @@ def get_human_feedback(state: State) -> State:
         print(f"Message: {state['content'].message}")
         print(f"Tags: {', '.join(state['content'].tags)}")
 
-        if state.get("image"):
-            image_path = os.path.join(state["output_dir"], "output.jpg")
-            print(f"\nGenerated Image has been saved as '{image_path}'")
+        if state.get("image_path"):
+            print(f"\nGenerated Image has been saved as '{state['image_path']}'")
 
-        feedback = input("\nDo you approve the content? (yes/no): ")
-        state["feedback"] = feedback.lower()
+        feedback = input(
+            "\nDo you approve the content? "
+            "(yes/no, or text/image to regenerate only that): "
+        )
+        state["feedback"] = feedback.strip().lower()
         state["error"] = None
+        if state["feedback"] == "yes":
+            state["regenerate"] = None
+        elif state["feedback"] in REGENERATE_CHOICES:
+            state["regenerate"] = state["feedback"]
+        else:
+            state["regenerate"] = "all"
+        # A new seed, so that even an unchanged prompt renders a different image
+        if state["regenerate"] in ("image", "all"):
+            state["image_seed"] = image_seed(state) + 1
+        # A rejected result must not be served again from the cache
+        state["bypass_cache"] = state["feedback"] != "yes"
+        # Each regeneration gets the full budget again
+        state["deadline"] = new_deadline()
         logger.info(f"User feedback: {state['feedback']}")
     except Exception as e:
         logger.error(f"Error getting feedback: {str(e)}")
@@ -136,60 +836,169 @@ def should_continue(state: State) -> str:
     """Determine if we should continue based on human feedback."""
     if state.get("error"):
         return "create_content" if state["feedback"] == "yes" else "end"
-    return "end" if state["feedback"] == "yes" else "create_content"
+    if state["feedback"] == "yes":
+        return "end"
+    # Only the rejected stage is redone, the other one is kept from the state
+    return "generate_image" if state.get("regenerate") == "image" else "create_content"
 
 
-def main():
-    try:
-        # Create the workflow graph
-        workflow = StateGraph(State)
+def after_content(state: State) -> str:
+    """Skip the image stage when only the text is being regenerated."""
+    return "get_feedback" if state.get("regenerate") == "text" else "generate_image"
 
-        # Add nodes
-        workflow.add_node("create_content", create_content)
-        workflow.add_node("generate_image", generate_image)
-        workflow.add_node("get_feedback", get_human_feedback)
 
-        # Add edges
-        workflow.add_edge("create_content", "generate_image")
-        workflow.add_edge("generate_image", "get_feedback")
-        workflow.add_conditional_edges(
-            "get_feedback",
-            should_continue,
-            {"create_content": "create_content", "end": END},
-        )
+def build_workflow(
+    use_async: bool = False,
+    mode: Optional[str] = None,
+    checkpointer: Optional["BaseCheckpointSaver"] = None,
+):
+    """Build and compile the workflow graph for the given execution style and mode.
 
-        # Set entry point
-        workflow.set_entry_point("create_content")
+    With a checkpointer the state is saved after every node, so a run can be
+    resumed from its last completed node.
+    """
+    from langgraph.graph import END, StateGraph
 
-        # Compile the workflow
-        app = workflow.compile()
+    workflow = StateGraph(State)
+    content_node, image_node = get_pipeline_nodes(use_async=use_async, mode=mode)
 
-        # Run the workflow
-        while True:
-            product_desc = input(
-                "Enter product description (or 'quit'/'exit' to exit): "
+    # Add nodes
+    workflow.add_node("create_content", content_node)
+    workflow.add_node("generate_image", image_node)
+    workflow.add_node(
+        "postprocess_image", apostprocess_image if use_async else postprocess_image
+    )
+    workflow.add_node("get_feedback", get_human_feedback)
+
+    # Add edges
+    workflow.add_conditional_edges(
+        "create_content",
+        after_content,
+        {"generate_image": "generate_image", "get_feedback": "get_feedback"},
+    )
+    workflow.add_edge("generate_image", "postprocess_image")
+    workflow.add_edge("postprocess_image", "get_feedback")
+    workflow.add_conditional_edges(
+        "get_feedback",
+        should_continue,
+        {
+            "create_content": "create_content",
+            "generate_image": "generate_image",
+            "end": END,
+        },
+    )
+
+    # Set entry point
+    workflow.set_entry_point("create_content")
+
+    # Compile the workflow
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def run_config(output_dir: str) -> Dict[str, Any]:
+    """Return the graph config of a run; its output directory is the checkpoint thread."""
+    return {"configurable": {"thread_id": output_dir}}
+
+
+async def find_interrupted_runs(app, checkpointer: "BaseCheckpointSaver") -> List[str]:
+    """Return the checkpointed runs that stopped before reaching the end.
+
+    Completed runs delete their checkpoints, any left over (e.g. written before
+    that was done) are deleted here, so the scan only ever sees interrupted runs.
+    """
+    thread_ids: Dict[str, None] = {}
+    async for checkpoint in checkpointer.alist(None):
+        thread_ids.setdefault(checkpoint.config["configurable"]["thread_id"])
+    # Looked up after the listing, which holds the checkpointer's connection
+    interrupted = []
+    for thread_id in thread_ids:
+        snapshot = await app.aget_state(run_config(thread_id))
+        if snapshot.next:
+            interrupted.append(thread_id)
+        else:
+            await checkpointer.adelete_thread(thread_id)
+    return interrupted
+
+
+async def forget_run(checkpointer: Optional["BaseCheckpointSaver"], state: State):
+    """Delete the checkpoints of a run that reached the end, nothing is left to resume."""
+    if checkpointer is not None:
+        await checkpointer.adelete_thread(state["output_dir"])
+
+
+async def resume_interrupted_runs(app, checkpointer: "BaseCheckpointSaver") -> None:
+    """Offer to resume each interrupted run from its last completed node."""
+    for output_dir in await find_interrupted_runs(app, checkpointer):
+        answer = ""
+        if os.path.isdir(output_dir):
+            answer = await asyncio.to_thread(
+                input, f"Resume interrupted run in {output_dir}? (yes/no): "
+            )
+        if answer.lower() != "yes":
+            # Forget it, so it is not offered again
+            await checkpointer.adelete_thread(output_dir)
+            continue
+        with run_scope(output_dir), run_timings(output_dir) as timings:
+            logger.info(f"Resuming run in directory: {output_dir}")
+            # The old deadline passed while the run was down, start a new one
+            await app.aupdate_state(
+                run_config(output_dir), {"deadline": new_deadline()}
             )
-            if product_desc.lower() in ["quit", "exit"]:
-                logger.info("Program terminated by user")
-                break
+            # A None input continues from the latest checkpoint
+            state = await app.ainvoke(None, run_config(output_dir))
+            record_run(state, timings=timings)
+        await forget_run(checkpointer, state)
+
+
+async def arun_cli(checkpointer: Optional["BaseCheckpointSaver"] = None):
+    """Run the interactive CLI loop, checkpointing each run if a checkpointer is given."""
+    app = build_workflow(use_async=True, checkpointer=checkpointer)
+    warm_up_agents()
+    gc_if_configured()
+    if checkpointer is not None:
+        await resume_interrupted_runs(app, checkpointer)
+
+    # Run the workflow
+    while True:
+        product_desc = await asyncio.to_thread(
+            input, "Enter product description (or 'quit'/'exit' to exit): "
+        )
+        if product_desc.lower() in ["quit", "exit"]:
+            logger.info("Program terminated by user")
+            break
 
-            # Create new output directory for this run
-            output_dir = create_output_directory()
-            logger.info(f"Starting new run in directory: {output_dir}")
+        # Create new output directory for this run
+        output_dir = create_output_directory()
 
-            initial_state = State(
-                product_desc=product_desc,
-                content=None,
-                image=None,
-                feedback=None,
-                error=None,
-                output_dir=output_dir,
+        # Log records of this run also go to its execution.log, its spans to timings.json
+        with run_scope(output_dir), run_timings(output_dir) as timings:
+            logger.info(f"Starting new run in directory: {output_dir}")
+            state = await app.ainvoke(
+                new_state(product_desc, output_dir), run_config(output_dir)
             )
-            app.invoke(initial_state)
+            record_run(state, timings=timings)
+        await forget_run(checkpointer, state)
 
+
+async def amain():
+    try:
+        if CHECKPOINT_DB:
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+            os.makedirs(os.path.dirname(CHECKPOINT_DB) or ".", exist_ok=True)
+            async with AsyncSqliteSaver.from_conn_string(CHECKPOINT_DB) as checkpointer:
+                await arun_cli(checkpointer)
+        else:
+            await arun_cli()
     except Exception as e:
         logger.error(f"Fatal error in main workflow: {str(e)}")
         raise
+    finally:
+        await get_default_async_transport().close()
+
+
+def main():
+    asyncio.run(amain())
 
 
 if __name__ == "__main__":